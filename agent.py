@@ -1,25 +1,112 @@
 from anomaly_detector import AnomalyDetector
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
+from anomaly_store import AnomalyStore
+from llm_cache import ResponseCache
+from episodes import coalesce_episodes, format_timeline
+from knowledge_base import KnowledgeBaseIndex
+from alert_state import event_reason, format_events
+from profiler import PROFILER, profiled, token_usage
+import asyncio
 import sys
+import time
+import numpy as np
+import pandas as pd
 from rich.console import Console
 from rich.table import Table
-from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.status import Status
+# The LLM stack (langchain) and Rich's Markdown/Live rendering are imported
+# only when a report is generated: detection runs (e.g. from cron) never load them.
+
+REPORT_PROMPT_TEMPLATE = """
+        You are a Senior Reliability Engineer.
+        Review the anomaly timeline and provide a **Professional & Concise** System Diagnosis.
+        
+        [System Knowledge Base]:
+        {knowledge_base}
+        
+        [Anomaly Timeline]:
+        {anomaly_timeline}
+        
+        **Output Requirements:**
+        - Keep descriptions **brief and professional** (avoid wordy explanations).
+        - Use bullet points for readability.
+        
+        **Output Format:**
+
+        ### 1. Trend Analysis
+        * **Evolution:** [1-2 sentences describing how the fault progressed over time]
+        * **Primary Symptom:** [State the dominant issue identified]
+
+        ### 2. Root Cause Hypothesis
+        * **Diagnosis:** [The SINGLE most likely physical defect based on the KB]
+        * **Evidence:**
+          * [Timestamp]: [Brief specific observation]
+          * [Timestamp]: [Brief specific observation]
+
+        ### 3. Consolidated Action Plan
+        1. [Action Step] - [Brief Reason]
+        2. [Action Step] - [Brief Reason]
+        """
+
+# Marks the lazily created LLM client as not created yet (None means "no LLM")
+_UNSET = object()
 
 class AnomalyAlertAgent:
-    def __init__(self, model_name="Qwen3:4b"):
+    def __init__(self, model_name="Qwen3:4b", use_cache=True, cache_dir=".cache/llm",
+                 max_timeline_chars=6000, episode_gap="15min",
+                 stream=False, group_by=None, concurrency=4,
+                 view="table", page=1, page_size=50, top=None, use_llm=True,
+                 rules_path=None, alert_state=None, store_path=None, hours=None,
+                 model_path=None, ml_weight=1.0, ml_threshold=None, kb_cache_dir=None):
         self.console = Console()
-        self.detector = AnomalyDetector(data_path='data/test_data.csv')
+        self.detector = AnomalyDetector(data_path='data/test_data.csv', rules_path=rules_path,
+                                        model_path=model_path, ml_weight=ml_weight, ml_threshold=ml_threshold)
         self.model_name = model_name
+        # Prompt size budget: anomalies are merged into episodes before the LLM call
+        self.max_timeline_chars = max_timeline_chars
+        self.episode_gap = episode_gap
+        # Reporting mode: stream tokens live, or one report per machine/episode
+        self.stream = stream
+        self.group_by = group_by
+        self.concurrency = concurrency
+        # Terminal output: paginated table / top-K, and/or aggregated summary
+        self.view = view
+        self.page = page
+        self.page_size = page_size
+        self.top = top
         self.knowledge_base = self._load_knowledge_base() # Load KB on init
-        
+        self.kb_index = self._load_kb_index(kb_cache_dir)
+        # Identical (model, prompt, KB, timeline) requests reuse the stored report
+        self.cache = ResponseCache(cache_dir) if use_cache and use_llm else None
+        # False = detect-only: no report, the LLM client is never created
+        self.use_llm = use_llm
+        # Debouncing (AlertStateMachine): report open/escalate/clear transitions
+        # instead of every anomalous row; no transitions = no LLM call
+        self.alert_state = alert_state
+        # Incremental runs: only rows past the stored watermark are scored;
+        # `hours` reports the stored anomalies of the last N hours instead
+        self.store = AnomalyStore(store_path) if store_path else None
+        self.hours = hours
+        self._llm = _UNSET
+
+    @property
+    def llm(self):
+        """Ollama client, created on first use (None if disabled or unavailable)."""
+        if self._llm is _UNSET:
+            self._llm = self._create_llm()
+        return self._llm
+
+    @llm.setter
+    def llm(self, value):
+        self._llm = value
+
+    def _create_llm(self):
+        if not self.use_llm:
+            return None
         try:
-            self.llm = ChatOllama(model=model_name)
+            from langchain_ollama import ChatOllama
+            return ChatOllama(model=self.model_name)
         except Exception as e:
             self.console.print(f"[bold red]Error initializing Ollama:[/bold red] {e}")
-            self.llm = None
+            return None
 
     def _load_knowledge_base(self):
         """Loads the Knowledge Base content from markdown file."""
@@ -30,11 +117,37 @@ class AnomalyAlertAgent:
             self.console.print("[yellow]Warning: config/knowledge_base.md not found. AI will run without grounding.[/yellow]")
             return "No Standard Operating Procedure available."
 
+    def _load_kb_index(self, cache_dir=None):
+        """
+        Section index of the KB, so prompts only carry the relevant SOP sections.
+        The index cache goes to `cache_dir` (default: config/.cache/).
+        """
+        try:
+            return KnowledgeBaseIndex.load("config/knowledge_base.md", cache_dir=cache_dir)
+        except (OSError, ValueError):
+            return None
+
+    def _select_knowledge(self, anomalies):
+        """KB text matching the detected reasons (full KB if no index is available)."""
+        if self.kb_index is None:
+            return self.knowledge_base
+        if hasattr(anomalies, 'reason_names'):
+            # AnomalyResult: distinct reasons straight from the reason codes
+            return self.kb_index.select(anomalies.reason_names())
+        return self.kb_index.select({r for a in anomalies for r in a['reasons']})
+
     def run(self):
         # Use Rich Status spinner to show loading animation
         with self.console.status("[bold green]Loading data and analyzing patterns...", spinner="dots"):
-            self.detector.load_data()
-            anomalies = self.detector.detect_anomalies()
+            if self.store is not None:
+                anomalies = self.detector.detect_incremental(self.store)
+                if self.hours is not None:
+                    anomalies = self.store.recent(self.hours)
+            elif self.group_by == "machine":
+                anomalies = self.detector.detect_anomalies_partitioned()
+            else:
+                self.detector.load_data()
+                anomalies = self.detector.detect_anomalies()
         
         self.console.print(f"\n[bold cyan]Process Complete.[/bold cyan] Detected [bold red]{len(anomalies)}[/bold red] anomalies.\n")
         
@@ -42,88 +155,213 @@ class AnomalyAlertAgent:
             self.console.print("[green]System Normal. No anomalies detected.[/green]")
             return
 
+        events = None
+        if self.alert_state is not None:
+            if self.detector.df is None:
+                self.detector.load_data()
+            events = self.detector.alert_events(self.alert_state)
+            self.console.print(f"[bold cyan]Debounced:[/bold cyan] {len(anomalies)} anomalous rows -> [bold red]{len(events)}[/bold red] alert transitions.\n")
+
         # --- 1. Show Summary Table First ---
-        self._print_summary_table(anomalies)
+        if self.view in ("summary", "both"):
+            self._print_aggregate_view(anomalies)
+        if self.view in ("table", "both"):
+            if events is not None:
+                self._print_event_table(events)
+            else:
+                self._print_summary_table(anomalies, page=self.page, page_size=self.page_size, top=self.top)
+
+        if not self.use_llm:
+            self.console.print("\n[dim]Detect-only mode (--no-llm): skipping AI diagnosis.[/dim]")
+            return
+        if events is not None and not events:
+            self.console.print("\n[green]No alert state transitions. Skipping AI diagnosis.[/green]")
+            return
 
         # --- 2. Consolidated AI Reporting ---
         self.console.print("\n[bold white on blue] --- Generating Holistic System Diagnosis --- [/bold white on blue]\n")
-        self.generate_consolidated_report(anomalies)
+        if self.group_by and events is None:
+            groups = group_anomalies(anomalies, by=self.group_by, episode_gap=self.episode_gap)
+            asyncio.run(self.agenerate_reports(groups, concurrency=self.concurrency))
+        elif self.stream:
+            asyncio.run(self.astream_consolidated_report(anomalies, events=events))
+        else:
+            self.generate_consolidated_report(anomalies, events=events)
             
-    def _print_summary_table(self, anomalies):
-        """Prints the anomaly summary table."""
-        table = Table(title="⚠️ Anomaly Detection Summary", show_header=True, header_style="bold magenta")
+    @profiled("_print_summary_table")
+    def _print_summary_table(self, anomalies, page=1, page_size=50, top=None):
+        """
+        Prints one page of the anomaly summary table for an AnomalyResult.
+        With `top`, the page comes from the `top` highest scores instead of the
+        timeline. Only the displayed rows are rendered.
+        """
+        total = len(anomalies)
+        if top:
+            anomalies = anomalies.top(top)
+        pages = max(1, -(-len(anomalies) // page_size))
+        page = min(max(page, 1), pages)
+        first = (page - 1) * page_size
+        anomalies = anomalies.page(page, page_size)
+
+        title = "⚠️ Anomaly Detection Summary"
+        if top:
+            title += f" (Top {min(top, total)} by Score)"
+        table = Table(title=title, show_header=True, header_style="bold magenta",
+                      caption=f"Rows {first + 1 if len(anomalies) else 0}-{first + len(anomalies)} of {total} | Page {page}/{pages}")
         table.add_column("Timestamp", style="cyan", no_wrap=True)
         table.add_column("Issue Detected") 
         table.add_column("Risk Score", justify="right")
 
-        for anomaly in anomalies:
-            # Colorize reasons
+        for i in range(len(anomalies)):
+            # Colorize reasons by severity code (no string parsing)
             formatted_reasons = []
-            for r in anomaly['reasons']:
-                if "CRITICAL" in r:
+            for severity, r in anomalies.reason_items(i):
+                if severity == "CRITICAL":
                     formatted_reasons.append(f"[bold red]{r}[/bold red]")
-                elif "WARNING" in r:
-                    formatted_reasons.append(f"[yellow]{r}[/yellow]")
                 else:
-                    formatted_reasons.append(r)
+                    formatted_reasons.append(f"[yellow]{r}[/yellow]")
 
             # Style score
-            score_style = "red" if anomaly['score'] > 10 else "yellow"
+            score = anomalies.score[i]
+            score_style = "red" if score > 10 else "yellow"
             table.add_row(
-                str(anomaly['timestamp']),
+                str(anomalies.timestamp_at(i)),
                 ", ".join(formatted_reasons),
-                f"[{score_style}]{anomaly['score']:.2f}[/{score_style}]"
+                f"[{score_style}]{score:.2f}[/{score_style}]"
             )
         self.console.print(table)
 
-    def generate_consolidated_report(self, anomalies):
+    @profiled("build_prompt")
+    def _build_prompt(self, anomalies, events=None):
         """
-        Generates a SINGLE report analyzing the trend and overall health.
+        Returns (prompt_text, cache_key) for a report over `anomalies`, or over
+        the alert transitions in `events` when debouncing.
         """
-        
-        # Prepare aggregated data string
-        anomaly_summary_text = ""
-        for a in anomalies:
-            anomaly_summary_text += f"- [{a['timestamp']}] Score: {a['score']} | Issues: {', '.join(a['reasons'])}\n"
+        if events is not None:
+            anomaly_summary_text = format_events(events, max_chars=self.max_timeline_chars)
+            knowledge = self.kb_index.select({event_reason(e) for e in events}) if self.kb_index else self.knowledge_base
+        else:
+            # Prepare aggregated data string (episodes, bounded by the character budget)
+            episodes = coalesce_episodes(anomalies, max_gap=self.episode_gap)
+            anomaly_summary_text = format_timeline(episodes, max_chars=self.max_timeline_chars)
+            knowledge = self._select_knowledge(anomalies)
+        prompt_text = REPORT_PROMPT_TEMPLATE.format(
+            knowledge_base=knowledge,
+            anomaly_timeline=anomaly_summary_text
+        )
 
-        prompt_text = f"""
-        You are a Senior Reliability Engineer.
-        Review the anomaly timeline and provide a **Professional & Concise** System Diagnosis.
-        
-        [System Knowledge Base]:
-        {self.knowledge_base}
-        
-        [Anomaly Timeline]:
-        {anomaly_summary_text}
-        
-        **Output Requirements:**
-        - Keep descriptions **brief and professional** (avoid wordy explanations).
-        - Use bullet points for readability.
-        
-        **Output Format:**
+        cache_key = None
+        if self.cache:
+            cache_key = ResponseCache.make_key(self.model_name, REPORT_PROMPT_TEMPLATE, knowledge, anomaly_summary_text)
+        PROFILER.count('prompts')
+        PROFILER.count('prompt_chars', len(prompt_text))
+        return prompt_text, cache_key
 
-        ### 1. Trend Analysis
-        * **Evolution:** [1-2 sentences describing how the fault progressed over time]
-        * **Primary Symptom:** [State the dominant issue identified]
+    def _cached_report(self, cache_key):
+        content = self.cache.get(cache_key) if cache_key else None
+        if content is not None:
+            PROFILER.count('llm_cache_hits')
+        return content
 
-        ### 2. Root Cause Hypothesis
-        * **Diagnosis:** [The SINGLE most likely physical defect based on the KB]
-        * **Evidence:**
-          * [Timestamp]: [Brief specific observation]
-          * [Timestamp]: [Brief specific observation]
+    def _record_llm_call(self, started, response=None):
+        """Profiler counters for one LLM round trip (latency, tokens if reported)."""
+        PROFILER.count('llm_calls')
+        PROFILER.count('llm_seconds', time.perf_counter() - started)
+        prompt_tokens, completion_tokens = token_usage(response)
+        if prompt_tokens is not None:
+            PROFILER.count('llm_prompt_tokens', prompt_tokens)
+        if completion_tokens is not None:
+            PROFILER.count('llm_completion_tokens', completion_tokens)
 
-        ### 3. Consolidated Action Plan
-        1. [Action Step] - [Brief Reason]
-        2. [Action Step] - [Brief Reason]
+    def _store_report(self, cache_key, content):
+        if cache_key and content:
+            self.cache.put(cache_key, content, model=self.model_name)
+
+    def _print_event_table(self, events, limit=50):
+        """Alert transitions (open/escalate/clear), most recent `limit` shown."""
+        table = Table(title="🔔 Alert Transitions", show_header=True, header_style="bold magenta",
+                      caption=f"Showing {min(limit, len(events))} of {len(events)} (most recent)")
+        table.add_column("Timestamp", style="cyan", no_wrap=True)
+        table.add_column("Machine")
+        table.add_column("Event")
+        table.add_column("Alert")
+        table.add_column("Value", justify="right")
+        styles = {'open': "bold red", 'escalate': "bold magenta", 'clear': "green"}
+        for e in events[-limit:]:
+            style = styles[e['event']]
+            table.add_row(
+                str(e['timestamp']),
+                "" if e['machine_id'] is None else str(e['machine_id']),
+                f"[{style}]{e['event'].upper()}[/{style}]",
+                event_reason(e),
+                f"{e['value']:g}",
+            )
+        self.console.print(table)
+
+    @profiled("_print_aggregate_view")
+    def _print_aggregate_view(self, anomalies, busiest_hours=24, bins=10):
         """
-        
+        Compact aggregated view: counts per severity, per reason and for the
+        busiest hours, plus a score histogram. Cost depends on the number of
+        reasons/hours/bins shown, not on how many anomalies there are.
+        """
+        severity = anomalies.severity_counts()
+        self.console.print(
+            f"[bold]Severity:[/bold] [bold red]CRITICAL {severity['CRITICAL']}[/bold red] | "
+            f"[yellow]WARNING {severity['WARNING']}[/yellow]"
+        )
+
+        reasons = Table(title="Anomalies per Reason", header_style="bold magenta")
+        reasons.add_column("Reason")
+        reasons.add_column("Count", justify="right")
+        for name, count in anomalies.reason_counts().items():
+            style = "bold red" if name.startswith("CRITICAL") else "yellow"
+            reasons.add_row(f"[{style}]{name}[/{style}]", str(count))
+        self.console.print(reasons)
+
+        hours, counts = anomalies.hourly_counts()
+        if len(hours):
+            busiest = np.sort(np.argsort(-counts, kind='stable')[:busiest_hours])
+            hourly = Table(title=f"Busiest Hours (top {len(busiest)} of {len(hours)})", header_style="bold magenta")
+            hourly.add_column("Hour", style="cyan")
+            hourly.add_column("Count", justify="right")
+            for i in busiest:
+                hourly.add_row(str(hours[i]).replace("T", " ") + ":00", str(counts[i]))
+            self.console.print(hourly)
+
+        hist, edges = anomalies.score_histogram(bins)
+        histogram = Table(title="Risk Score Distribution", header_style="bold magenta")
+        histogram.add_column("Score", justify="right")
+        histogram.add_column("Count", justify="right")
+        histogram.add_column("")
+        peak = max(int(hist.max()), 1)
+        for count, low, high in zip(hist, edges[:-1], edges[1:]):
+            histogram.add_row(f"{low:.1f}-{high:.1f}", str(count), "█" * int(round(30 * count / peak)))
+        self.console.print(histogram)
+
+    @profiled("generate_consolidated_report")
+    def generate_consolidated_report(self, anomalies, events=None):
+        """
+        Generates a SINGLE report analyzing the trend and overall health.
+        """
+        prompt_text, cache_key = self._build_prompt(anomalies, events)
+        content = self._cached_report(cache_key)
+        if content is not None:
+            self._print_report(content, cached=True)
+            self.console.print("\n")
+            return content
+
         if self.llm:
             try:
                 with self.console.status("[bold yellow]Synthesizing Holistic Report...", spinner="earth"):
-                    response = self.llm.invoke(prompt_text)
-                
-                md = Markdown(response.content)
-                self.console.print(Panel(md, title="🤖 AI Reliability Engineer: Holistic Diagnosis", border_style="green", expand=False))
+                    started = time.perf_counter()
+                    with PROFILER.stage("llm_invoke"):
+                        response = self.llm.invoke(prompt_text)
+                    self._record_llm_call(started, response)
+                content = response.content
+
+                self._store_report(cache_key, content)
+                self._print_report(content)
                 
             except Exception as e:
                 self.console.print(f"[bold red][Error][/bold red] AI analysis failed: {e}")
@@ -131,13 +369,180 @@ class AnomalyAlertAgent:
              self.console.print("[dim]LLM client not initialized, skipping analysis.[/dim]")
         
         self.console.print("\n")
+        return content
+
+    @profiled("astream_consolidated_report")
+    async def astream_consolidated_report(self, anomalies, events=None):
+        """
+        Async variant of generate_consolidated_report() that renders tokens into
+        the report panel as they arrive instead of waiting for the full answer.
+        """
+        prompt_text, cache_key = self._build_prompt(anomalies, events)
+        content = self._cached_report(cache_key)
+        if content is not None:
+            self._print_report(content, cached=True)
+            return content
+
+        if not self.llm:
+            self.console.print("[dim]LLM client not initialized, skipping analysis.[/dim]")
+            return None
+
+        from rich.live import Live
+
+        content = ""
+        started = time.perf_counter()
+        last_chunk = None
+        try:
+            with Live(self._report_panel("_Waiting for first token..._"), console=self.console, refresh_per_second=8) as live:
+                async for chunk in self.llm.astream(prompt_text):
+                    if last_chunk is None:
+                        PROFILER.gauge('llm_first_token_seconds', time.perf_counter() - started)
+                    # Ollama reports token usage on the final chunk
+                    last_chunk = chunk
+                    content += chunk.content
+                    live.update(self._report_panel(content))
+        except Exception as e:
+            self.console.print(f"[bold red][Error][/bold red] AI analysis failed: {e}")
+            return None
+        self._record_llm_call(started, last_chunk)
+
+        self._store_report(cache_key, content)
+        return content
+
+    @profiled("agenerate_reports")
+    async def agenerate_reports(self, groups, concurrency=4):
+        """
+        Generates one report per group ({name: anomalies}) concurrently.
+        At most `concurrency` requests are in flight against the Ollama server;
+        panels are printed as each report completes. Returns {name: content}.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def report(name, group):
+            prompt_text, cache_key = self._build_prompt(group)
+            content = self._cached_report(cache_key)
+            if content is not None:
+                return name, content, True
+            async with semaphore:
+                started = time.perf_counter()
+                response = await self.llm.ainvoke(prompt_text)
+                self._record_llm_call(started, response)
+            self._store_report(cache_key, response.content)
+            return name, response.content, False
+
+        if not self.llm:
+            self.console.print("[dim]LLM client not initialized, skipping analysis.[/dim]")
+            return {}
+
+        results = {}
+        tasks = [asyncio.create_task(report(name, group)) for name, group in groups.items()]
+        for finished in asyncio.as_completed(tasks):
+            try:
+                name, content, cached = await finished
+            except Exception as e:
+                self.console.print(f"[bold red][Error][/bold red] AI analysis failed: {e}")
+                continue
+            results[name] = content
+            self._print_report(content, cached=cached, subject=name)
+        return results
+
+    def _report_panel(self, content, cached=False, subject=None):
+        from rich.markdown import Markdown
+        from rich.panel import Panel
+
+        title = "🤖 AI Reliability Engineer: Holistic Diagnosis"
+        if subject is not None:
+            title += f" [{subject}]"
+        if cached:
+            title += " (cached)"
+        return Panel(Markdown(content), title=title, border_style="green", expand=False)
+
+    def _print_report(self, content, cached=False, subject=None):
+        """Renders the LLM report as a Markdown panel."""
+        self.console.print(self._report_panel(content, cached=cached, subject=subject))
+
+def group_anomalies(anomalies, by="machine", episode_gap="15min"):
+    """
+    Splits anomalies into report groups: one per machine ('machine_id', or a
+    single 'all' group if absent) or one per episode.
+    """
+    if by == "episode":
+        return {
+            f"{pd.Timestamp(e['start'])} {'/'.join(e['reasons'])}": e['result'].take(e['positions']) if 'positions' in e else e['anomalies']
+            for e in coalesce_episodes(anomalies, max_gap=episode_gap)
+        }
+
+    groups = {}
+    for a in anomalies:
+        groups.setdefault(a.get('machine_id', 'all'), []).append(a)
+    return groups
 
 if __name__ == "__main__":
     import argparse
+    from alert_state import AlertStateMachine
     
     parser = argparse.ArgumentParser(description="Anomaly Alert AI Agent")
     parser.add_argument("--model", type=str, default="Qwen3:4b", help="Ollama model name (default: Qwen3:4b)")
+    parser.add_argument("--rules", type=str, default="config/rules.toml", help="TOML/JSON thresholds with per-machine overrides (default: config/rules.toml)")
+    parser.add_argument("--debounce", action="store_true", help="Report alert open/escalate/clear transitions (hysteresis, dwell, cooldown) instead of every anomalous row")
+    parser.add_argument("--min-dwell", type=str, default="10min", help="--debounce: how long a violation must persist to open/escalate or a recovery to clear (default: 10min)")
+    parser.add_argument("--cooldown", type=str, default="30min", help="--debounce: WARNING alerts do not reopen this soon after a clear (default: 30min)")
+    parser.add_argument("--hysteresis", type=float, default=0.1, help="--debounce: clear only this fraction of the normal band inside the limits (default: 0.1)")
+    parser.add_argument("--ml-model", type=str, default=None, help="Multivariate model trained with anomaly_detector.py --model ... --train; its distance is blended into the score")
+    parser.add_argument("--ml-weight", type=float, default=1.0, help="Weight of the model distance in the score (default: 1.0)")
+    parser.add_argument("--ml-threshold", type=float, default=None, help="Flag rows whose model distance exceeds this as 'WARNING: Multivariate' (default: 4.03)")
+    parser.add_argument("--store", type=str, default=None, help="SQLite anomaly store, e.g. .cache/anomalies.db: score only rows appended since the last run")
+    parser.add_argument("--hours", type=float, default=None, help="With --store: report the stored anomalies of the last N hours instead of only the new ones")
+    parser.add_argument("--no-llm", action="store_true", help="Detect-only: print the tables and skip the AI diagnosis (LLM stack is never loaded)")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Always call the LLM, bypassing the response cache")
+    parser.add_argument("--clear-llm-cache", action="store_true", help="Delete cached LLM responses before running")
+    parser.add_argument("--max-timeline-chars", type=int, default=6000, help="Character budget for the anomaly timeline in the prompt (default: 6000)")
+    parser.add_argument("--episode-gap", type=str, default="15min", help="Merge same-reason anomalies closer than this into one episode (default: 15min)")
+    parser.add_argument("--stream", action="store_true", help="Stream the report tokens into the panel as they are generated")
+    parser.add_argument("--per", choices=["machine", "episode"], default=None, help="Generate one report per machine or per episode, in parallel")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max concurrent LLM requests for --per (default: 4)")
+    parser.add_argument("--view", choices=["table", "summary", "both"], default="table", help="Terminal output: paginated table, aggregated summary, or both (default: table)")
+    parser.add_argument("--top", type=int, default=None, help="Table shows only the K highest-score anomalies")
+    parser.add_argument("--page", type=int, default=1, help="Table page to show (default: 1)")
+    parser.add_argument("--page-size", type=int, default=50, help="Table rows per page (default: 50)")
+    parser.add_argument("--profile", action="store_true", help="Print a per-stage time/memory breakdown (incl. prompt size, LLM latency/tokens) at exit")
+    parser.add_argument("--profile-output", type=str, default=None, help="With --profile: also write the metrics as JSON, or Prometheus text for *.prom")
     args = parser.parse_args()
+
+    if args.profile:
+        PROFILER.enable()
         
-    agent = AnomalyAlertAgent(model_name=args.model)
+    agent = AnomalyAlertAgent(
+        model_name=args.model,
+        use_cache=not args.no_llm_cache,
+        max_timeline_chars=args.max_timeline_chars,
+        episode_gap=args.episode_gap,
+        stream=args.stream,
+        group_by=args.per,
+        concurrency=args.concurrency,
+        view=args.view,
+        page=args.page,
+        page_size=args.page_size,
+        top=args.top,
+        use_llm=not args.no_llm,
+        rules_path=args.rules,
+        alert_state=AlertStateMachine(args.min_dwell, cooldown=args.cooldown, hysteresis=args.hysteresis) if args.debounce else None,
+        store_path=args.store,
+        hours=args.hours,
+        model_path=args.ml_model,
+        ml_weight=args.ml_weight,
+        ml_threshold=args.ml_threshold
+    )
+    if args.clear_llm_cache:
+        removed = ResponseCache(".cache/llm").clear()
+        agent.console.print(f"[dim]Cleared {removed} cached LLM responses.[/dim]")
     agent.run()
+    if agent.cache:
+        stats = agent.cache.stats()
+        agent.console.print(f"[dim]LLM cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries.[/dim]")
+    if args.profile:
+        agent.console.print("\n[bold]Profile[/bold]")
+        agent.console.print(PROFILER.format_report(), markup=False, highlight=False, soft_wrap=True)
+        if args.profile_output:
+            PROFILER.write(args.profile_output)
+            agent.console.print(f"[dim]Profile saved to {args.profile_output}[/dim]")
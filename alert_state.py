@@ -0,0 +1,219 @@
+"""
+Alert debouncing: a per-(machine, metric) state machine over the readings.
+
+Instead of one alert per threshold-crossing row, each machine/metric pair is
+NORMAL, WARNING or CRITICAL and only its transitions are reported:
+
+- open:     a violation persisted for `min_dwell` (WARNING opens are held
+            back during `cooldown` after the previous clear; CRITICAL is not)
+- escalate: an open WARNING saw CRITICAL readings for `min_dwell`
+- clear:    readings stayed inside the normal band, narrowed by the
+            hysteresis margin, for `clear_dwell`
+
+Readings between the normal limit and the hysteresis margin change nothing,
+so a value oscillating around normal_max opens one alert instead of a flood.
+The rows of each pair are processed run by run (stretches with the same
+raw level), not row by row. State carries over between process() calls, so
+batches can be fed as they arrive; rows must be in time order per machine.
+"""
+import numpy as np
+import pandas as pd
+
+from anomaly_result import reason_name
+
+NORMAL, WARNING, CRITICAL = 0, 1, 2
+SEVERITY_NAMES = {WARNING: 'WARNING', CRITICAL: 'CRITICAL'}
+
+# Per-row codes: band (between the clear margin and the limit), inside the
+# clear band, warning, critical
+_BAND, _INSIDE, _WARNING, _CRITICAL = 0, 1, 2, 4
+
+class _PairState:
+    __slots__ = ('level', 'direction', 'cleared_at', 'open_since', 'escalate_since', 'clear_since')
+
+    def __init__(self):
+        self.level = NORMAL
+        self.direction = None
+        self.cleared_at = None
+        self.open_since = None
+        self.escalate_since = None
+        self.clear_since = None
+
+class AlertStateMachine:
+    def __init__(self, min_dwell="10min", clear_dwell=None, cooldown="30min", hysteresis=0.1):
+        self.min_dwell = pd.Timedelta(min_dwell).to_timedelta64()
+        self.clear_dwell = pd.Timedelta(clear_dwell if clear_dwell is not None else min_dwell).to_timedelta64()
+        self.cooldown = pd.Timedelta(cooldown).to_timedelta64()
+        # Fraction of the normal band width a value must be back inside to clear
+        self.hysteresis = hysteresis
+        self.states = {}  # (machine_id, metric) -> _PairState
+
+    def open_alerts(self):
+        """{(machine_id, metric): severity} of the alerts currently open."""
+        return {key: SEVERITY_NAMES[s.level] for key, s in self.states.items() if s.level != NORMAL}
+
+    def process(self, df, rule_table, rows=None, low_is_good=()):
+        """
+        Feeds scored/validated readings (timestamp, FEATURES, optional
+        machine_id) through the state machine. `rows` are the rule table rows
+        of df (see AnomalyDetector._rule_rows). Returns the transition events
+        in time order.
+        """
+        if df.empty:
+            return []
+        timestamps = df['timestamp'].to_numpy(dtype='datetime64[ns]')
+        if 'machine_id' in df.columns:
+            codes, machines = pd.factorize(df['machine_id'].to_numpy(), use_na_sentinel=False)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.cumsum(np.bincount(codes, minlength=len(machines)))[:-1]
+            groups = zip(machines, np.split(order, bounds))
+        else:
+            groups = [(None, np.arange(len(df)))]
+
+        events = []
+        for machine, positions in groups:
+            for j, metric in enumerate(rule_table.features):
+                values = df[metric].to_numpy(dtype=float)[positions]
+                group_rows = rows[positions] if isinstance(rows, np.ndarray) else rows
+                limits = {name: np.broadcast_to(rule_table.limit(name, j, group_rows), values.shape) for name in rule_table.limits}
+                state = self.states.setdefault((machine, metric), _PairState())
+                events.extend(self._process_pair(state, machine, metric, timestamps[positions], values, limits, metric in low_is_good))
+        events.sort(key=lambda e: e['timestamp'])
+        return events
+
+    def _codes(self, values, limits, low_is_good):
+        normal_min, normal_max = limits['normal_min'], limits['normal_max']
+        # One-sided metrics (no low limits) measure the band from 0
+        margin = self.hysteresis * (normal_max - np.nan_to_num(normal_min, nan=0.0))
+        codes = np.full(len(values), _BAND, dtype=np.int8)
+        with np.errstate(invalid='ignore'):
+            # NaN limits/readings compare False: a missing limit never fires
+            inside = values <= normal_max - margin
+            if not low_is_good:
+                inside &= values >= normal_min + margin
+            codes[inside] = _INSIDE
+            codes[(values > normal_max) | (values < normal_min)] = _WARNING
+            codes[(values > limits['critical_high']) | (values < limits['critical_low'])] = _CRITICAL
+        return codes
+
+    def _process_pair(self, state, machine, metric, timestamps, values, limits, low_is_good):
+        codes = self._codes(values, limits, low_is_good)
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        ends = np.r_[starts[1:], len(codes)]
+
+        events = []
+        def emit(event, k, severity, direction):
+            limit_name = {('High', CRITICAL): 'critical_high', ('High', WARNING): 'normal_max',
+                          ('Low', CRITICAL): 'critical_low', ('Low', WARNING): 'normal_min'}[(direction, severity)]
+            events.append({
+                'event': event,
+                'machine_id': machine,
+                'metric': metric,
+                'direction': direction,
+                'severity': SEVERITY_NAMES[severity],
+                'timestamp': pd.Timestamp(timestamps[k]),
+                'value': float(values[k]),
+                'limit': float(limits[limit_name][k]),
+            })
+
+        def first_due(i, j, due):
+            # First row of the run at or after `due`, or None
+            k = i + int(np.searchsorted(timestamps[i:j], due))
+            return k if k < j else None
+
+        # A streak is the runs between two stretches inside the clear band;
+        # band readings neither start nor break one. While NORMAL only streaks
+        # whose violations outlast min_dwell can open an alert: jump straight
+        # to the next one. Streaks touching the batch edges may continue
+        # across calls.
+        run_codes = codes[starts]
+        inside = run_codes == _INSIDE
+        streak = np.cumsum(inside)
+        violation = np.flatnonzero(run_codes >= _WARNING)
+        new_streak = np.r_[True, streak[violation[1:]] != streak[violation[:-1]]] if len(violation) else np.empty(0, dtype=bool)
+        first = violation[new_streak]
+        last = violation[np.r_[new_streak[1:], True]] if len(violation) else violation
+        viable = ((timestamps[ends[last] - 1] - timestamps[starts[first]] >= self.min_dwell)
+                  | (streak[first] == 0) | (streak[last] == streak[-1]))
+        violation_runs = first[viable]
+        r = 0
+        while r < len(starts):
+            i, j = starts[r], ends[r]
+            code, started = codes[i], timestamps[i]
+            if state.level == NORMAL and (code == _INSIDE or (code == _BAND and state.open_since is None)):
+                state.open_since = state.escalate_since = state.clear_since = None
+                next_violation = np.searchsorted(violation_runs, r)
+                r = violation_runs[next_violation] if next_violation < len(violation_runs) else len(starts)
+                continue
+            r += 1
+
+            # Streak bookkeeping: when did the current condition start?
+            if code >= _WARNING:
+                state.clear_since = None
+                state.open_since = state.open_since if state.open_since is not None else started
+                if code == _CRITICAL:
+                    state.escalate_since = state.escalate_since if state.escalate_since is not None else started
+                else:
+                    state.escalate_since = None
+            elif code == _INSIDE:
+                state.open_since = state.escalate_since = None
+                state.clear_since = state.clear_since if state.clear_since is not None else started
+            else:
+                state.clear_since = None
+
+            if state.level == NORMAL and code >= _WARNING:
+                level = CRITICAL if code == _CRITICAL else WARNING
+                due = state.open_since + self.min_dwell
+                if level == WARNING and state.cleared_at is not None:
+                    due = max(due, state.cleared_at + self.cooldown)
+                k = first_due(i, j, due)
+                if k is not None:
+                    state.level = level
+                    state.direction = 'High' if values[k] > limits['normal_max'][k] else 'Low'
+                    emit('open', k, level, state.direction)
+            elif state.level == WARNING and code == _CRITICAL:
+                k = first_due(i, j, state.escalate_since + self.min_dwell)
+                if k is not None:
+                    state.level = CRITICAL
+                    state.direction = 'High' if values[k] > limits['normal_max'][k] else 'Low'
+                    emit('escalate', k, CRITICAL, state.direction)
+            elif state.level != NORMAL and code == _INSIDE:
+                k = first_due(i, j, state.clear_since + self.clear_dwell)
+                if k is not None:
+                    emit('clear', k, state.level, state.direction)
+                    state.level = NORMAL
+                    state.cleared_at = timestamps[k]
+        return events
+
+def event_reason(event):
+    """'CRITICAL: Temp High' for the alert an event belongs to."""
+    return reason_name(event['metric'], event['direction'], event['severity'])
+
+def format_event(event):
+    machine = f" ({event['machine_id']})" if event['machine_id'] is not None else ""
+    op = '>' if event['direction'] == 'High' else '<'
+    if event['event'] == 'clear':
+        detail = f"back to normal at {event['value']}"
+    else:
+        detail = f"{event['value']} {op} {event['limit']:g}"
+    return f"- [{event['timestamp']}]{machine} {event['event'].upper()} {event_reason(event)} ({detail})\n"
+
+def _omitted(count):
+    return f"- ({count} earlier events omitted)\n"
+
+def format_events(events, max_chars=6000):
+    """Event timeline for the LLM prompt; the most recent events win when over budget."""
+    lines = [format_event(e) for e in events]
+    if sum(len(line) for line in lines) <= max_chars:
+        return "".join(lines)
+    kept, used = [], 0
+    for line in reversed(lines):
+        # Keep room for the omission note, which grows with the events dropped.
+        if used + len(line) + len(_omitted(len(lines) - len(kept) - 1)) > max_chars:
+            break
+        kept.append(line)
+        used += len(line)
+    note = _omitted(len(lines) - len(kept))
+    if used + len(note) <= max_chars:
+        kept.append(note)
+    return "".join(reversed(kept))
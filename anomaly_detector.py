@@ -1,91 +1,364 @@
+import glob
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType
+
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
+
+import sensor_cache
+from anomaly_result import AnomalyResult, multivariate_bit, reason_bit
+from multivariate import MahalanobisModel, distance_cutoff
+from profiler import PROFILER, profiled
+from rules_config import RuleTable, RulesWatcher
+
+FEATURES = ['temp', 'pressure', 'vibration']
+
+# Column identifying the asset in multi-machine exports
+MACHINE_COLUMN = 'machine_id'
+
+# Metrics where a reading below normal_min is fine (e.g. low vibration is good)
+LOW_IS_GOOD = {'vibration'}
+
+# Bytes before an incremental-run watermark compared on resume (see detect_incremental)
+TAIL_BYTES = 256
+
+# Base penalty added to the score per rule violation.
+# This ensures Score aligns with Warning (>5) / Critical (>15)
+SEVERITY_PENALTY = {'CRITICAL': 10, 'WARNING': 5}
+
+def safe_scale(std):
+    """Standard deviation used for z-scores: constant features map to 1 (like StandardScaler)."""
+    return np.where(std < 10 * np.finfo(float).eps, 1.0, std)
+
+class RunningStats:
+    """
+    Running mean / population variance per feature column.
+    Batches are merged with the parallel form of Welford's algorithm (Chan et al.),
+    so the result matches a single pass over all rows.
+    """
+    def __init__(self, n_features=len(FEATURES)):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+
+    def update(self, X):
+        """Merges a 2-D batch of rows into the running statistics."""
+        X = np.asarray(X, dtype=float)
+        n = len(X)
+        if n == 0:
+            return
+        batch_mean = X.mean(axis=0)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def remove(self, X):
+        """Removes a batch previously merged with update() (used for sliding windows)."""
+        X = np.asarray(X, dtype=float)
+        n = len(X)
+        if n == 0:
+            return
+        if n >= self.count:
+            self.count = 0
+            self.mean = np.zeros_like(self.mean)
+            self.m2 = np.zeros_like(self.m2)
+            return
+        batch_mean = X.mean(axis=0)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+
+        remaining = self.count - n
+        mean = (self.mean * self.count - batch_mean * n) / remaining
+        delta = batch_mean - mean
+        self.m2 = np.maximum(self.m2 - batch_m2 - delta ** 2 * remaining * n / self.count, 0.0)
+        self.mean = mean
+        self.count = remaining
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else np.zeros_like(self.m2)
+
+    @property
+    def scale(self):
+        """Standard deviation per feature (see safe_scale)."""
+        return safe_scale(np.sqrt(self.variance))
 
 class AnomalyDetector:
-    def __init__(self, data_path='data/test_data.csv'):
+    def __init__(self, data_path='data/test_data.csv', window=None, use_cache=True, rules_path=None,
+                 model_path=None, ml_weight=1.0, ml_workers=1, ml_threshold=None):
         self.data_path = data_path
         self.df = None
+        # Reuse/write the binary sidecar of the parsed CSV (see sensor_cache.py)
+        self.use_cache = use_cache
+
+        # Online mode state (see update()).
+        # `window` (e.g. "1h") limits the running statistics to recent readings.
+        self.window = pd.Timedelta(window) if window is not None else None
+        self.stats = None
+        self._fill_values = None
+        self._rows_seen = 0
+        self._window_batches = deque()
         
-        # Define Thresholds (Absolute limits for "Reasoning")
-        # Normal: Safe range
-        # Warning: Gray area (User defined)
-        # Critical: User defined "Abnormal"
-        self.rules = {
-            'temp': {
-                'normal_min': 45, 'normal_max': 50,
-                'critical_high': 52, 'critical_low': 43
-                # Implied: 50 < x <= 52 is Warning High, 43 <= x < 45 is Warning Low
-            },
-            'pressure': {
-                'normal_min': 1.00, 'normal_max': 1.05,
-                'critical_high': 1.08, 'critical_low': 0.97
-            },
-            'vibration': {
-                'normal_min': 0.02, 'normal_max': 0.04,
-                'critical_high': 0.07
-                # Warning Low: < 0.02 (User requested)
-            }
-        }
-        
-        # Verification weights for composite score (relative importance)
-        self.weights = {'temp': 1.0, 'pressure': 2.0, 'vibration': 3.0} # Example: Vibration is critical
+        # Thresholds and score weights (see rules_config.py). With `rules_path`
+        # they come from a TOML/JSON file that is re-read when it changes.
+        self.rules_watcher = RulesWatcher(rules_path, LOW_IS_GOOD) if rules_path else None
+        self.rule_table = self.rules_watcher.table if self.rules_watcher else RuleTable.from_config({}, LOW_IS_GOOD)
+        # Machine the data belongs to when there is no machine_id column
+        self.machine_id = None
+
+        # Optional multivariate model (see multivariate.py): its Mahalanobis
+        # distance, times ml_weight, is added to the score of every row, and
+        # rows farther than ml_threshold are flagged even inside all limits
+        self.model = None
+        if model_path and os.path.exists(model_path):
+            self.model = MahalanobisModel.load(model_path)
+            if self.model.features != FEATURES:
+                raise ValueError(f"Model {model_path} was trained on {self.model.features}, expected {FEATURES}")
+        elif model_path:
+            print(f"[Info] No model at {model_path} yet. Scoring without it (train with --train).")
+        self.ml_weight = ml_weight
+        self.ml_workers = ml_workers
+        # Default: exceeded by 0.1% of normal readings (chi-square, one dof per metric)
+        self.ml_threshold = ml_threshold if ml_threshold is not None else distance_cutoff(len(FEATURES))
+
+    @property
+    def rules(self):
+        """
+        Global thresholds (metric -> limits), read-only: the compiled RuleTable
+        would not see in-place edits. Assign a new dict to change them.
+        """
+        return MappingProxyType({metric: MappingProxyType(limits) for metric, limits in self.rule_table.rule_sets[0].items()})
 
+    @rules.setter
+    def rules(self, rules):
+        self.rule_table = self.rule_table.with_global(rules=rules)
+
+    @property
+    def weights(self):
+        """Global score weights (metric -> weight), read-only; assign to change."""
+        return MappingProxyType(self.rule_table.weight_sets[0])
+
+    @weights.setter
+    def weights(self, weights):
+        self.rule_table = self.rule_table.with_global(weights=weights)
+
+    def reload_rules(self, force=False):
+        """Swaps in the rules file if it changed on disk. Returns the active RuleTable."""
+        if self.rules_watcher and self.rules_watcher.poll(force=force):
+            self.rule_table = self.rules_watcher.table
+        return self.rule_table
+
+    def _rule_rows(self, df):
+        """Rule table row per row of `df` (array), one row (int), or None for the global rules."""
+        if MACHINE_COLUMN in df.columns:
+            return self.rule_table.rows_for(df[MACHINE_COLUMN].to_numpy())
+        return self.rule_table.rows_for(self.machine_id)
+
+    @profiled("load_data")
     def load_data(self):
-        """Loads data and converts timestamp."""
+        """
+        Loads data and converts timestamp.
+        The cleaned result is cached in a binary sidecar next to the CSV and
+        reused while the CSV is unchanged.
+        """
+        if self.use_cache and os.path.exists(self.data_path):
+            cached = sensor_cache.read_cache(self.data_path)
+            if cached is not None:
+                if cached.attrs.get('removed'):
+                    print(f"[Info] Removed {cached.attrs['removed']} invalid records.")
+                self.df = cached
+                PROFILER.count('sensor_cache_hits')
+                PROFILER.count('rows_loaded', len(self.df))
+                print(f"Loaded {len(self.df)} records (cached).")
+                return
+
         try:
-            self.df = pd.read_csv(self.data_path)
+            df = pd.read_csv(self.data_path)
             
             # 1. Missing Value Handling (Forward Fill for Time Series)
-            if self.df.isnull().sum().sum() > 0:
+            if df.isnull().values.any():
                 print(f"[Warning] Found missing values. Filling with ffill.")
-                self.df.fillna(method='ffill', inplace=True)
-                self.df.fillna(method='bfill', inplace=True) # Fallback for first row
+            df = self._fill_missing(df)
 
             # 2. Basic Data Validation (Physical constraints)
-            # Temp > 0, Pressure > 0, Vibration >= 0
-            original_len = len(self.df)
-            self.df = self.df[
-                (self.df['temp'] > 0) & 
-                (self.df['pressure'] > 0) & 
-                (self.df['vibration'] >= 0)
-            ]
+            original_len = len(df)
+            self.df = self._validate(df)
             
             if len(self.df) < original_len:
                 print(f"[Info] Removed {original_len - len(self.df)} invalid records.")
 
-            if 'timestamp' in self.df.columns:
-                self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
+            PROFILER.count('rows_loaded', len(self.df))
             print(f"Loaded {len(self.df)} records.")
         except FileNotFoundError:
             print(f"Error: File {self.data_path} not found.")
             self.df = pd.DataFrame()
+            return
+
+        # A read-only data directory just means no cache
+        if self.use_cache and os.access(os.path.dirname(os.path.abspath(self.data_path)), os.W_OK):
+            try:
+                sensor_cache.write_cache(self.data_path, self.df, removed=original_len - len(self.df))
+            except PermissionError:
+                pass
+            except OSError as e:
+                print(f"[Warning] Could not write cache: {e}")
 
-    def calculate_statistical_scores(self):
+    def _fill_missing(self, df, fill_values=None):
+        """
+        Forward fills gaps in a frame.
+        `fill_values` is the last (filled) row of the previous chunk, so gaps at
+        the start of a chunk continue the forward fill across the boundary.
+        Without it the first rows fall back to bfill.
+        """
+        if not df.isnull().values.any():
+            return df
+        df = df.ffill()
+        if fill_values is None:
+            return df.bfill() # Fallback for first row
+        return df.fillna(fill_values)
+
+    def _validate(self, df):
+        """Drops physically impossible readings and parses the timestamp."""
+        # Temp > 0, Pressure > 0, Vibration >= 0
+        df = df[
+            (df['temp'] > 0) & 
+            (df['pressure'] > 0) & 
+            (df['vibration'] >= 0)
+        ]
+        if 'timestamp' in df.columns:
+            df = df.assign(timestamp=pd.to_datetime(df['timestamp']))
+        return df
+
+    @profiled("calculate_statistical_scores")
+    def calculate_statistical_scores(self, rows=None):
         """
         Calculates Z-scores for the dataset.
         Using these statistical measures for robust scoring.
+        `rows`: rule table rows of self.df if already known (see _rule_rows).
         """
-        features = ['temp', 'pressure', 'vibration']
         if self.df.empty:
             return
 
-        X = self.df[features].values
-        
-        # 1. Z-Scores
-        self.scaler = StandardScaler().fit(X)
-        X_z = self.scaler.transform(X)
-        self.df[['z_temp', 'z_pressure', 'z_vibration']] = X_z
+        X = self.df[FEATURES].to_numpy(dtype=float)
+        PROFILER.count('rows_scored', len(X))
+
+        # 1. Z-Scores (same as sklearn's StandardScaler: population std, NaNs ignored)
+        self.feature_mean = np.nanmean(X, axis=0)
+        self.feature_scale = safe_scale(np.nanstd(X, axis=0))
+        self._apply_scores(self.df, self.feature_mean, self.feature_scale, rows)
+
+    def _apply_scores(self, df, mean, scale, rows=None):
+        """Adds z-score and composite rule score columns to `df` in place."""
+        if rows is None:
+            rows = self._rule_rows(df)
+        X_z = (df[FEATURES].to_numpy(dtype=float) - mean) / scale
+        df[['z_temp', 'z_pressure', 'z_vibration']] = X_z
         
         # 2. Composite Rule Score (Weighted Z-Score sum of absolute deviations)
         # We use absolute Z-score because deviation in either direction is interesting.
         # This provides a continuous "baseline" scan.
-        weighted_z = np.abs(X_z) * np.array([self.weights[f] for f in features])
-        self.df['rule_score'] = weighted_z.sum(axis=1)
+        weighted_z = np.abs(X_z) * self.rule_table.weights_for(rows)
+        df['rule_score'] = weighted_z.sum(axis=1)
+
+        # 3. Joint deviation from the normal operating point (multivariate model)
+        if self.model is not None:
+            df['ml_score'] = self.model.score_samples(df[FEATURES].to_numpy(dtype=float), workers=self.ml_workers)
+
+    def fit_model(self, df=None, warm_start=True):
+        """
+        Trains the multivariate model on the rule-compliant rows of `df`
+        (default: self.df). With warm_start the rows are merged into the
+        current model instead of replacing it. Returns the model.
+        """
+        df = self.df if df is None else df
+        values = {f: df[f].to_numpy(dtype=float) for f in FEATURES}
+        _, penalty = self._evaluate_rules(values, self._rule_rows(df))
+        X = np.column_stack([values[f] for f in FEATURES])[penalty == 0]
+        if self.model is None or not warm_start:
+            self.model = MahalanobisModel(FEATURES).fit(X)
+        else:
+            self.model.partial_fit(X)
+        return self.model
+
+    def _iter_clean_chunks(self, chunksize, fill_values):
+        """
+        Yields (raw_len, had_missing, clean_chunk) for each chunk of the CSV,
+        carrying the forward fill across chunk boundaries.
+        """
+        for chunk in pd.read_csv(self.data_path, chunksize=chunksize):
+            had_missing = bool(chunk.isnull().values.any())
+            filled = self._fill_missing(chunk, fill_values)
+            # Carry the row before validation, same as the in-memory ffill
+            fill_values = filled.iloc[-1]
+            yield len(chunk), had_missing, self._validate(filled)
+
+    def _first_valid_values(self, chunksize):
+        """First non-null value of every column (what bfill would use for leading gaps)."""
+        first = None
+        for chunk in pd.read_csv(self.data_path, chunksize=chunksize):
+            values = chunk.bfill().iloc[0]
+            first = values if first is None else first.fillna(values)
+            if not first.isnull().any():
+                break
+        return first
 
-    def _check_threshold(self, value, metric_name):
+    @profiled("detect_anomalies_streaming")
+    def detect_anomalies_streaming(self, chunksize=100_000):
+        """
+        Bounded-memory variant of load_data() + detect_anomalies() for large CSVs.
+
+        Pass 1 reads the file in chunks and accumulates the feature mean/variance
+        online. Pass 2 re-reads it and scores each chunk against those statistics.
+        Peak memory depends on `chunksize`, not on the file size; the anomalies
+        are the same as the in-memory path. self.df is left untouched.
+        """
+        self.reload_rules()
+        try:
+            fill_values = self._first_valid_values(chunksize)
+        except FileNotFoundError:
+            print(f"Error: File {self.data_path} not found.")
+            return AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0])
+        if fill_values is None:
+            return AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0])
+
+        # Pass 1: validation + running statistics
+        self.stats = RunningStats()
+        total, removed, had_missing = 0, 0, False
+        for raw_len, chunk_missing, chunk in self._iter_clean_chunks(chunksize, fill_values):
+            had_missing |= chunk_missing
+            removed += raw_len - len(chunk)
+            total += len(chunk)
+            self.stats.update(chunk[FEATURES].to_numpy(dtype=float))
+
+        if had_missing:
+            print(f"[Warning] Found missing values. Filling with ffill.")
+        if removed:
+            print(f"[Info] Removed {removed} invalid records.")
+        print(f"Loaded {total} records.")
+        PROFILER.count('rows_scored', total)
+
+        # Pass 2: score chunk by chunk against the global statistics
+        results = [AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0])]
+        for _, _, chunk in self._iter_clean_chunks(chunksize, fill_values):
+            if chunk.empty:
+                continue
+            rows = self._rule_rows(chunk)
+            self._apply_scores(chunk, self.stats.mean, self.stats.scale, rows)
+            results.append(self._collect_anomalies(chunk, rows))
+        anomalies = AnomalyResult.concat(results)
+        PROFILER.count('anomalies', len(anomalies))
+        return anomalies
+
+    def _check_threshold(self, value, metric_name, machine_id=None):
         """Helper to check thresholds for a given metric."""
-        rules = self.rules[metric_name]
+        rules = self.rule_table.rules_for(machine_id)[metric_name]
         reasons = []
         is_issue = False
         
@@ -98,7 +371,7 @@ class AnomalyDetector:
             reasons.append(f"WARNING: {metric_name.capitalize()} High ({value} > {rules['normal_max']})")
             
         # Check Low Limits (Skip for Vibration as low is good)
-        if metric_name != 'vibration':
+        if metric_name not in LOW_IS_GOOD:
             if 'critical_low' in rules and value < rules['critical_low']:
                 is_issue = True
                 reasons.append(f"CRITICAL: {metric_name.capitalize()} Low ({value} < {rules['critical_low']})")
@@ -108,67 +381,436 @@ class AnomalyDetector:
                 
         return is_issue, reasons
 
+    def _evaluate_rules(self, values, rows=None):
+        """
+        Vectorized counterpart of _check_threshold for whole columns.
+        `values` maps metric name -> 1-D numpy array; `rows` selects the rule
+        table row per value (see _rule_rows), None = global rules.
+
+        Returns (violations, penalty):
+        - violations: list of (metric, direction, severity, mask) in the same
+          order _check_threshold would emit the reasons.
+        - penalty: base penalty per row (CRITICAL +10, WARNING +5).
+        """
+        table = self.rule_table
+        penalty = None
+        violations = []
+        for j, metric in enumerate(FEATURES):
+            v = np.asarray(values[metric], dtype=float)
+            if penalty is None:
+                penalty = np.zeros(len(v))
+
+            # Undefined limits are NaN in the table so the comparison is always False
+            critical_high = v > table.limit('critical_high', j, rows)
+            warning_high = ~critical_high & (v > table.limit('normal_max', j, rows))
+            checks = [('High', 'CRITICAL', critical_high), ('High', 'WARNING', warning_high)]
+
+            if metric not in LOW_IS_GOOD:
+                critical_low = v < table.limit('critical_low', j, rows)
+                warning_low = ~critical_low & (v < table.limit('normal_min', j, rows))
+                checks += [('Low', 'CRITICAL', critical_low), ('Low', 'WARNING', warning_low)]
+
+            for direction, severity, mask in checks:
+                violations.append((metric, direction, severity, mask))
+                penalty += mask * SEVERITY_PENALTY[severity]
+
+        return violations, penalty
+
+    def _collect_anomalies(self, df, rows=None):
+        """
+        Applies the hard rules to every row of a scored frame at once and
+        returns the flagged rows as an AnomalyResult (reason codes, no text).
+        """
+        if df.empty:
+            return AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0])
+
+        values = {f: df[f].to_numpy(dtype=float) for f in FEATURES}
+        if rows is None:
+            rows = self._rule_rows(df)
+        violations, penalty = self._evaluate_rules(values, rows)
+
+        codes = np.zeros(len(df), dtype=np.int64)
+        for metric, direction, severity, mask in violations:
+            codes[mask] |= reason_bit(FEATURES.index(metric), direction, severity)
+        if self.model is not None:
+            # Unusual combination of readings, whether or not any limit is crossed
+            joint = df['ml_score'].to_numpy() > self.ml_threshold
+            codes[joint] |= multivariate_bit(FEATURES)
+            penalty = penalty + joint * SEVERITY_PENALTY['WARNING']
+        flagged = np.flatnonzero(codes)
+
+        # Score = Weighted Z-Score (+ weighted multivariate distance) + Base Penalty
+        base = df['rule_score'].to_numpy()[flagged]
+        if self.model is not None:
+            base = base + self.ml_weight * df['ml_score'].to_numpy()[flagged]
+        scores = np.round(base + penalty[flagged], 2)
+
+        # Reason text is rendered against the limits each row was checked with
+        rule_sets, rule_index = self.rule_table.rule_sets, None
+        if rows is None or np.ndim(rows) == 0:
+            rule_sets = rule_sets[rows or 0]
+        else:
+            rule_index = rows[flagged]
+        return AnomalyResult(
+            FEATURES,
+            df.index.to_numpy()[flagged],
+            df['timestamp'].to_numpy()[flagged],
+            np.column_stack([values[f][flagged] for f in FEATURES]),
+            scores,
+            codes[flagged],
+            rule_sets,
+            machine_id=df[MACHINE_COLUMN].to_numpy()[flagged] if MACHINE_COLUMN in df.columns else None,
+            rule_index=rule_index,
+        )
+
+    @profiled("detect_anomalies")
     def detect_anomalies(self):
         """
         Detects anomalies using a hybrid approach:
         1. Hard Rule Violations (Domain Knowledge)
         2. Statistical Scoring (Z-score)
         
-        Returns a list of anomalies with enriched info.
+        Rules are evaluated column-wise with NumPy masks rather than row by row.
+        Returns an AnomalyResult; iterating it yields the anomaly dicts.
         """
+        self.reload_rules()
         if self.df is None or self.df.empty:
-            return []
+            return AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0])
 
         # Ensure statistical scores are present
-        self.calculate_statistical_scores()
+        rows = self._rule_rows(self.df)
+        self.calculate_statistical_scores(rows)
 
-        anomalies = []
+        anomalies = self._collect_anomalies(self.df, rows)
+        PROFILER.count('anomalies', len(anomalies))
+        return anomalies
 
-        for index, row in self.df.iterrows():
-            row_is_issue = False
-            row_reasons = []
-            features = ['temp', 'pressure', 'vibration']
-            
-            # --- Check 1: Hard Rules (Domain) using Helper ---
-            base_penalty = 0
-            for feature in features:
-                is_issue, reasons = self._check_threshold(row[feature], feature)
-                if is_issue:
-                    row_is_issue = True
-                    row_reasons.extend(reasons)
-                    
-                    # Add Base Penalty for Rule Violations
-                    # This ensures Score aligns with Warning (>5) / Critical (>15)
-                    for r in reasons:
-                        if "CRITICAL" in r:
-                            base_penalty += 10
-                        elif "WARNING" in r:
-                            base_penalty += 5
-            
-            if row_is_issue:
-                # Construct the anomaly record
-                # Score = Weighted Z-Score + Base Penalty
-                final_score = round(row['rule_score'] + base_penalty, 2)
-                
-                anomalies.append({
-                    'index': index,
-                    'timestamp': row['timestamp'],
-                    'data': {k: row[k] for k in features},
-                    'reasons': row_reasons,
-                    'score': final_score 
-                })
-        
+    @profiled("detect_anomalies_partitioned")
+    def detect_anomalies_partitioned(self, by=MACHINE_COLUMN, max_workers=None):
+        """
+        Multi-machine detection with per-partition statistics.
+
+        Partitions are either the groups of `by` in the CSV at data_path, or,
+        when data_path is a directory, one CSV per machine (file name = machine id).
+        Each partition is cleaned, scored against its own statistics and checked
+        in a process pool; the anomaly lists are merged in timestamp order and
+        every row is tagged with its machine id.
+        """
+        if os.path.isdir(self.data_path):
+            paths = sorted(glob.glob(os.path.join(self.data_path, "*.csv")))
+            tasks = [(os.path.splitext(os.path.basename(p))[0], p) for p in paths]
+        else:
+            try:
+                df = pd.read_csv(self.data_path)
+            except FileNotFoundError:
+                print(f"Error: File {self.data_path} not found.")
+                return AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0])
+            if by not in df.columns:
+                print(f"[Warning] Column '{by}' not found. Treating the file as one partition.")
+                df[by] = None
+            tasks = list(df.groupby(by, sort=False, dropna=False))
+
+        if not tasks:
+            return AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0])
+
+        table = self.reload_rules()
+        tasks = [(key, source, table, self.model, self.ml_weight, self.ml_threshold) for key, source in tasks]
+        if max_workers == 1 or len(tasks) == 1:
+            results = [_detect_partition(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                results = list(pool.map(_detect_partition, tasks))
+
+        total = sum(n for n, _ in results)
+        print(f"Loaded {total} records across {len(tasks)} partitions.")
+        # Stable sort: equal timestamps keep partition order
+        return AnomalyResult.concat([a for _, a in results]).sort_by_timestamp()
+
+    @profiled("update")
+    def update(self, batch):
+        """
+        Online scoring for live feeds.
+        Merges the new readings into the running statistics (limited to the
+        sliding `window` if one is set) and returns anomalies for the new rows
+        only. Cost is O(len(batch)) per call; previous rows are never rescanned.
+        Anomaly 'index' values count rows across all calls.
+        An edited rules file takes effect from the next batch.
+        """
+        anomalies, _, _ = self._update(batch)
+        return anomalies
+
+    def update_alerts(self, batch, alert_state):
+        """
+        update() followed by the alert state machine (see alert_state.py).
+        Returns (anomalies, events): the per-row hits and the
+        open/escalate/clear transitions they caused.
+        """
+        anomalies, batch, rows = self._update(batch)
+        if batch is None:
+            return anomalies, []
+        return anomalies, alert_state.process(batch, self.rule_table, rows, LOW_IS_GOOD)
+
+    def alert_events(self, alert_state, df=None):
+        """Runs the alert state machine over a scored frame (default: self.df)."""
+        df = self.df if df is None else df
+        if df is None or df.empty:
+            return []
+        return alert_state.process(df, self.rule_table, self._rule_rows(df), LOW_IS_GOOD)
+
+    @profiled("detect_incremental")
+    def detect_incremental(self, store):
+        """
+        Scores only the rows appended to data_path since the previous run
+        recorded in `store` (an AnomalyStore), for append-only sensor logs.
+
+        The scaler statistics, forward-fill row and row counter are restored
+        from the watermark, the new complete lines are scored with update()
+        and the anomalies are saved together with the moved watermark.
+        A file that was truncated or edited before the watermark is rescanned
+        from the start. Returns the new anomalies; self.df holds the newly
+        scored rows. The sliding `window` is not persisted between runs.
+        """
+        source = os.path.abspath(self.data_path)
+        try:
+            f = open(self.data_path, 'rb')
+        except FileNotFoundError:
+            print(f"Error: File {self.data_path} not found.")
+            self.df = pd.DataFrame()
+            return AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0])
+
+        state = store.load_state(source)
+        with f:
+            header = f.readline()
+            offset = len(header)
+            resumed = state is not None and self._resume(f, header, state)
+            if resumed:
+                offset = state['byte_offset']
+            else:
+                if state is not None:
+                    print(f"[Warning] {self.data_path} changed before the last watermark. Rescanning from the start.")
+                    store.reset(source)
+                self.stats, self._fill_values, self._rows_seen = None, None, 0
+            f.seek(offset)
+            data = f.read()
+
+        # Only complete lines; a partially written last line waits for the next run
+        complete, sep, _ = data.rpartition(b'\n')
+        new_offset = offset + len(complete) + len(sep)
+        anomalies, batch = AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0]), None
+        if sep:
+            anomalies, batch, _ = self._update(pd.read_csv(io.BytesIO(header + complete + sep)))
+        self.df = batch if batch is not None else pd.DataFrame()
+
+        last_timestamp = state['last_timestamp'] if resumed else None
+        if batch is not None:
+            last_timestamp = max(last_timestamp or 0, int(batch['timestamp'].max().value))
+        with open(self.data_path, 'rb') as f:
+            f.seek(max(new_offset - TAIL_BYTES, 0))
+            tail = f.read(new_offset - f.tell())
+        store.save(source, anomalies, {
+            'header': header,
+            'byte_offset': new_offset,
+            'tail': tail,
+            'rows_seen': self._rows_seen,
+            'last_timestamp': last_timestamp,
+            'scaler': None if self.stats is None else {
+                'count': self.stats.count, 'mean': self.stats.mean.tolist(), 'm2': self.stats.m2.tolist(),
+            },
+            'fill_values': None if self._fill_values is None else self._fill_values.to_dict(),
+        })
+        print(f"[Info] Scored {len(self.df)} new records after the watermark ({len(anomalies)} anomalies).")
         return anomalies
 
+    def _resume(self, f, header, state):
+        """Restores the online state from a watermark if the file still matches it."""
+        offset = state['byte_offset']
+        if header != state['header'] or os.fstat(f.fileno()).st_size < offset:
+            return False
+        f.seek(offset - len(state['tail']))
+        if f.read(len(state['tail'])) != state['tail']:
+            return False
+
+        scaler = state['scaler']
+        self.stats = None
+        if scaler is not None:
+            self.stats = RunningStats()
+            self.stats.count = scaler['count']
+            self.stats.mean = np.array(scaler['mean'])
+            self.stats.m2 = np.array(scaler['m2'])
+        self._fill_values = pd.Series(state['fill_values']) if state['fill_values'] is not None else None
+        self._rows_seen = state['rows_seen']
+        return True
+
+    def _update(self, batch):
+        """update() internals; returns (anomalies, cleaned batch or None, rule rows)."""
+        self.reload_rules()
+        batch = pd.DataFrame(batch)
+        if batch.empty:
+            return AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0]), None, None
+        batch.index = pd.RangeIndex(self._rows_seen, self._rows_seen + len(batch))
+        self._rows_seen += len(batch)
+
+        filled = self._fill_missing(batch, self._fill_values)
+        self._fill_values = filled.iloc[-1]
+        batch = self._validate(filled)
+        if batch.empty:
+            return AnomalyResult.empty(FEATURES, self.rule_table.rule_sets[0]), None, None
+
+        if self.stats is None:
+            self.stats = RunningStats()
+        X = batch[FEATURES].to_numpy(dtype=float)
+        self.stats.update(X)
+        if self.window is not None:
+            self._slide_window(batch['timestamp'].to_numpy(dtype='datetime64[ns]'), X)
+
+        rows = self._rule_rows(batch)
+        self._apply_scores(batch, self.stats.mean, self.stats.scale, rows)
+        return self._collect_anomalies(batch, rows), batch, rows
+
+    def _slide_window(self, timestamps, X):
+        """Keeps the running statistics limited to readings inside self.window."""
+        self._window_batches.append((timestamps, X))
+        cutoff = timestamps.max() - self.window.to_timedelta64()
+        while self._window_batches:
+            ts, rows = self._window_batches[0]
+            expired = ts < cutoff
+            if not expired.any():
+                break
+            self.stats.remove(rows[expired])
+            if expired.all():
+                self._window_batches.popleft()
+            else:
+                self._window_batches[0] = (ts[~expired], rows[~expired])
+
+def _detect_partition(task):
+    """
+    Process-pool worker for detect_anomalies_partitioned().
+    `source` is a raw DataFrame partition or a CSV path; returns (rows, anomalies).
+    """
+    machine_id, source, rule_table, model, ml_weight, ml_threshold = task
+    detector = AnomalyDetector(data_path=None, use_cache=False, ml_threshold=ml_threshold)
+    detector.rule_table = rule_table
+    detector.model, detector.ml_weight = model, ml_weight
+    detector.machine_id = machine_id
+
+    df = pd.read_csv(source) if isinstance(source, str) else source
+    # Gaps are filled within the machine only
+    detector.df = detector._validate(detector._fill_missing(df))
+    anomalies = detector.detect_anomalies().with_machine_id(machine_id)
+    # Stable sort: rows with equal timestamps keep their file order
+    return len(detector.df), anomalies.sort_by_timestamp()
+
+def follow_csv(path, poll_interval=0.1):
+    """
+    Tails a growing CSV file (like `tail -f`).
+    Yields a DataFrame of the complete lines appended since the last read;
+    the first yield contains the rows already in the file.
+    """
+    while not os.path.exists(path):
+        time.sleep(poll_interval)
+
+    with open(path, 'rb') as f:
+        header = f.readline()
+        while not header.endswith(b'\n'):
+            time.sleep(poll_interval)
+            header += f.readline()
+
+        pending = b''
+        while True:
+            data = f.read()
+            if not data:
+                if os.path.getsize(path) < f.tell():
+                    # File was truncated/rotated: start over after the header
+                    f.seek(len(header))
+                    pending = b''
+                time.sleep(poll_interval)
+                continue
+
+            # Only parse complete lines; keep a partial trailing line for later
+            pending += data
+            complete, sep, pending = pending.rpartition(b'\n')
+            if sep:
+                yield pd.read_csv(io.BytesIO(header + complete + sep))
+
 if __name__ == "__main__":
-    detector = AnomalyDetector()
-    detector.load_data()
-    
-    anomalies = detector.detect_anomalies()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Hybrid sensor anomaly detector")
+    parser.add_argument("--data", type=str, default="data/test_data.csv", help="Sensor CSV file (default: data/test_data.csv)")
+    parser.add_argument("--chunksize", type=int, default=None, help="Stream the CSV in chunks of N rows (bounded memory)")
+    parser.add_argument("--follow", action="store_true", help="Tail the CSV and score new rows as they are appended")
+    parser.add_argument("--window", type=str, default=None, help="Sliding statistics window for --follow, e.g. 1h (default: all history)")
+    parser.add_argument("--interval", type=float, default=0.1, help="Poll interval in seconds for --follow (default: 0.1)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the binary sidecar cache")
+    parser.add_argument("--partitioned", action="store_true", help="Per-machine statistics (machine_id column or a directory of per-machine CSVs)")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size for --partitioned (default: all cores)")
+    parser.add_argument("--rules", type=str, default="config/rules.toml", help="TOML/JSON thresholds with per-machine overrides, reloaded on change (default: config/rules.toml)")
+    parser.add_argument("--store", type=str, default=None, help="SQLite anomaly store, e.g. .cache/anomalies.db: only rows past the stored watermark are scored")
+    parser.add_argument("--last-hours", type=float, default=None, help="With --store: list the stored anomalies of the last N hours without reading the CSV")
+    parser.add_argument("--model", type=str, default=None, help="Multivariate (Mahalanobis) model file, e.g. models/mahalanobis.npz; its distance is blended into the score")
+    parser.add_argument("--ml-weight", type=float, default=1.0, help="Weight of the model distance in the score (default: 1.0)")
+    parser.add_argument("--ml-workers", type=int, default=1, help="Threads for batched model scoring (default: 1)")
+    parser.add_argument("--ml-threshold", type=float, default=None, help="Flag rows whose model distance exceeds this as 'WARNING: Multivariate' (default: 4.03, chi-square 99.9%% for 3 metrics)")
+    parser.add_argument("--train", action="store_true", help="With --model: train the model from scratch on this run's normal readings and save it")
+    parser.add_argument("--refit", action="store_true", help="With --model: merge this run's normal readings into the saved model (warm start)")
+    parser.add_argument("--profile", action="store_true", help="Print a per-stage time/memory breakdown at exit")
+    parser.add_argument("--profile-output", type=str, default=None, help="With --profile: also write the metrics as JSON, or Prometheus text for *.prom")
+    args = parser.parse_args()
+
+    if args.profile:
+        PROFILER.enable()
+
+    def print_profile():
+        if not args.profile:
+            return
+        print("\n" + PROFILER.format_report())
+        if args.profile_output:
+            PROFILER.write(args.profile_output)
+            print(f"Profile saved to {args.profile_output}")
+
+    detector = AnomalyDetector(data_path=args.data, window=args.window, use_cache=not args.no_cache, rules_path=args.rules,
+                               model_path=args.model, ml_weight=args.ml_weight, ml_workers=args.ml_workers,
+                               ml_threshold=args.ml_threshold)
+    if args.follow:
+        print(f"Following {args.data} (Ctrl+C to stop)...")
+        try:
+            for batch in follow_csv(args.data, poll_interval=args.interval):
+                started = time.perf_counter()
+                for a in detector.update(batch):
+                    print(f"[{a['timestamp']}] Score: {a['score']} | {'; '.join(a['reasons'])}")
+                print(f"[Info] Scored {len(batch)} new rows in {(time.perf_counter() - started) * 1000:.1f} ms.")
+        except KeyboardInterrupt:
+            pass
+        print_profile()
+        raise SystemExit(0)
+
+    if args.store:
+        from anomaly_store import AnomalyStore
+        store = AnomalyStore(args.store)
+        if args.last_hours is not None:
+            anomalies = store.recent(args.last_hours)
+        else:
+            anomalies = detector.detect_incremental(store)
+    elif args.partitioned:
+        anomalies = detector.detect_anomalies_partitioned(max_workers=args.workers)
+    elif args.chunksize:
+        anomalies = detector.detect_anomalies_streaming(chunksize=args.chunksize)
+    else:
+        detector.load_data()
+        anomalies = detector.detect_anomalies()
     print(f"\nFound {len(anomalies)} anomalies (Hybrid).")
     
-    # Sort by Score desc
-    anomalies.sort(key=lambda x: x['score'], reverse=True)
-    
-    for a in anomalies[:5]:
-        print(f"[{a['timestamp']}] Score: {a['score']} | {'; '.join(a['reasons'])}")
+    # Top 5 by Score desc
+    for a in anomalies.top(5):
+        machine = f" ({a[MACHINE_COLUMN]})" if MACHINE_COLUMN in a else ""
+        print(f"[{a['timestamp']}]{machine} Score: {a['score']} | {'; '.join(a['reasons'])}")
+
+    if args.model and (args.train or args.refit):
+        # Scoring above used the model as saved; this run's readings update it for the next one
+        if detector.df is None:
+            detector.load_data()
+        if detector.df is not None and not detector.df.empty:
+            model = detector.fit_model(warm_start=args.refit)
+            model.save(args.model)
+            print(f"[Info] Model saved to {args.model} ({model.count} normal readings).")
+    print_profile()
@@ -0,0 +1,279 @@
+"""
+Array-backed anomaly results.
+
+Each anomaly is a row in NumPy columns (index, timestamp, values, score) plus
+an integer bitmask of reason codes. A reason code is one
+(metric, direction, severity) combination; reason text is only rendered when
+asked for. Iterating (or indexing with an int) yields the classic anomaly
+dict: {'index', 'timestamp', 'data', 'reasons', 'score'}.
+
+One extra bit after the per-metric ones marks a multivariate (joint)
+deviation: readings inside every limit whose combination is unusual.
+
+With per-machine thresholds, `rules` is a list of rule sets and `rule_index`
+holds the rule set each row was checked against (used for the reason text).
+"""
+import numpy as np
+import pandas as pd
+
+DIRECTIONS = ('High', 'Low')
+SEVERITIES = ('CRITICAL', 'WARNING')
+BITS_PER_METRIC = len(DIRECTIONS) * len(SEVERITIES)
+# Pseudo-metric of the multivariate reason, reported as 'WARNING: Multivariate'
+MULTIVARIATE = 'multivariate'
+
+def reason_bit(metric_index, direction, severity):
+    """
+    Bit for one reason. Within a metric the bit order is High/CRITICAL,
+    High/WARNING, Low/CRITICAL, Low/WARNING - the order reasons are reported in.
+    """
+    return 1 << (metric_index * BITS_PER_METRIC + DIRECTIONS.index(direction) * len(SEVERITIES) + SEVERITIES.index(severity))
+
+def multivariate_bit(metrics):
+    """Bit for a multivariate deviation, after all per-metric bits."""
+    return 1 << (len(metrics) * BITS_PER_METRIC)
+
+def decode_reasons(code, metrics):
+    """
+    Bitmask -> [(metric, direction, severity)] in reporting order. The
+    multivariate reason comes last, as (MULTIVARIATE, None, 'WARNING').
+    """
+    reasons = []
+    for m, metric in enumerate(metrics):
+        for direction in DIRECTIONS:
+            for severity in SEVERITIES:
+                if code & reason_bit(m, direction, severity):
+                    reasons.append((metric, direction, severity))
+    if code & multivariate_bit(metrics):
+        reasons.append((MULTIVARIATE, None, 'WARNING'))
+    return reasons
+
+def severity_mask(metrics, severity):
+    """Bitmask selecting every reason of one severity."""
+    mask = multivariate_bit(metrics) if severity == 'WARNING' else 0
+    for m in range(len(metrics)):
+        for direction in DIRECTIONS:
+            mask |= reason_bit(m, direction, severity)
+    return mask
+
+def reason_name(metric, direction, severity):
+    """'CRITICAL: Temp High' (a reason string without the values)."""
+    if direction is None:
+        return f"{severity}: {metric.capitalize()}"
+    return f"{severity}: {metric.capitalize()} {direction}"
+
+def format_reason(metric, direction, severity, value, rules):
+    """Renders one reason string, e.g. 'CRITICAL: Temp High (55.0 > 52)'."""
+    if direction == 'High':
+        limit = rules['critical_high'] if severity == 'CRITICAL' else rules['normal_max']
+        return f"{reason_name(metric, direction, severity)} ({value} > {limit})"
+    limit = rules['critical_low'] if severity == 'CRITICAL' else rules['normal_min']
+    return f"{reason_name(metric, direction, severity)} ({value} < {limit})"
+
+class AnomalyResult:
+    def __init__(self, metrics, index, timestamp, values, score, codes, rules, machine_id=None, rule_index=None):
+        self.metrics = list(metrics)
+        self.index = np.asarray(index)
+        self.timestamp = np.asarray(timestamp)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.index), len(self.metrics))
+        self.score = np.asarray(score, dtype=float)
+        self.codes = np.asarray(codes, dtype=np.int64)
+        # Threshold tables used to render reason text (metric -> limits), or a
+        # list of them indexed per row by rule_index
+        self.rules = rules
+        self.machine_id = None if machine_id is None else np.asarray(machine_id, dtype=object)
+        self.rule_index = None if rule_index is None else np.asarray(rule_index, dtype=np.int64)
+
+    @classmethod
+    def empty(cls, metrics, rules=None):
+        return cls(metrics, np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[ns]'),
+                   np.empty((0, len(metrics))), np.empty(0), np.empty(0, dtype=np.int64), rules)
+
+    @classmethod
+    def concat(cls, results):
+        """Concatenates results with the same metrics (machine ids kept if any has them)."""
+        results = [r for r in results if r is not None]
+        non_empty = [r for r in results if len(r)] or results[:1]
+        if not non_empty:
+            raise ValueError("concat() needs at least one result")
+        first = non_empty[0]
+        machine_id = None
+        if any(r.machine_id is not None for r in non_empty):
+            machine_id = np.concatenate([
+                r.machine_id if r.machine_id is not None else np.full(len(r), None, dtype=object)
+                for r in non_empty
+            ])
+        rules, rule_index = first.rules, None
+        if any(r.rule_index is not None or r.rules != first.rules for r in non_empty):
+            rules, rule_index = cls._merge_rules(non_empty)
+        return cls(
+            first.metrics,
+            np.concatenate([r.index for r in non_empty]),
+            np.concatenate([r.timestamp for r in non_empty]),
+            np.concatenate([r.values for r in non_empty]),
+            np.concatenate([r.score for r in non_empty]),
+            np.concatenate([r.codes for r in non_empty]),
+            rules,
+            machine_id,
+            rule_index,
+        )
+
+    @staticmethod
+    def _merge_rules(results):
+        """One rule set list for results checked against different rules; returns (rules, rule_index)."""
+        rules, seen, rule_index = [], [], []
+        for r in results:
+            rule_sets = r.rules if r.rule_index is not None else [r.rules]
+            # Equal tables (e.g. copies returned by worker processes) are stored once
+            offset = next((o for known, o in seen if known == rule_sets), None)
+            if offset is None:
+                offset = len(rules)
+                seen.append((rule_sets, offset))
+                rules.extend(rule_sets)
+            local = r.rule_index if r.rule_index is not None else np.zeros(len(r), dtype=np.int64)
+            rule_index.append(local + offset)
+        return rules, np.concatenate(rule_index)
+
+    def take(self, positions):
+        """Subset of rows (positions or boolean mask), as a new result."""
+        return AnomalyResult(
+            self.metrics, self.index[positions], self.timestamp[positions], self.values[positions],
+            self.score[positions], self.codes[positions], self.rules,
+            None if self.machine_id is None else self.machine_id[positions],
+            None if self.rule_index is None else self.rule_index[positions],
+        )
+
+    def with_machine_id(self, machine_id):
+        """Same rows tagged with one machine id."""
+        result = self.take(slice(None))
+        result.machine_id = np.full(len(self), machine_id, dtype=object)
+        return result
+
+    def sort_by_timestamp(self):
+        """Stable sort by timestamp (ties keep their current order)."""
+        return self.take(np.argsort(self.timestamp, kind='stable'))
+
+    def top(self, k):
+        """
+        The k highest-score anomalies, highest first (ties: earlier row first).
+        Uses a partial selection, O(n + k log k) instead of a full sort.
+        """
+        n = len(self)
+        if k <= 0:
+            return self.take(np.empty(0, dtype=np.int64))
+        if k < n:
+            # Everything scoring at least the k-th best, so ties at the cut
+            # are resolved by position below rather than by argpartition
+            cutoff = self.score[np.argpartition(-self.score, k - 1)[k - 1]]
+            candidates = np.flatnonzero(self.score >= cutoff)
+        else:
+            candidates = np.arange(n)
+        order = np.lexsort((candidates, -self.score[candidates]))
+        return self.take(candidates[order[:k]])
+
+    def page(self, number, size):
+        """Rows of 1-based page `number` (in the current order)."""
+        start = (number - 1) * size
+        return self.take(slice(start, start + size))
+
+    # --- Aggregated views ---
+
+    def reason_counts(self):
+        """{reason name: number of anomalies with that reason}, most frequent first."""
+        counts = {}
+        for m, metric in enumerate(self.metrics):
+            for direction in DIRECTIONS:
+                for severity in SEVERITIES:
+                    count = int(np.count_nonzero(self.codes & reason_bit(m, direction, severity)))
+                    if count:
+                        counts[reason_name(metric, direction, severity)] = count
+        count = int(np.count_nonzero(self.codes & multivariate_bit(self.metrics)))
+        if count:
+            counts[reason_name(MULTIVARIATE, None, 'WARNING')] = count
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    def severity_counts(self):
+        severity = self.severity()
+        return {'CRITICAL': int(np.count_nonzero(severity == 2)), 'WARNING': int(np.count_nonzero(severity == 1))}
+
+    def hourly_counts(self):
+        """(hours, counts): anomalies per clock hour, chronological."""
+        hours, counts = np.unique(self.timestamp.astype('datetime64[h]'), return_counts=True)
+        return hours, counts
+
+    def score_histogram(self, bins=10):
+        """(counts, bin_edges) of the score distribution."""
+        if not len(self):
+            return np.zeros(bins, dtype=np.int64), np.linspace(0, 1, bins + 1)
+        return np.histogram(self.score, bins=bins)
+
+    # --- Lazy rendering ---
+
+    def timestamp_at(self, i):
+        return pd.Timestamp(self.timestamp[i])
+
+    def rules_at(self, i):
+        """{metric: limits} row i was checked against."""
+        return self.rules if self.rule_index is None else self.rules[self.rule_index[i]]
+
+    def reason_items(self, i):
+        """[(severity, text)] for row i."""
+        items = []
+        rules = self.rules_at(i)
+        for metric, direction, severity in decode_reasons(int(self.codes[i]), self.metrics):
+            if metric == MULTIVARIATE:
+                items.append((severity, reason_name(metric, direction, severity)))
+                continue
+            value = float(self.values[i, self.metrics.index(metric)])
+            items.append((severity, format_reason(metric, direction, severity, value, rules[metric])))
+        return items
+
+    def reasons(self, i):
+        """Reason strings for row i, as _check_threshold would report them."""
+        return [text for _, text in self.reason_items(i)]
+
+    def reason_names(self):
+        """Distinct reasons present anywhere in the result, without values."""
+        combined = int(np.bitwise_or.reduce(self.codes)) if len(self) else 0
+        return [reason_name(*r) for r in decode_reasons(combined, self.metrics)]
+
+    def severity(self):
+        """Per row: 2 = any CRITICAL reason, 1 = WARNING only."""
+        critical = (self.codes & severity_mask(self.metrics, 'CRITICAL')) != 0
+        return np.where(critical, 2, 1)
+
+    # --- Compatibility with the list-of-dicts format ---
+
+    def record(self, i):
+        record = {
+            'index': self.index[i].item(),
+            'timestamp': self.timestamp_at(i),
+            'data': dict(zip(self.metrics, self.values[i].tolist())),
+            'reasons': self.reasons(i),
+            'score': float(self.score[i]),
+        }
+        if self.machine_id is not None:
+            record['machine_id'] = self.machine_id[i]
+        return record
+
+    def to_records(self):
+        return [self.record(i) for i in range(len(self))]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("anomaly index out of range")
+            return self.record(key)
+        return self.take(key)
+
+    def __repr__(self):
+        return f"AnomalyResult({len(self)} anomalies)"
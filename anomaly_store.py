@@ -0,0 +1,201 @@
+"""
+SQLite store for detected anomalies and incremental-run state.
+
+Anomalies are kept as rows (timestamp in epoch ns, machine id, readings,
+score, reason code bitmask and the rule set they were checked against),
+indexed by timestamp and by (machine_id, timestamp), so "anomalies in the
+last N hours" is an index range scan instead of a CSV re-read.
+
+Per source file a watermark records how far the file was processed (byte
+offset of the last complete line, plus the header and the bytes just before
+the offset to detect rewrites) together with the running scaler statistics,
+the forward-fill row and the row counter. AnomalyDetector.detect_incremental()
+uses it to parse and score only the rows appended since the previous run.
+"""
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detector import FEATURES
+from anomaly_result import AnomalyResult
+
+class AnomalyStore:
+    def __init__(self, path=".cache/anomalies.db", metrics=FEATURES):
+        self.path = path
+        self.metrics = list(metrics)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        metric_columns = "".join(f"{m} REAL, " for m in self.metrics)
+        with self.conn:
+            self.conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS rule_sets (
+                    id INTEGER PRIMARY KEY,
+                    rules TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS anomalies (
+                    source TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    timestamp INTEGER NOT NULL,
+                    machine_id TEXT,
+                    {metric_columns}
+                    score REAL NOT NULL,
+                    codes INTEGER NOT NULL,
+                    rule_set INTEGER NOT NULL REFERENCES rule_sets(id),
+                    PRIMARY KEY (source, row_index)
+                );
+                CREATE INDEX IF NOT EXISTS anomalies_by_time ON anomalies (timestamp);
+                CREATE INDEX IF NOT EXISTS anomalies_by_machine ON anomalies (machine_id, timestamp);
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    source TEXT PRIMARY KEY,
+                    header BLOB NOT NULL,
+                    byte_offset INTEGER NOT NULL,
+                    tail BLOB NOT NULL,
+                    rows_seen INTEGER NOT NULL,
+                    last_timestamp INTEGER,
+                    scaler TEXT,
+                    fill_values TEXT
+                );
+            """)
+
+    def close(self):
+        self.conn.close()
+
+    # --- Watermarks ---
+
+    def load_state(self, source):
+        """Watermark dict for `source`, or None if it was never processed."""
+        row = self.conn.execute(
+            "SELECT header, byte_offset, tail, rows_seen, last_timestamp, scaler, fill_values FROM watermarks WHERE source = ?",
+            (source,),
+        ).fetchone()
+        if row is None:
+            return None
+        header, offset, tail, rows_seen, last_timestamp, scaler, fill_values = row
+        return {
+            'header': header,
+            'byte_offset': offset,
+            'tail': tail,
+            'rows_seen': rows_seen,
+            'last_timestamp': last_timestamp,
+            'scaler': json.loads(scaler) if scaler else None,
+            'fill_values': json.loads(fill_values) if fill_values else None,
+        }
+
+    def save(self, source, anomalies, state):
+        """Appends `anomalies` and moves the watermark of `source`, in one transaction."""
+        with self.conn:
+            self._insert(source, anomalies)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    source, state['header'], state['byte_offset'], state['tail'], state['rows_seen'],
+                    state['last_timestamp'],
+                    json.dumps(state['scaler']) if state['scaler'] is not None else None,
+                    json.dumps(state['fill_values'], default=str) if state['fill_values'] is not None else None,
+                ),
+            )
+
+    def reset(self, source):
+        """Forgets everything stored for `source` (e.g. the file was rewritten)."""
+        with self.conn:
+            self.conn.execute("DELETE FROM anomalies WHERE source = ?", (source,))
+            self.conn.execute("DELETE FROM watermarks WHERE source = ?", (source,))
+
+    def _rule_set_id(self, rules):
+        text = json.dumps(rules, sort_keys=True)
+        self.conn.execute("INSERT OR IGNORE INTO rule_sets (rules) VALUES (?)", (text,))
+        return self.conn.execute("SELECT id FROM rule_sets WHERE rules = ?", (text,)).fetchone()[0]
+
+    def _insert(self, source, anomalies):
+        if not len(anomalies):
+            return
+        if anomalies.rule_index is None:
+            rule_ids = np.full(len(anomalies), self._rule_set_id(anomalies.rules), dtype=np.int64)
+        else:
+            used = np.unique(anomalies.rule_index)
+            ids = {int(r): self._rule_set_id(anomalies.rules[r]) for r in used}
+            rule_ids = np.array([ids[int(r)] for r in anomalies.rule_index], dtype=np.int64)
+        machine_id = anomalies.machine_id if anomalies.machine_id is not None else np.full(len(anomalies), None, dtype=object)
+        values = anomalies.values[:, [anomalies.metrics.index(m) for m in self.metrics]]
+        rows = zip(
+            [source] * len(anomalies),
+            anomalies.index.tolist(),
+            anomalies.timestamp.astype('datetime64[ns]').view('i8').tolist(),
+            [None if m is None else str(m) for m in machine_id],
+            *values.T.tolist(),
+            anomalies.score.tolist(),
+            anomalies.codes.tolist(),
+            rule_ids.tolist(),
+        )
+        placeholders = ", ".join("?" * (len(self.metrics) + 7))
+        self.conn.executemany(f"INSERT OR REPLACE INTO anomalies VALUES ({placeholders})", rows)
+
+    # --- Queries ---
+
+    def query(self, since=None, until=None, machine_id=None):
+        """
+        Stored anomalies with since <= timestamp < until (either bound
+        optional), optionally for one machine, as an AnomalyResult in time order.
+        """
+        where, params = [], []
+        if machine_id is not None:
+            where.append("machine_id = ?")
+            params.append(str(machine_id))
+        if since is not None:
+            where.append("timestamp >= ?")
+            params.append(pd.Timestamp(since).value)
+        if until is not None:
+            where.append("timestamp < ?")
+            params.append(pd.Timestamp(until).value)
+        sql = (f"SELECT row_index, timestamp, machine_id, {', '.join(self.metrics)}, score, codes, rule_set FROM anomalies"
+               + (f" WHERE {' AND '.join(where)}" if where else "")
+               + " ORDER BY timestamp, source, row_index")
+        rows = self.conn.execute(sql, params).fetchall()
+        if not rows:
+            return AnomalyResult.empty(self.metrics)
+
+        columns = list(zip(*rows))
+        n = len(self.metrics)
+        rule_ids, rule_index = np.unique(np.array(columns[5 + n], dtype=np.int64), return_inverse=True)
+        rules = [self._rules(int(i)) for i in rule_ids]
+        machine = np.array(columns[2], dtype=object)
+        return AnomalyResult(
+            self.metrics,
+            np.array(columns[0], dtype=np.int64),
+            np.array(columns[1], dtype=np.int64).view('datetime64[ns]'),
+            np.column_stack([np.array(columns[3 + j], dtype=float) for j in range(n)]),
+            np.array(columns[3 + n], dtype=float),
+            np.array(columns[4 + n], dtype=np.int64),
+            rules[0] if len(rules) == 1 else rules,
+            machine_id=None if all(m is None for m in machine) else machine,
+            rule_index=None if len(rules) == 1 else rule_index,
+        )
+
+    def _rules(self, rule_set_id):
+        return json.loads(self.conn.execute("SELECT rules FROM rule_sets WHERE id = ?", (rule_set_id,)).fetchone()[0])
+
+    def latest_timestamp(self):
+        """Newest reading processed into the store (pd.Timestamp), or None."""
+        value = self.conn.execute("SELECT MAX(last_timestamp) FROM watermarks").fetchone()[0]
+        return None if value is None else pd.Timestamp(value)
+
+    def recent(self, hours, machine_id=None):
+        """
+        Anomalies of the last `hours` hours, ending at the newest processed
+        reading (sensor time, not wall-clock time).
+        """
+        until = self.latest_timestamp()
+        if until is None:
+            return AnomalyResult.empty(self.metrics)
+        return self.query(since=until - pd.Timedelta(hours=hours), machine_id=machine_id)
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM anomalies").fetchone()[0]
@@ -0,0 +1,206 @@
+"""
+Benchmark suite for the detection pipeline.
+
+Times each stage separately (ingestion, scoring, rule detection on the scored
+frame, multivariate model scoring, summary table, reporting, and throughput of
+the ingestion service over loopback TCP) on seeded generated datasets of
+increasing size and records wall time, rows/s, how much the stage raised the
+RSS high-water mark, and the process-wide peak RSS after it (cumulative,
+includes earlier stages). The cold import time of agent.py is recorded under
+'startup'. Results are written as JSON; --compare checks them against a
+baseline and exits non-zero when a stage regresses.
+
+    uv run python benchmark.py --sizes 1000 100000 1000000 --output bench_baseline.json
+    uv run python benchmark.py --compare bench_baseline.json --threshold 0.25
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from profiler import peak_rss_mb
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+STAGES = ['ingest', 'scoring', 'detection', 'ml_scoring', 'summary_table', 'reporting', 'service']
+STARTUP_STAGES = ['import_agent']
+
+class _InstantLLM:
+    """LLM stand-in so 'reporting' measures prompt construction and rendering only."""
+    class _Response:
+        content = "### 1. Trend Analysis\n* benchmark"
+
+    def invoke(self, prompt):
+        return self._Response()
+
+def _measure(results, stage, rows, func):
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - started
+    rss_after = peak_rss_mb()
+    results[stage] = {
+        'wall_time_s': round(elapsed, 6),
+        # High-water mark of the process so far, not of this stage alone
+        # (None where the platform cannot report it, see profiler.peak_rss_mb)
+        'peak_rss_mb': round(rss_after, 1) if rss_after is not None else None,
+        # How far this stage pushed the high-water mark
+        'rss_growth_mb': round(rss_after - rss_before, 1) if rss_after is not None else None,
+        'rows_per_s': round(rows / elapsed, 1) if elapsed > 0 else None,
+        'rows': rows,
+    }
+    return value
+
+def run_size(num_rows, workdir):
+    """Runs every stage on a dataset of `num_rows` rows. Returns {stage: metrics}."""
+    from rich.console import Console
+    from agent import AnomalyAlertAgent
+    from anomaly_detector import AnomalyDetector
+    from data_generator import write_sensor_data
+
+    path = os.path.join(workdir, f"bench_{num_rows}.csv")
+    write_sensor_data(path, num_rows, seed=0)
+
+    results = {}
+    detector = AnomalyDetector(data_path=path, use_cache=False)
+    _measure(results, 'ingest', num_rows, detector.load_data)
+    rows = len(detector.df)
+    rule_rows = detector._rule_rows(detector.df)
+    _measure(results, 'scoring', rows, lambda: detector.calculate_statistical_scores(rule_rows))
+    # Rule evaluation on the already scored frame (detect_anomalies would re-score)
+    anomalies = _measure(results, 'detection', rows, lambda: detector._collect_anomalies(detector.df, rule_rows))
+    model = detector.fit_model()
+    X = detector.df[['temp', 'pressure', 'vibration']].to_numpy(dtype=float)
+    _measure(results, 'ml_scoring', rows, lambda: model.score_samples(X))
+
+    agent = AnomalyAlertAgent(model_name="benchmark", use_cache=False, kb_cache_dir=workdir)
+    agent.console = Console(file=io.StringIO(), width=160)
+    agent.llm = _InstantLLM()
+    _measure(results, 'summary_table', len(anomalies), lambda: agent._print_summary_table(anomalies))
+    _measure(results, 'reporting', len(anomalies), lambda: agent.generate_consolidated_report(anomalies))
+    _measure(results, 'service', rows, _service_runner(detector.df[['timestamp', 'temp', 'pressure', 'vibration']]))
+    return results
+
+def measure_startup(repeat=5):
+    """
+    Cold `import agent` time in a fresh interpreter (best of `repeat`), i.e.
+    the fixed cost paid by every cron-style run before any data is read.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import agent"], cwd=here, check=True)
+        timings.append(time.perf_counter() - started)
+    return {'import_agent': {'wall_time_s': round(min(timings), 6), 'peak_rss_mb': None, 'rss_growth_mb': None,
+                             'rows_per_s': None, 'rows': 0}}
+
+def _service_runner(df, frame_rows=10_000):
+    """Returns a callable that streams `df` through IngestService as binary frames until all rows are scored."""
+    from anomaly_detector import AnomalyDetector
+    from ingest_service import IngestService, encode_frame, send_frames
+
+    class _NullSink:
+        async def emit(self, alerts):
+            pass
+
+        async def close(self):
+            pass
+
+    frames = [encode_frame(df.iloc[i:i + frame_rows]) for i in range(0, len(df), frame_rows)]
+
+    async def main():
+        service = IngestService(AnomalyDetector(data_path=None, use_cache=False), [_NullSink()], port=0)
+        port = await service.start()
+        await send_frames("127.0.0.1", port, frames)
+        while service.stats['readings_received'] < len(df):
+            await asyncio.sleep(0.001)
+        await service.join()
+        await service.stop()
+
+    return lambda: asyncio.run(main())
+
+def _run_size_isolated(num_rows, workdir):
+    """Runs one size in a child process so peak RSS is not inherited from larger runs."""
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(run_size, (num_rows, workdir))
+
+def run_benchmarks(sizes, isolate=True):
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': {},
+    }
+    print("Measuring startup (import agent)...")
+    report['results']['startup'] = measure_startup()
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            print(f"Benchmarking {size} rows...")
+            runner = _run_size_isolated if isolate else run_size
+            report['results'][str(size)] = runner(size, workdir)
+    return report
+
+def compare(current, baseline, threshold=0.25):
+    """
+    Returns a list of regressions: stages whose wall time grew by more than
+    `threshold` (fraction) relative to the baseline for the same size.
+    """
+    regressions = []
+    for size, stages in current['results'].items():
+        for stage, metrics in stages.items():
+            base = baseline['results'].get(size, {}).get(stage)
+            if not base or not base['wall_time_s']:
+                continue
+            ratio = metrics['wall_time_s'] / base['wall_time_s']
+            if ratio > 1 + threshold:
+                regressions.append({
+                    'size': size,
+                    'stage': stage,
+                    'baseline_s': base['wall_time_s'],
+                    'current_s': metrics['wall_time_s'],
+                    'ratio': round(ratio, 2),
+                })
+    return regressions
+
+def print_report(report):
+    print(f"\n{'rows':>10} {'stage':<14} {'wall (s)':>10} {'rows/s':>14} {'RSS growth (MB)':>16} {'peak RSS (MB)':>14}")
+    for size, stages in report['results'].items():
+        for stage in STAGES + STARTUP_STAGES:
+            m = stages.get(stage)
+            if m:
+                print(f"{size:>10} {stage:<14} {m['wall_time_s']:>10.4f} {m['rows_per_s'] or 0:>14,.0f} {m.get('rss_growth_mb') or 0:>16.1f} {m['peak_rss_mb'] or 0:>14.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the anomaly detection pipeline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Dataset sizes in rows (default: 1000 10000 100000)")
+    parser.add_argument("--output", type=str, default="bench_results.json", help="Where to write the JSON results (default: bench_results.json)")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline JSON; exit 1 if any stage regresses past --threshold")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown as a fraction of the baseline (default: 0.25)")
+    parser.add_argument("--no-isolate", action="store_true", help="Run all sizes in this process (faster, RSS is cumulative)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, isolate=not args.no_isolate)
+    print_report(report)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for r in regressions:
+            print(f"[Regression] {r['stage']} @ {r['size']} rows: {r['baseline_s']}s -> {r['current_s']}s (x{r['ratio']})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline.")
@@ -1,97 +1,251 @@
 import pandas as pd
 import numpy as np
-import random
 import argparse
-from datetime import datetime, timedelta
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
-def generate_sensor_data(num_rows=100, start_date=None):
+# Define ranges
+# temp: normal 45–50, abnormal >52 or <43
+# pressure: normal 1.00–1.05, abnormal >1.08 or <0.97
+# vibration: normal 0.02–0.04, abnormal >0.07
+NORMAL_RANGES = {'temp': (45, 50), 'pressure': (1.00, 1.05), 'vibration': (0.02, 0.04)}
+DECIMALS = {'temp': 2, 'pressure': 3, 'vibration': 4}
+
+# (low, high) ranges used for injected anomalies per metric / direction / severity
+ANOMALY_RANGES = {
+    'temp': {
+        ('high', 'critical'): (52.1, 60), ('high', 'warning'): (50.1, 52.0),
+        ('low', 'critical'): (30, 42.9), ('low', 'warning'): (43.0, 44.9),
+    },
+    'pressure': {
+        ('high', 'critical'): (1.081, 1.20), ('high', 'warning'): (1.051, 1.08),
+        ('low', 'critical'): (0.80, 0.969), ('low', 'warning'): (0.97, 0.999),
+    },
+    'vibration': {
+        ('high', 'critical'): (0.071, 0.15), ('high', 'warning'): (0.041, 0.07),
+        # Warning Low (Always warning)
+        ('low', 'critical'): (0.00, 0.019), ('low', 'warning'): (0.00, 0.019),
+    },
+}
+
+# Anomaly types: which metrics an anomalous row affects ('mixed' = all three)
+ANOMALY_TYPES = ['temp', 'pressure', 'vibration', 'mixed']
+
+SCENARIOS = ['drift', 'burst', 'gaps']
+
+ANOMALY_RATE = 0.10  # 10% chance of anomaly/warning
+INTERVAL = np.timedelta64(5, 'm')
+
+def _uniform(rng, low, high, size, decimals):
+    return np.round(rng.uniform(low, high, size), decimals)
+
+def _burst_mask(rng, steps, mean_length=20):
     """
-    Generates dummy sensor data with timestamp, temp, pressure, vibration.
-    Injects ~10% anomalies based on user-defined ranges.
+    Fault episodes along one machine's timeline.
+    Returns (in_burst mask, episode id per step) covering ~ANOMALY_RATE of the steps.
     """
-    
-    # Define ranges
-    # temp: normal 45–50, abnormal >52 or <43
-    # pressure: normal 1.00–1.05, abnormal >1.08 or <0.97
-    # vibration: normal 0.02–0.04, abnormal >0.07
+    n_episodes = max(1, int(steps * ANOMALY_RATE / mean_length))
+    starts = np.sort(rng.integers(0, steps, n_episodes))
+    ends = starts + rng.integers(mean_length // 4, mean_length * 7 // 4 + 1, n_episodes)
 
-    data = []
-    if start_date:
-         current_time = datetime.strptime(start_date, '%Y-%m-%d')
+    marker = np.full(steps, -1)
+    marker[starts] = np.arange(n_episodes)
+    # Latest episode that started at or before each step
+    episode = np.maximum.accumulate(marker)
+    in_burst = (episode >= 0) & (np.arange(steps) < ends[np.maximum(episode, 0)])
+    return in_burst, episode
+
+def _drift_slopes(rng, machines, share=0.5, max_shift=0.4):
+    """
+    Per-machine drift over the full run, per metric (towards the upper limits).
+    About `share` of the machines (at least one) degrade, each in one metric,
+    by at most `max_shift` of the normal band: by the end of the run their
+    readings edge into the warning band instead of leaving it.
+    """
+    slopes = {metric: np.zeros(machines) for metric in NORMAL_RANGES}
+    drifting = rng.random(machines) < share
+    drifting[rng.integers(machines)] = True
+    metric_choice = rng.integers(0, len(NORMAL_RANGES), machines)
+    for m in np.flatnonzero(drifting):
+        metric = list(NORMAL_RANGES)[metric_choice[m]]
+        low, high = NORMAL_RANGES[metric]
+        slopes[metric][m] = rng.uniform(0.1, max_shift) * (high - low)
+    return slopes
+
+def _gap_mask(rng, steps, machines, rate=0.02, max_length=10):
+    """Runs of 1..max_length consecutive missing readings per machine (~`rate` of values)."""
+    n_gaps = rng.binomial(steps * machines, rate * 2 / (max_length + 1))
+    start = rng.integers(0, steps, n_gaps)
+    machine = rng.integers(0, machines, n_gaps)
+    end = np.minimum(start + rng.integers(1, max_length + 1, n_gaps), steps)
+
+    marks = np.zeros((steps + 1, machines), dtype=np.int64)
+    np.add.at(marks, (start, machine), 1)
+    np.add.at(marks, (end, machine), -1)
+    return (np.cumsum(marks, axis=0)[:steps] > 0).ravel()
+
+def _generate_block(rng, start_time, first_step, steps, machines, total_steps, scenarios, drift=None):
+    """
+    Generates `steps` timestamps x `machines` rows starting at step `first_step`
+    (row order: all machines for a timestamp, then the next timestamp).
+    `total_steps` is the length of the whole run and `drift` the per-machine
+    slopes from _drift_slopes() (drift scenario only).
+    """
+    n = steps * machines
+    step = np.repeat(np.arange(first_step, first_step + steps), machines)
+
+    # Fault signature per row: severity, anomaly type, High/Low per metric
+    if 'burst' in scenarios:
+        # Anomalies arrive as fault episodes per machine, each with one signature
+        is_anomaly = np.empty((steps, machines), dtype=bool)
+        episode = np.empty((steps, machines), dtype=np.int64)
+        for m in range(machines):
+            is_anomaly[:, m], episode[:, m] = _burst_mask(rng, steps)
+        is_anomaly = is_anomaly.ravel()
+        episode = (episode + 1 + np.arange(machines) * (steps + 1)).ravel()
+        signature = rng.random((machines * (steps + 1), 5))[episode]
     else:
-         # Default to 2024-06-03 00:00:00 as requested
-         current_time = datetime(2024, 6, 3, 0, 0, 0)
-    
-    for _ in range(num_rows):
-        is_anomaly = random.random() < 0.10  # 10% chance of anomaly/warning
-        
-        timestamp = current_time.strftime('%Y-%m-%d %H:%M:%S')
-        
-        if not is_anomaly:
-            # Generate normal data
-            temp = round(random.uniform(45, 50), 2)
-            pressure = round(random.uniform(1.00, 1.05), 3)
-            vibration = round(random.uniform(0.02, 0.04), 4)
-            label = 'normal'
-        else:
-            # Generate abnormal/warning data
-            # 50% chance of Critical, 50% chance of Warning
-            severity = random.choice(['critical', 'warning'])
-            anomaly_type = random.choice(['temp', 'pressure', 'vibration', 'mixed'])
-            
-            # Defaults
-            temp = round(random.uniform(45, 50), 2)
-            pressure = round(random.uniform(1.00, 1.05), 3)
-            vibration = round(random.uniform(0.02, 0.04), 4)
-
-            # Temp
-            if anomaly_type in ['temp', 'mixed']:
-                if random.choice([True, False]): # High
-                    if severity == 'critical': temp = round(random.uniform(52.1, 60), 2)
-                    else: temp = round(random.uniform(50.1, 52.0), 2) # Warning High
-                else: # Low
-                    if severity == 'critical': temp = round(random.uniform(30, 42.9), 2)
-                    else: temp = round(random.uniform(43.0, 44.9), 2) # Warning Low
-            
-            # Pressure
-            if anomaly_type in ['pressure', 'mixed']:
-                if random.choice([True, False]): # High
-                    if severity == 'critical': pressure = round(random.uniform(1.081, 1.20), 3)
-                    else: pressure = round(random.uniform(1.051, 1.08), 3) # Warning High
-                else: # Low
-                    if severity == 'critical': pressure = round(random.uniform(0.80, 0.969), 3)
-                    else: pressure = round(random.uniform(0.97, 0.999), 3) # Warning Low
-
-            # Vibration
-            if anomaly_type in ['vibration', 'mixed']:
-                 if random.choice([True, False]): # High
-                    if severity == 'critical': vibration = round(random.uniform(0.071, 0.15), 4)
-                    else: vibration = round(random.uniform(0.041, 0.07), 4) # Warning High
-                 else: # Low
-                    vibration = round(random.uniform(0.00, 0.019), 4) # Warning Low (Always warning)
-            
-            label = f'abnormal_{severity}'
-        
-        data.append({
-            'timestamp': timestamp,
-            'temp': temp,
-            'pressure': pressure,
-            'vibration': vibration,
-        })
-        
-        current_time += timedelta(minutes=5)
-    
-    df = pd.DataFrame(data)
+        is_anomaly = rng.random(n) < ANOMALY_RATE
+        signature = rng.random((n, 5))
+    critical = signature[:, 0] < 0.5  # 50% chance of Critical, 50% chance of Warning
+    anomaly_type = (signature[:, 1] * len(ANOMALY_TYPES)).astype(int)
+
+    columns = {}
+    for i, metric in enumerate(['temp', 'pressure', 'vibration']):
+        decimals = DECIMALS[metric]
+        values = _uniform(rng, *NORMAL_RANGES[metric], n, decimals)
+
+        affected = is_anomaly & ((anomaly_type == i) | (anomaly_type == 3))
+        high = signature[:, 2 + i] < 0.5
+        for (direction, severity), (low, hi) in ANOMALY_RANGES[metric].items():
+            mask = affected & (high == (direction == 'high')) & (critical == (severity == 'critical'))
+            count = int(mask.sum())
+            if count:
+                values[mask] = _uniform(rng, low, hi, count, decimals)
+
+        if drift is not None:
+            # Gradual degradation: linear drift over the whole run
+            progress = step / max(total_steps - 1, 1)
+            values = np.round(values + np.tile(drift[metric], steps) * progress, decimals)
+
+        columns[metric] = values
+
+    if 'gaps' in scenarios:
+        for metric in columns:
+            columns[metric][_gap_mask(rng, steps, machines)] = np.nan
+
+    timestamps = np.datetime64(start_time, 's') + step * INTERVAL
+    df = pd.DataFrame({'timestamp': timestamps, **columns})
+    if machines > 1:
+        df.insert(1, 'machine_id', np.tile(np.array([f"M{m + 1:03d}" for m in range(machines)]), steps))
     return df
 
+def _start_time(start_date):
+    if start_date:
+        return datetime.strptime(start_date, '%Y-%m-%d')
+    # Default to 2024-06-03 00:00:00 as requested
+    return datetime(2024, 6, 3, 0, 0, 0)
+
+def _parse_scenarios(scenario):
+    if not scenario:
+        return set()
+    names = {s.strip() for s in scenario.split(',')} if isinstance(scenario, str) else set(scenario)
+    unknown = names - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenario(s): {', '.join(sorted(unknown))}. Choose from {SCENARIOS}.")
+    return names
+
+def generate_sensor_data(num_rows=100, start_date=None, seed=None, machines=1, scenario=None):
+    """
+    Generates dummy sensor data with timestamp, temp, pressure, vibration.
+    Injects ~10% anomalies based on user-defined ranges.
+
+    - seed: makes the output reproducible.
+    - machines: > 1 adds a machine_id column; each timestamp has one row per machine.
+    - scenario: any of 'drift', 'burst', 'gaps' (list or comma separated).
+    """
+    rng = np.random.default_rng(seed)
+    scenarios = _parse_scenarios(scenario)
+    steps = -(-num_rows // machines)
+    drift = _drift_slopes(rng, machines) if 'drift' in scenarios else None
+    df = _generate_block(rng, _start_time(start_date), 0, steps, machines, steps, scenarios, drift).iloc[:num_rows]
+    df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+def _render_chunk(task):
+    """Process-pool worker: generates one chunk and renders it as CSV text."""
+    seed_seq, start_time, first_step, steps, machines, total_steps, scenarios, drift, rows, header = task
+    rng = np.random.default_rng(seed_seq)
+    df = _generate_block(rng, start_time, first_step, steps, machines, total_steps, scenarios, drift).iloc[:rows]
+    return len(df), df.to_csv(index=False, header=header, date_format='%Y-%m-%d %H:%M:%S')
+
+def write_sensor_data(path, num_rows, chunk_rows=1_000_000, start_date=None, seed=None, machines=1, scenario=None, workers=None):
+    """
+    Streams generated data to a CSV file in chunks, so memory stays constant
+    regardless of `num_rows`. Same options as generate_sensor_data().
+
+    CSV text formatting dominates the cost, so chunks are rendered in a process
+    pool (`workers`, default: all cores) and written in order. Every chunk has
+    its own seed derived from `seed`: the same seed and chunk_rows give the
+    same file for any number of workers.
+    """
+    scenarios = _parse_scenarios(scenario)
+    total_steps = -(-num_rows // machines)
+    chunk_steps = max(1, chunk_rows // machines)
+    start_time = _start_time(start_date)
+
+    root = np.random.SeedSequence(seed)
+    drift = _drift_slopes(np.random.default_rng(root), machines) if 'drift' in scenarios else None
+    chunk_starts = range(0, total_steps, chunk_steps)
+    tasks = (
+        (chunk_seed, start_time, first_step, min(chunk_steps, total_steps - first_step),
+         machines, total_steps, scenarios, drift, num_rows - first_step * machines, first_step == 0)
+        for chunk_seed, first_step in zip(root.spawn(len(chunk_starts)), chunk_starts)
+    )
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    written = 0
+    with open(path, 'w', newline='') as f:
+        if workers == 1:
+            for task in tasks:
+                rows, text = _render_chunk(task)
+                f.write(text)
+                written += rows
+            return written
+
+        # Keep at most 2 chunks per worker in flight to bound memory
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(_render_chunk, task))
+                if len(pending) >= 2 * workers:
+                    rows, text = pending.popleft().result()
+                    f.write(text)
+                    written += rows
+            while pending:
+                rows, text = pending.popleft().result()
+                f.write(text)
+                written += rows
+    return written
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Generate dummy sensor data for Anomaly Alert Agent.')
     parser.add_argument('--rows', type=int, default=10, help='Number of rows to generate (default: 100)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible output')
+    parser.add_argument('--machines', type=int, default=1, help='Number of machines (adds a machine_id column when > 1)')
+    parser.add_argument('--scenario', type=str, default=None, help=f"Comma separated scenarios: {', '.join(SCENARIOS)}")
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000, help='Rows generated per chunk while writing (default: 1000000)')
+    parser.add_argument('--output', type=str, default='data/test_data.csv', help='Output CSV (default: data/test_data.csv)')
+    parser.add_argument('--workers', type=int, default=None, help='Processes used to render CSV chunks (default: all cores)')
     args = parser.parse_args()
 
     print(f"Generating {args.rows} rows of sensor data...")
-    df = generate_sensor_data(num_rows=args.rows)
-    output_file = "data/test_data.csv"
-    df.to_csv(output_file, index=False)
-    print(f"Data generated and saved to {output_file}")
-    print(df.head())
+    written = write_sensor_data(
+        args.output, args.rows, chunk_rows=args.chunk_rows,
+        seed=args.seed, machines=args.machines, scenario=args.scenario, workers=args.workers
+    )
+    print(f"Data generated and saved to {args.output} ({written} rows)")
+    print(pd.read_csv(args.output, nrows=5))
@@ -0,0 +1,205 @@
+"""
+Pre-LLM aggregation of anomalies into episodes.
+
+Consecutive or nearby anomalies with the same reasons (and machine) are merged
+into one episode, and the timeline text sent to the LLM is kept within a
+character budget: the highest-score episodes are listed verbatim, the rest
+are summarized per reason.
+
+An AnomalyResult is coalesced on its arrays (timestamp, machine_id, codes,
+score); reason text is rendered only for the episodes that end up verbatim
+in the timeline.
+"""
+import numpy as np
+import pandas as pd
+
+from anomaly_result import decode_reasons, reason_name
+
+def reason_key(reason):
+    """'CRITICAL: Temp High (55.0 > 52)' -> 'CRITICAL: Temp High'"""
+    return reason.split(" (", 1)[0]
+
+def coalesce_episodes(anomalies, max_gap="15min"):
+    """
+    Merges anomalies into episodes.
+    An anomaly joins the latest episode with the same machine and reason set
+    if it starts within `max_gap` of that episode's end.
+    Returns episodes in start-time order; each keeps its member anomalies.
+    """
+    if hasattr(anomalies, 'codes'):
+        return _coalesce_result(anomalies, pd.Timedelta(max_gap))
+    max_gap = pd.Timedelta(max_gap)
+    episodes = []
+    latest = {}  # (machine, reasons) -> most recent episode
+
+    for a in sorted(anomalies, key=lambda a: pd.Timestamp(a['timestamp'])):
+        timestamp = pd.Timestamp(a['timestamp'])
+        key = (a.get('machine_id'), tuple(reason_key(r) for r in a['reasons']))
+        episode = latest.get(key)
+
+        if episode is None or timestamp - episode['end'] > max_gap:
+            episode = {
+                'machine_id': key[0],
+                'reasons': key[1],
+                'start': timestamp,
+                'end': timestamp,
+                'count': 0,
+                'peak_score': a['score'],
+                'peak_timestamp': timestamp,
+                'peak_values': a.get('data', {}),
+                'peak_reasons': a['reasons'],
+                'anomalies': [],
+            }
+            episodes.append(episode)
+            latest[key] = episode
+
+        episode['end'] = timestamp
+        episode['count'] += 1
+        episode['anomalies'].append(a)
+        if a['score'] > episode['peak_score']:
+            episode['peak_score'] = a['score']
+            episode['peak_timestamp'] = timestamp
+            episode['peak_values'] = a.get('data', {})
+            episode['peak_reasons'] = a['reasons']
+
+    return episodes
+
+def _coalesce_result(result, max_gap):
+    """
+    coalesce_episodes() for an AnomalyResult, without rendering any row.
+    Episodes refer back to `result`: 'positions' are their rows in it and
+    'peak' the row whose reasons the timeline shows.
+    """
+    n = len(result)
+    if n == 0:
+        return []
+    if result.machine_id is not None:
+        machine_codes, machines = pd.factorize(result.machine_id, use_na_sentinel=False)
+    else:
+        machine_codes, machines = np.zeros(n, dtype=np.int64), np.array([None], dtype=object)
+    group, _ = pd.factorize(machine_codes.astype(np.int64) * (int(result.codes.max()) + 1) + result.codes)
+    timestamp = result.timestamp.astype('datetime64[ns]')
+
+    # Rows per (machine, reasons) in time order; ties keep their row order
+    order = np.lexsort((timestamp, group))
+    ts, g = timestamp[order], group[order]
+    new = np.r_[True, (g[1:] != g[:-1]) | (np.diff(ts) > max_gap.to_timedelta64())]
+    starts = np.flatnonzero(new)
+    ends = np.r_[starts[1:], n]
+    episode = np.cumsum(new) - 1
+
+    # Peak: highest score, earliest in time on ties
+    by_score = np.lexsort((np.arange(n), -result.score[order], episode))
+    peaks = order[by_score[np.r_[True, episode[by_score][1:] != episode[by_score][:-1]]]]
+
+    # Episodes in start-time order (ties: the first row comes first)
+    firsts = order[starts]
+    ranking = np.lexsort((firsts, ts[starts]))
+
+    # Per-episode columns, in output order, gathered before building the dicts
+    starts, ends, peaks = starts[ranking], ends[ranking], peaks[ranking]
+    peak_codes = result.codes[peaks].tolist()
+    names = {code: tuple(reason_name(*r) for r in decode_reasons(code, result.metrics)) for code in set(peak_codes)}
+    return [
+        {
+            'machine_id': machine,
+            'reasons': names[code],
+            'start': start,
+            'end': end_ts,
+            'count': end - s,
+            'peak_score': score,
+            'peak_timestamp': peak_ts,
+            'peak': peak,
+            'positions': order[s:end],
+            'result': result,
+        }
+        for s, end, peak, code, machine, start, end_ts, score, peak_ts in zip(
+            starts.tolist(), ends.tolist(), peaks.tolist(), peak_codes,
+            machines[machine_codes[order[starts]]].tolist(), ts[starts], ts[ends - 1],
+            result.score[peaks].tolist(), timestamp[peaks],
+        )
+    ]
+
+def _peak_reasons(episode):
+    if 'peak_reasons' in episode:
+        return episode['peak_reasons']
+    return episode['result'].reasons(episode['peak'])
+
+def format_episode(episode):
+    """One timeline line per episode (single anomalies keep the original format)."""
+    machine = f" ({episode['machine_id']})" if episode['machine_id'] is not None else ""
+    issues = ', '.join(_peak_reasons(episode))
+    start = pd.Timestamp(episode['start'])
+    if episode['count'] == 1:
+        return f"- [{start}]{machine} Score: {episode['peak_score']} | Issues: {issues}\n"
+    return (
+        f"- [{start} -> {pd.Timestamp(episode['end'])}]{machine} {episode['count']} anomalies | "
+        f"Peak Score: {episode['peak_score']} at {pd.Timestamp(episode['peak_timestamp'])} | Issues: {issues}\n"
+    )
+
+def _format_summary(reasons, group):
+    count = sum(e['count'] for e in group)
+    start = pd.Timestamp(min(e['start'] for e in group))
+    end = pd.Timestamp(max(e['end'] for e in group))
+    peak = max(e['peak_score'] for e in group)
+    return (
+        f"- (summarized) {len(group)} more episodes / {count} anomalies of "
+        f"[{', '.join(reasons) or 'unspecified'}] between {start} and {end}, peak score {peak}\n"
+    )
+
+def _omitted(count):
+    return f"- (summarized) {count} further reason groups omitted\n"
+
+def format_timeline(episodes, max_chars=6000):
+    """
+    Renders the anomaly timeline within `max_chars`.
+    Highest peak-score episodes are kept verbatim (in time order); the others
+    are folded into one summary line per reason set.
+    """
+    # Lines are rendered on demand: only as many as the budget can hold
+    lines = {}
+
+    def render(i):
+        if i not in lines:
+            lines[i] = format_episode(episodes[i])
+        return lines[i]
+
+    total = 0
+    for i in range(len(episodes)):
+        total += len(render(i))
+        if total > max_chars:
+            break
+    else:
+        return "".join(render(i) for i in range(len(episodes)))
+
+    # Reserve room for the summary of whatever does not fit verbatim,
+    # and at least for the "omitted" line closing it
+    ranked = np.argsort(-np.array([e['peak_score'] for e in episodes], dtype=float), kind='stable')
+    verbatim_budget = min(max_chars * 3 // 4, max_chars - len(_omitted(len(episodes))))
+    kept, used = set(), 0
+    for i in ranked.tolist():
+        if used + len(render(i)) > verbatim_budget:
+            break
+        kept.add(i)
+        used += len(render(i))
+
+    groups = {}
+    for i, e in enumerate(episodes):
+        if i not in kept:
+            groups.setdefault(e['reasons'], []).append(e)
+    # Most severe groups first so they survive if the summary is cut
+    summaries = sorted(groups.items(), key=lambda item: max(e['peak_score'] for e in item[1]), reverse=True)
+
+    summary_lines = []
+    for n, (reasons, group) in enumerate(summaries):
+        line = _format_summary(reasons, group)
+        remaining = len(summaries) - n - 1
+        reserve = len(_omitted(remaining)) if remaining else 0
+        if used + len(line) + reserve > max_chars:
+            if used + len(_omitted(remaining + 1)) <= max_chars:
+                summary_lines.append(_omitted(remaining + 1))
+            break
+        summary_lines.append(line)
+        used += len(line)
+
+    return "".join(render(i) for i in sorted(kept)) + "".join(summary_lines)
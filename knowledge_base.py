@@ -0,0 +1,117 @@
+"""
+Section index over the SOP knowledge base (config/knowledge_base.md).
+
+The markdown is split into `## ` sections once. Failure-mode sections are keyed
+by (metric, direction) from their **Pattern:** line, the combined-anomaly
+bullets by the set of (metric, direction) pairs they mention. Sections without
+a pattern (e.g. the severity policy) are always included.
+The index is cached as JSON (in a .cache/ directory next to the markdown file
+unless told otherwise) and rebuilt when the markdown file changes.
+"""
+import json
+import os
+import re
+
+INDEX_VERSION = 1
+
+METRIC_ALIASES = {'temp': 'temp', 'temperature': 'temp', 'pressure': 'pressure', 'vibration': 'vibration'}
+
+PATTERN_RE = re.compile(r"\*\*Pattern:\*\*\s*(\w+)\s*([<>])", re.IGNORECASE)
+COMBO_TERM_RE = re.compile(r"\b(High|Low)\s+(Temp|Temperature|Pressure|Vibration)\b", re.IGNORECASE)
+REASON_RE = re.compile(r"^\w+:\s*(\w+)\s+(High|Low)\b")
+MULTIVARIATE_RE = re.compile(r"^\w+:\s*Multivariate\b")
+
+def reason_metric_direction(reason):
+    """'CRITICAL: Temp High (55.0 > 52)' -> ('temp', 'High'), or None."""
+    match = REASON_RE.match(reason)
+    if not match or match.group(1).lower() not in METRIC_ALIASES:
+        return None
+    return METRIC_ALIASES[match.group(1).lower()], match.group(2).capitalize()
+
+def _key(metric, direction):
+    return f"{METRIC_ALIASES[metric.lower()]}:{direction.capitalize()}"
+
+class KnowledgeBaseIndex:
+    def __init__(self, preamble, sections):
+        self.preamble = preamble
+        # [{'text', 'keys': [...], 'combos': [{'keys': [...], 'text'}] }]
+        self.sections = sections
+
+    @classmethod
+    def build(cls, text):
+        """Parses the markdown into keyed sections."""
+        parts = re.split(r"(?m)^(?=## )", text)
+        preamble = parts[0] if not parts[0].startswith("## ") else ""
+        sections = []
+        for part in parts:
+            if not part.startswith("## "):
+                continue
+            keys = []
+            for metric, op in PATTERN_RE.findall(part):
+                if metric.lower() in METRIC_ALIASES:
+                    keys.append(_key(metric, 'High' if op == '>' else 'Low'))
+
+            combos = []
+            if not keys:
+                # Combined patterns: one bullet per multi-sensor failure mode
+                for line in part.splitlines():
+                    terms = COMBO_TERM_RE.findall(line)
+                    if line.lstrip().startswith("-") and len(terms) >= 2:
+                        combos.append({'keys': sorted({_key(m, d) for d, m in terms}), 'text': line})
+
+            heading = part.splitlines()[0]
+            sections.append({'heading': heading, 'text': part, 'keys': keys, 'combos': combos})
+        return cls(preamble, sections)
+
+    @classmethod
+    def load(cls, path, cache_dir=None):
+        """
+        Returns the index for `path`, reusing the JSON cache while the file is unchanged.
+        `cache_dir` defaults to .cache/ next to `path`, independent of the working directory.
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+        cache_path = os.path.join(cache_dir, "kb_index.json")
+        st = os.stat(path)
+        source = {'version': INDEX_VERSION, 'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        try:
+            with open(cache_path, "r") as f:
+                cached = json.load(f)
+            if cached['source'] == source:
+                return cls(cached['preamble'], cached['sections'])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        with open(path, "r") as f:
+            index = cls.build(f.read())
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_path, "w") as f:
+                json.dump({'source': source, 'preamble': index.preamble, 'sections': index.sections}, f)
+        except OSError:
+            pass
+        return index
+
+    def select(self, reasons):
+        """
+        Knowledge base text relevant to the given reason strings: the preamble,
+        general sections, failure-mode sections matching a detected
+        (metric, direction), and combined patterns whose parts were all detected
+        (all of them for a multivariate reason, whose parts stay within limits).
+        """
+        detected, joint = set(), False
+        for reason in reasons:
+            pair = reason_metric_direction(reason)
+            if pair:
+                detected.add(_key(*pair))
+            joint = joint or MULTIVARIATE_RE.match(reason) is not None
+
+        selected = [self.preamble]
+        for section in self.sections:
+            if section['combos']:
+                matches = [c['text'] for c in section['combos'] if joint or set(c['keys']) <= detected]
+                if matches:
+                    selected.append(section['heading'] + "\n" + "\n".join(matches) + "\n")
+            elif not section['keys'] or detected & set(section['keys']):
+                selected.append(section['text'])
+        return "".join(selected)
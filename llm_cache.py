@@ -0,0 +1,123 @@
+"""
+On-disk cache for LLM responses.
+
+Entries are keyed by a hash of everything that determines the answer (model,
+prompt template, knowledge base, anomaly timeline), stored one JSON file per
+entry and evicted by age and least-recent use.
+"""
+import hashlib
+import json
+import os
+import time
+
+class ResponseCache:
+    def __init__(self, cache_dir=".cache/llm", max_entries=256, max_bytes=50 * 1024 * 1024, max_age=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age  # Seconds since the entry was last used
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts):
+        """Stable hash of the inputs that determine a response."""
+        digest = hashlib.sha256()
+        for part in parts:
+            data = str(part).encode("utf-8")
+            # Length prefix keeps ("ab", "c") and ("a", "bc") apart
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached response text, or None on a miss."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # The file mtime tracks last access for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["content"]
+
+    def put(self, key, content, **metadata):
+        """Stores a response, then evicts expired / least recently used entries."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {"created": time.time(), "content": content, **metadata}
+        path = self._path(key)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+        self.evict()
+
+    def _entries(self):
+        """Returns [(path, last_access, size)] for all entries."""
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, st.st_mtime, st.st_size))
+        return entries
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Drops entries unused for max_age, then the least recently used ones over the limits."""
+        now = time.time()
+        entries = []
+        for path, last_access, size in self._entries():
+            if now - last_access > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((last_access, path, size))
+
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, path, size = entries.pop(0)
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Removes every entry. Returns the number removed."""
+        entries = self._entries()
+        for path, _, _ in entries:
+            self._remove(path)
+        return len(entries)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, _, size in entries),
+        }
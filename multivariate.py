@@ -0,0 +1,151 @@
+"""
+Multivariate anomaly model: Mahalanobis distance to the normal operating point.
+
+Per-metric z-scores treat temp, pressure and vibration independently, so a
+combination that is unusual only jointly (e.g. low pressure together with
+high vibration, the cavitation pattern in the knowledge base) scores like
+two unrelated mild deviations. MahalanobisModel learns the mean and
+covariance of normal readings and scores each row by its distance
+sqrt((x - mean)^T cov^-1 (x - mean)), which accounts for the correlations.
+
+- Training merges batches into a running count / mean / co-moment matrix
+  (parallel Welford, as RunningStats), so partial_fit() on new readings
+  warm-starts from the saved model instead of retraining on all history.
+- The model is saved as a small .npz (no pickle) and reloaded by later runs.
+- score_samples() works on large row blocks with one matrix product each,
+  optionally spread over threads (NumPy releases the GIL in matmul).
+- distance_cutoff() gives the distance above which a row is unusual: for
+  Gaussian readings the squared distance is chi-square distributed with one
+  degree of freedom per feature.
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MODEL_VERSION = 1
+
+def _chi2_cdf(x, dof):
+    """Chi-square CDF (regularized lower incomplete gamma, power series)."""
+    if x <= 0:
+        return 0.0
+    a, half = dof / 2, x / 2
+    term = total = 1 / a
+    n = 0
+    while term > total * 1e-15:
+        n += 1
+        term *= half / (a + n)
+        total += term
+    return min(1.0, total * math.exp(a * math.log(half) - half - math.lgamma(a)))
+
+def distance_cutoff(dof, quantile=0.999):
+    """
+    Mahalanobis distance that normal (Gaussian) rows stay below with
+    probability `quantile`: the square root of the chi-square quantile.
+    """
+    lo, hi = 0.0, 1.0
+    while _chi2_cdf(hi, dof) < quantile:
+        hi *= 2
+    for _ in range(100):
+        mid = (lo + hi) / 2
+        if _chi2_cdf(mid, dof) < quantile:
+            lo = mid
+        else:
+            hi = mid
+    return math.sqrt(hi)
+
+class MahalanobisModel:
+    def __init__(self, features, ridge=1e-6):
+        self.features = list(features)
+        # Relative diagonal loading, keeps the covariance invertible
+        self.ridge = ridge
+        d = len(self.features)
+        self.count = 0
+        self.mean = np.zeros(d)
+        self.comoment = np.zeros((d, d))
+        self._whitener = None
+
+    def partial_fit(self, X):
+        """Merges a batch of (normal) rows into the model."""
+        X = np.asarray(X, dtype=float)
+        X = X[~np.isnan(X).any(axis=1)]
+        n = len(X)
+        if n == 0:
+            return self
+        batch_mean = X.mean(axis=0)
+        centered = X - batch_mean
+        batch_comoment = centered.T @ centered
+
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.comoment = self.comoment + batch_comoment + np.outer(delta, delta) * self.count * n / total
+        self.count = total
+        self._whitener = None
+        return self
+
+    def fit(self, X):
+        """Trains from scratch."""
+        self.count = 0
+        self.mean = np.zeros(len(self.features))
+        self.comoment = np.zeros((len(self.features),) * 2)
+        return self.partial_fit(X)
+
+    @property
+    def covariance(self):
+        return self.comoment / self.count if self.count else np.eye(len(self.features))
+
+    def _whitening(self):
+        """W with W W^T = cov^-1, so distance^2 = |(x - mean) W|^2."""
+        if self._whitener is None:
+            cov = self.covariance
+            loading = self.ridge * max(np.trace(cov) / len(cov), np.finfo(float).tiny)
+            precision = np.linalg.inv(cov + loading * np.eye(len(cov)))
+            self._whitener = np.linalg.cholesky((precision + precision.T) / 2)
+        return self._whitener
+
+    def score_samples(self, X, batch_rows=262_144, workers=1):
+        """Mahalanobis distance per row (NaN rows score 0), in blocks of `batch_rows`."""
+        X = np.asarray(X, dtype=float)
+        if self.count < 2 or len(X) == 0:
+            return np.zeros(len(X))
+        W = self._whitening()
+        out = np.empty(len(X))
+
+        def score_block(start):
+            block = X[start:start + batch_rows]
+            Y = (block - self.mean) @ W
+            out[start:start + len(block)] = np.sqrt(np.einsum('ij,ij->i', Y, Y))
+
+        starts = range(0, len(X), batch_rows)
+        if workers > 1 and len(starts) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(score_block, starts))
+        else:
+            for start in starts:
+                score_block(start)
+        return np.nan_to_num(out, nan=0.0)
+
+    # --- Persistence ---
+
+    def save(self, path):
+        """Writes the model as .npz (atomically replaces an existing file)."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, 'wb') as f:
+            np.savez(f, version=MODEL_VERSION, features=np.array(self.features), ridge=self.ridge,
+                     count=self.count, mean=self.mean, comoment=self.comoment)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != MODEL_VERSION:
+                raise ValueError(f"{path}: unsupported model version {int(data['version'])}")
+            model = cls([str(f) for f in data['features']], ridge=float(data['ridge']))
+            model.count = int(data['count'])
+            model.mean = data['mean']
+            model.comoment = data['comoment']
+        return model
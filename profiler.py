@@ -0,0 +1,189 @@
+"""
+Lightweight per-stage instrumentation.
+
+PROFILER collects, per named stage, the number of calls, wall time and the
+process peak RSS, plus free-form counters (rows, prompt size, LLM tokens) and
+gauges. It is off by default: a disabled stage costs one attribute check, so
+the hooks stay in the hot paths permanently. Enable it with --profile on
+agent.py / anomaly_detector.py, or in code:
+
+    from profiler import PROFILER
+    PROFILER.enable()
+    ...
+    print(PROFILER.format_report())
+    PROFILER.write("profile.json")   # or "profile.prom" for Prometheus text
+
+Stages may nest (detect_anomalies includes calculate_statistical_scores), so
+stage times do not add up to the total. Peak RSS is the process high-water
+mark (as in benchmark.py); `rss_growth_mb` is how much a stage raised it.
+Both are None where the `resource` module is missing (Windows).
+Work done in worker processes (--partitioned) is only visible as the
+enclosing stage.
+"""
+import contextlib
+import functools
+import inspect
+import json
+import re
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if the platform cannot tell."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class Profiler:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.stages = {}    # name -> {'calls', 'total_s', 'max_s', 'peak_rss_mb', 'rss_growth_mb'}
+        self.counters = {}  # name -> running total
+        self.gauges = {}    # name -> last value
+        self._started = time.perf_counter()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        if enabled:
+            self.reset()
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            rss_after = peak_rss_mb()
+            stage = self.stages.setdefault(name, {'calls': 0, 'total_s': 0.0, 'max_s': 0.0, 'peak_rss_mb': None, 'rss_growth_mb': None})
+            stage['calls'] += 1
+            stage['total_s'] += elapsed
+            stage['max_s'] = max(stage['max_s'], elapsed)
+            if rss_after is not None:
+                stage['peak_rss_mb'] = max(stage['peak_rss_mb'] or 0.0, rss_after)
+                stage['rss_growth_mb'] = (stage['rss_growth_mb'] or 0.0) + rss_after - rss_before
+
+    def stage(self, name):
+        """Context manager timing one stage (a no-op while disabled)."""
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed(name)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    # --- Export ---
+
+    def to_dict(self):
+        peak = peak_rss_mb()
+        return {
+            'wall_time_s': round(time.perf_counter() - self._started, 6),
+            'peak_rss_mb': round(peak, 1) if peak is not None else None,
+            'stages': {
+                name: {key: round(value, 6) if isinstance(value, float) else value for key, value in stage.items()}
+                for name, stage in self.stages.items()
+            },
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix="anomaly_agent"):
+        """Prometheus text exposition format (one scrape's worth of samples)."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{labels} {value}")
+
+        def stage_samples(key):
+            return [(f'{{stage="{name}"}}', stage[key]) for name, stage in self.stages.items() if stage[key] is not None]
+
+        metric("stage_calls_total", "counter", "Calls per pipeline stage.", stage_samples('calls'))
+        metric("stage_seconds_total", "counter", "Wall time spent per pipeline stage.", stage_samples('total_s'))
+        metric("stage_seconds_max", "gauge", "Slowest single call per pipeline stage.", stage_samples('max_s'))
+        rss_samples = [(labels, int(mb * 1024 * 1024)) for labels, mb in stage_samples('peak_rss_mb')]
+        if rss_samples:
+            metric("stage_peak_rss_bytes", "gauge", "Process peak RSS at the end of the stage.", rss_samples)
+        for name, value in self.counters.items():
+            metric(f"{_metric_name(name)}_total", "counter", f"{name} (counter).", [("", value)])
+        for name, value in self.gauges.items():
+            metric(_metric_name(name), "gauge", f"{name} (gauge).", [("", value)])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes Prometheus text for *.prom / *.txt paths, JSON otherwise."""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def format_report(self):
+        """Plain-text per-stage breakdown, slowest stage first."""
+        summary = self.to_dict()
+        lines = [f"{'stage':<30} {'calls':>6} {'total (s)':>10} {'max (s)':>10} {'peak RSS (MB)':>14} {'RSS +MB':>8}"]
+        for name, stage in sorted(self.stages.items(), key=lambda item: item[1]['total_s'], reverse=True):
+            lines.append(f"{name:<30} {stage['calls']:>6} {stage['total_s']:>10.4f} {stage['max_s']:>10.4f} "
+                         f"{_mb(stage['peak_rss_mb']):>14} {_mb(stage['rss_growth_mb']):>8}")
+        for name, value in {**self.counters, **self.gauges}.items():
+            lines.append(f"{name:<30} {value:>,.6g}")
+        lines.append(f"Total {summary['wall_time_s']:.3f}s, peak RSS {_mb(summary['peak_rss_mb'])} MB")
+        return "\n".join(lines)
+
+def _mb(value):
+    return "n/a" if value is None else f"{value:.1f}"
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+# Process-wide profiler used by the pipeline hooks
+PROFILER = Profiler()
+
+def profiled(name):
+    """Decorator timing every call of a function (sync or async) as stage `name`."""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not PROFILER.enabled:
+                    return await func(*args, **kwargs)
+                with PROFILER._timed(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with PROFILER._timed(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def token_usage(response):
+    """(prompt tokens, completion tokens) reported by a LangChain message, or (None, None)."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage:
+        return usage.get('input_tokens'), usage.get('output_tokens')
+    # Ollama's raw counters
+    metadata = getattr(response, 'response_metadata', None) or {}
+    return metadata.get('prompt_eval_count'), metadata.get('eval_count')
@@ -0,0 +1,254 @@
+"""
+Threshold configuration with per-machine overrides.
+
+Rules and weights are read from a TOML or JSON file (see config/rules.toml):
+
+    [rules.temp]                      # global limits (merged onto the defaults)
+    critical_high = 52
+    [weights]
+    vibration = 3.0
+    [types.pump.rules.temp]           # machine type overrides
+    critical_high = 55
+    [machines.M001]                   # machine -> type, plus its own overrides
+    type = "pump"
+    [machines.M002.rules.pressure]
+    critical_high = 1.10
+
+The config is compiled into a RuleTable: dense (rule set x metric) arrays,
+with row 0 holding the global rules and machines sharing identical limits
+sharing a row. Evaluating rows for thousands of machines is one gather per
+limit, the same cost as a single global rule set. RulesWatcher re-reads the
+file when it changes and swaps in the new table.
+"""
+import json
+import os
+import time
+import tomllib
+
+import numpy as np
+import pandas as pd
+
+LIMITS = ('critical_high', 'normal_max', 'critical_low', 'normal_min')
+
+# Built-in thresholds, used for anything the config file does not set.
+# Normal: Safe range
+# Warning: Gray area (User defined)
+# Critical: User defined "Abnormal"
+DEFAULT_RULES = {
+    'temp': {
+        'normal_min': 45, 'normal_max': 50,
+        'critical_high': 52, 'critical_low': 43
+        # Implied: 50 < x <= 52 is Warning High, 43 <= x < 45 is Warning Low
+    },
+    'pressure': {
+        'normal_min': 1.00, 'normal_max': 1.05,
+        'critical_high': 1.08, 'critical_low': 0.97
+    },
+    'vibration': {
+        'normal_min': 0.02, 'normal_max': 0.04,
+        'critical_high': 0.07
+        # Warning Low: < 0.02 (User requested)
+    }
+}
+
+# Verification weights for composite score (relative importance)
+DEFAULT_WEIGHTS = {'temp': 1.0, 'pressure': 2.0, 'vibration': 3.0} # Example: Vibration is critical
+
+def _merge_rules(base, overrides, where):
+    rules = {metric: dict(limits) for metric, limits in base.items()}
+    for metric, limits in (overrides or {}).items():
+        if metric not in rules:
+            raise ValueError(f"{where}: unknown metric '{metric}'")
+        for name, value in limits.items():
+            if name not in LIMITS:
+                raise ValueError(f"{where}: unknown limit '{metric}.{name}' (expected one of {', '.join(LIMITS)})")
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise ValueError(f"{where}: '{metric}.{name}' must be a number")
+            rules[metric][name] = value
+
+    # Limits must nest: critical_low <= normal_min <= normal_max <= critical_high
+    for metric, limits in rules.items():
+        ordered = [limits[name] for name in ('critical_low', 'normal_min', 'normal_max', 'critical_high') if name in limits]
+        if ordered != sorted(ordered):
+            raise ValueError(f"{where}: limits for '{metric}' are out of order: {limits}")
+    return rules
+
+def _merge_weights(base, overrides, where):
+    weights = dict(base)
+    for metric, value in (overrides or {}).items():
+        if metric not in weights:
+            raise ValueError(f"{where}: unknown metric '{metric}' in weights")
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError(f"{where}: weight for '{metric}' must be a number")
+        weights[metric] = float(value)
+    return weights
+
+class RuleTable:
+    """
+    Compiled thresholds. Row r of every array is one distinct rule set;
+    row 0 is the global one. `machines` maps machine id -> row.
+    """
+    def __init__(self, rule_sets, weight_sets, machines=None, low_is_good=()):
+        self.rule_sets = rule_sets
+        self.weight_sets = weight_sets
+        self.machines = dict(machines or {})
+        self.features = list(rule_sets[0])
+        self.low_is_good = tuple(low_is_good)
+
+        # limits[name][row, metric]; undefined limits are NaN so comparisons
+        # are always False. Low limits of low-is-good metrics are never checked.
+        self.limits = {
+            name: np.array([
+                [np.nan if name in ('critical_low', 'normal_min') and metric in low_is_good
+                 else rules[metric].get(name, np.nan) for metric in self.features]
+                for rules in rule_sets
+            ], dtype=float)
+            for name in LIMITS
+        }
+        self.weights = np.array([[w[metric] for metric in self.features] for w in weight_sets], dtype=float)
+        self._machine_index = pd.Index(list(self.machines), dtype=object)
+        self._machine_rows = np.array(list(self.machines.values()), dtype=np.int64)
+
+    @classmethod
+    def from_config(cls, config, low_is_good=()):
+        """Compiles a parsed config dict (see module docstring)."""
+        unknown = set(config) - {'rules', 'weights', 'types', 'machines'}
+        if unknown:
+            raise ValueError(f"Unknown config section(s): {', '.join(sorted(unknown))}")
+
+        base_rules = _merge_rules(DEFAULT_RULES, config.get('rules'), "rules")
+        base_weights = _merge_weights(DEFAULT_WEIGHTS, config.get('weights'), "weights")
+        types = {}
+        for name, spec in config.get('types', {}).items():
+            types[name] = (
+                _merge_rules(base_rules, spec.get('rules'), f"types.{name}"),
+                _merge_weights(base_weights, spec.get('weights'), f"types.{name}"),
+            )
+
+        rule_sets, weight_sets = [base_rules], [base_weights]
+        rows = {json.dumps([base_rules, base_weights], sort_keys=True): 0}
+
+        def row_for(rules, weights):
+            # Machines with identical limits share one row
+            key = json.dumps([rules, weights], sort_keys=True)
+            if key not in rows:
+                rows[key] = len(rule_sets)
+                rule_sets.append(rules)
+                weight_sets.append(weights)
+            return rows[key]
+
+        machines = {}
+        for machine_id, spec in config.get('machines', {}).items():
+            rules, weights = base_rules, base_weights
+            if 'type' in spec:
+                if spec['type'] not in types:
+                    raise ValueError(f"machines.{machine_id}: unknown type '{spec['type']}'")
+                rules, weights = types[spec['type']]
+            rules = _merge_rules(rules, spec.get('rules'), f"machines.{machine_id}")
+            weights = _merge_weights(weights, spec.get('weights'), f"machines.{machine_id}")
+            machines[str(machine_id)] = row_for(rules, weights)
+        return cls(rule_sets, weight_sets, machines, low_is_good)
+
+    @classmethod
+    def load(cls, path, low_is_good=()):
+        """Reads a .json or .toml config file."""
+        with open(path, 'rb') as f:
+            if path.endswith('.json'):
+                config = json.load(f)
+            else:
+                config = tomllib.load(f)
+        return cls.from_config(config, low_is_good)
+
+    def with_global(self, rules=None, weights=None):
+        """
+        New table with the global rule set (row 0) replaced. `rules` replaces
+        the global limits as a whole, `weights` is merged onto the current
+        ones. Machine rows are kept as compiled.
+        """
+        rule_sets, weight_sets = list(self.rule_sets), list(self.weight_sets)
+        if rules is not None:
+            rule_sets[0] = _merge_rules({metric: {} for metric in self.features}, rules, "rules")
+        if weights is not None:
+            weight_sets[0] = _merge_weights(weight_sets[0], weights, "weights")
+        return type(self)(rule_sets, weight_sets, self.machines, self.low_is_good)
+
+    def rows_for(self, machine_ids):
+        """
+        Rule row per machine id (array), or for one id (int). Unknown machines
+        use the global row 0; None is returned when no machine has overrides.
+        """
+        if not self.machines or machine_ids is None:
+            return None
+        if np.ndim(machine_ids) == 0:
+            return self.machines.get(str(machine_ids), 0)
+
+        # Look up each distinct id once, then broadcast with the codes
+        codes, uniques = pd.factorize(np.asarray(machine_ids))
+        if uniques.dtype.kind in 'iu':
+            uniques = uniques.astype(str)
+        positions = self._machine_index.get_indexer(uniques)
+        lookup = np.append(np.where(positions >= 0, self._machine_rows[positions], 0), 0)
+        # Missing ids have code -1, i.e. the trailing global row
+        return lookup[codes]
+
+    def limit(self, name, metric_index, rows=None):
+        """Limit column for the given rows (scalar when rows is None or an int)."""
+        return self.limits[name][0 if rows is None else rows, metric_index]
+
+    def weights_for(self, rows=None):
+        """(n_metrics,) weights, or (n_rows, n_metrics) for an array of rows."""
+        return self.weights[0 if rows is None else rows]
+
+    def rules_for(self, machine_id=None):
+        """{metric: limits} in effect for one machine."""
+        row = self.rows_for(machine_id) if machine_id is not None else None
+        return self.rule_sets[row or 0]
+
+class RulesWatcher:
+    """
+    Keeps a RuleTable in sync with its config file.
+    poll() re-stats the file at most every `check_interval` seconds and, when
+    it changed, compiles the new config and replaces `table` in one assignment,
+    so callers holding the previous table keep a consistent view. An invalid
+    edit is reported and the previous table stays active.
+    """
+    def __init__(self, path, low_is_good=(), check_interval=1.0):
+        self.path = path
+        self.low_is_good = low_is_good
+        self.check_interval = check_interval
+        self._signature = None
+        self._checked_at = 0.0
+        if os.path.exists(path):
+            # A broken config at startup is an error, not a silent fallback
+            self._signature = self._stat()
+            self.table = RuleTable.load(path, low_is_good)
+        else:
+            print(f"[Warning] Rules file {path} not found. Using built-in thresholds.")
+            self.table = RuleTable.from_config({}, low_is_good)
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def poll(self, force=False):
+        """Reloads the config if the file changed. Returns True when the table was replaced."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            table = RuleTable.load(self.path, self.low_is_good)
+        except (OSError, ValueError) as e:
+            print(f"[Warning] Ignoring invalid rules file {self.path}: {e}")
+            return False
+        self.table = table
+        print(f"[Rules] Reloaded {self.path} ({len(table.machines)} machine overrides).")
+        return True
@@ -0,0 +1,119 @@
+"""
+Binary sidecar cache for parsed sensor CSVs.
+
+The cleaned DataFrame produced by AnomalyDetector.load_data() is stored next to
+the source file as one .npy file per column (`<file>.cache/`), so later runs can
+memory-map it instead of re-parsing text and timestamps.
+The cache is keyed by the source path, size and mtime; any change invalidates it.
+The number of rows dropped while cleaning is kept in the metadata so a cache
+hit can report it like a fresh parse.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+META_FILE = "meta.json"
+
+def cache_dir_for(path):
+    """Sidecar directory for a source file."""
+    return f"{path}.cache"
+
+def _source_key(path):
+    st = os.stat(path)
+    return {
+        'version': CACHE_VERSION,
+        'path': os.path.abspath(path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+    }
+
+def _encode_column(series):
+    """Returns (array, column meta) for one DataFrame column."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        tz = getattr(series.dt, 'tz', None)
+        values = series.dt.tz_convert('UTC').dt.tz_localize(None) if tz is not None else series
+        values = values.to_numpy()
+        unit, _ = np.datetime_data(values.dtype)
+        # Epoch int64 in the column's own resolution
+        return values.view('int64'), {'kind': 'datetime', 'unit': unit, 'tz': str(tz) if tz else None}
+
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy(dtype=np.float64)
+        # Sensor values are stored as float32 only when that is lossless,
+        # threshold checks and reason text must see the exact parsed value.
+        compact = values.astype(np.float32)
+        if np.array_equal(compact.astype(np.float64), values, equal_nan=True):
+            values = compact
+        return values, {'kind': 'float'}
+
+    if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(), {'kind': 'number'}
+
+    # Text columns (e.g. machine_id): integer codes + categories
+    codes, uniques = pd.factorize(series)
+    return codes.astype(np.int32), {'kind': 'category', 'categories': [str(u) for u in uniques]}
+
+def _decode_column(values, meta):
+    if meta['kind'] == 'datetime':
+        column = pd.Series(values.view(f"datetime64[{meta['unit']}]"), copy=False)
+        if meta['tz']:
+            column = column.dt.tz_localize('UTC').dt.tz_convert(meta['tz'])
+        return column
+    if meta['kind'] == 'category':
+        categories = np.array(meta['categories'] + [None], dtype=object)
+        # Code -1 (missing) maps to the trailing None
+        return pd.Series(categories[values], copy=False)
+    return pd.Series(values, copy=False)
+
+def write_cache(path, df, removed=0):
+    """
+    Writes `df` as the sidecar cache of source file `path` (atomic replace).
+    `removed`: invalid rows dropped from the source, returned in df.attrs on read.
+    """
+    target = cache_dir_for(path)
+    tmp = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    meta = {'source': _source_key(path), 'rows': len(df), 'removed': int(removed), 'columns': []}
+    np.save(os.path.join(tmp, "__index__.npy"), df.index.to_numpy(dtype=np.int64))
+    for i, name in enumerate(df.columns):
+        values, column_meta = _encode_column(df[name])
+        column_meta.update({'name': name, 'file': f"col{i}.npy"})
+        np.save(os.path.join(tmp, column_meta['file']), values)
+        meta['columns'].append(column_meta)
+    with open(os.path.join(tmp, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+def read_cache(path):
+    """
+    Returns the cached DataFrame for source file `path`, or None when there is
+    no cache or it is stale. Column data is memory-mapped, not read eagerly.
+    df.attrs['removed'] holds the invalid-row count given to write_cache().
+    """
+    target = cache_dir_for(path)
+    try:
+        with open(os.path.join(target, META_FILE)) as f:
+            meta = json.load(f)
+        if meta['source'] != _source_key(path):
+            return None
+
+        index = np.load(os.path.join(target, "__index__.npy"), mmap_mode='r')
+        columns = {}
+        for column_meta in meta['columns']:
+            values = np.load(os.path.join(target, column_meta['file']), mmap_mode='r')
+            columns[column_meta['name']] = _decode_column(values, column_meta)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    df = pd.DataFrame(columns, copy=False)
+    df.index = pd.Index(index)
+    df.attrs['removed'] = meta.get('removed', 0)
+    return df
@@ -1,19 +1,300 @@
 import pytest
 from unittest.mock import mock_open, patch
-from agent import AnomalyAlertAgent
+import asyncio
+import os
+import subprocess
+import sys
+from agent import AnomalyAlertAgent, group_anomalies
 
 class TestAgent:
-    def test_load_knowledge_base_success(self):
+    def test_load_knowledge_base_success(self, tmp_path):
         mock_content = "# Mock KB content"
         with patch("builtins.open", mock_open(read_data=mock_content)):
             # We also need to mock AnomalyDetector inside Agent init to avoid FS calls
             with patch("agent.AnomalyDetector"):
-                agent = AnomalyAlertAgent(model_name="test")
+                agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path))
                 # Creating agent calls _load_knowledge_base immediately
                 assert agent.knowledge_base == mock_content
 
-    def test_load_knowledge_base_missing(self):
+    def test_load_knowledge_base_missing(self, tmp_path):
         with patch("builtins.open", side_effect=FileNotFoundError):
              with patch("agent.AnomalyDetector"):
-                agent = AnomalyAlertAgent(model_name="test")
+                agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path))
                 assert "No Standard Operating Procedure available" in agent.knowledge_base
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+class FakeLLM:
+    """Stand-in for ChatOllama that records every prompt."""
+    def __init__(self, content="### 1. Trend Analysis\n* ok"):
+        self.content = content
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return FakeResponse(self.content)
+
+SAMPLE_ANOMALIES = [
+    {'index': 1, 'timestamp': '2024-01-01 10:05:00', 'data': {}, 'reasons': ["CRITICAL: Temp High (55.0 > 52)"], 'score': 18.5},
+]
+
+class TestReportCache:
+    def _agent(self, tmp_path, **kwargs):
+        with patch("agent.AnomalyDetector"):
+            agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), cache_dir=str(tmp_path), **kwargs)
+        agent.llm = FakeLLM()
+        return agent
+
+    def test_repeated_report_uses_cache(self, tmp_path):
+        agent = self._agent(tmp_path)
+
+        first = agent.generate_consolidated_report(SAMPLE_ANOMALIES)
+        second = agent.generate_consolidated_report(SAMPLE_ANOMALIES)
+
+        assert first == second
+        assert len(agent.llm.prompts) == 1
+        assert "CRITICAL: Temp High" in agent.llm.prompts[0]
+        assert (agent.cache.hits, agent.cache.misses) == (1, 1)
+
+    def test_changed_timeline_misses(self, tmp_path):
+        agent = self._agent(tmp_path)
+        agent.generate_consolidated_report(SAMPLE_ANOMALIES)
+        agent.generate_consolidated_report(SAMPLE_ANOMALIES + [dict(SAMPLE_ANOMALIES[0], score=20.0)])
+        assert len(agent.llm.prompts) == 2
+
+    def test_cache_disabled(self, tmp_path):
+        agent = self._agent(tmp_path, use_cache=False)
+        agent.generate_consolidated_report(SAMPLE_ANOMALIES)
+        agent.generate_consolidated_report(SAMPLE_ANOMALIES)
+        assert len(agent.llm.prompts) == 2
+
+class TestAsyncReporting:
+    def _agent(self, tmp_path, responses):
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        with patch("agent.AnomalyDetector"):
+            agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), cache_dir=str(tmp_path))
+        agent.llm = FakeListChatModel(responses=responses)
+        return agent
+
+    def test_stream_report(self, tmp_path):
+        agent = self._agent(tmp_path, ["### 1. Trend Analysis\n* streamed"])
+        content = asyncio.run(agent.astream_consolidated_report(SAMPLE_ANOMALIES))
+        assert content == "### 1. Trend Analysis\n* streamed"
+        # Streamed reports are cached like blocking ones
+        assert agent.generate_consolidated_report(SAMPLE_ANOMALIES) == content
+        assert agent.cache.hits == 1
+
+    def test_concurrent_reports_respect_limit(self, tmp_path):
+        agent = self._agent(tmp_path, ["report"])
+        in_flight, peak = 0, 0
+        original = agent.llm.ainvoke
+
+        async def tracked_ainvoke(prompt, *args, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return await original(prompt, *args, **kwargs)
+
+        object.__setattr__(agent.llm, "ainvoke", tracked_ainvoke)
+        anomalies = [dict(SAMPLE_ANOMALIES[0], machine_id=f"M{i}") for i in range(6)]
+        groups = group_anomalies(anomalies, by="machine")
+
+        results = asyncio.run(agent.agenerate_reports(groups, concurrency=2))
+
+        assert set(results) == {f"M{i}" for i in range(6)}
+        assert peak == 2
+
+    def test_group_by_episode(self):
+        anomalies = SAMPLE_ANOMALIES + [dict(SAMPLE_ANOMALIES[0], timestamp='2024-01-01 18:00:00')]
+        groups = group_anomalies(anomalies, by="episode")
+        assert len(groups) == 2
+        assert all(len(g) == 1 for g in groups.values())
+        assert list(group_anomalies(anomalies, by="machine")) == ['all']
+
+def test_summary_table_colors_by_severity(tmp_path):
+    import io
+    import pandas as pd
+    from rich.console import Console
+    from anomaly_detector import AnomalyDetector
+
+    detector = AnomalyDetector()
+    detector.df = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-01-01 10:00:00', '2024-01-01 10:05:00']),
+        'temp': [55.0, 51.0], 'pressure': [1.02, 1.02], 'vibration': [0.03, 0.03],
+    })
+    anomalies = detector.detect_anomalies()
+
+    with patch("agent.AnomalyDetector"):
+        agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), use_cache=False)
+    agent.console = Console(file=io.StringIO(), width=200, force_terminal=False)
+    agent._print_summary_table(anomalies)
+
+    output = agent.console.file.getvalue()
+    assert "CRITICAL: Temp High (55.0 > 52)" in output
+    assert "WARNING: Temp High (51.0 > 50)" in output
+    assert "2024-01-01 10:05:00" in output
+
+def test_summary_table_pages_and_aggregate_view(tmp_path):
+    import io
+    import pandas as pd
+    from rich.console import Console
+    from anomaly_detector import AnomalyDetector
+
+    detector = AnomalyDetector()
+    detector.df = pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=120, freq='5min'),
+        'temp': [55.0 + i * 0.01 for i in range(120)], 'pressure': [1.02] * 120, 'vibration': [0.03] * 120,
+    })
+    anomalies = detector.detect_anomalies()
+
+    with patch("agent.AnomalyDetector"):
+        agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), use_cache=False)
+    agent.console = Console(file=io.StringIO(), width=200, force_terminal=False)
+
+    agent._print_summary_table(anomalies, page=3, page_size=50)
+    output = agent.console.file.getvalue()
+    assert "Rows 101-120 of 120 | Page 3/3" in output
+    assert output.count("CRITICAL: Temp High") == 20
+
+    agent.console.file = io.StringIO()
+    agent._print_summary_table(anomalies, top=3)
+    assert "(56.19 > 52)" in agent.console.file.getvalue()
+    assert agent.console.file.getvalue().count("CRITICAL: Temp High") == 3
+
+    agent.console.file = io.StringIO()
+    agent._print_aggregate_view(anomalies)
+    output = agent.console.file.getvalue()
+    assert "CRITICAL 120" in output
+    assert "2024-01-01 09:00" in output
+
+def test_import_does_not_load_llm_stack():
+    # Startup cost for detect-only/cron runs: importing agent must not pull in
+    # langchain, scikit-learn or Rich's Markdown renderer
+    heavy = ["langchain_ollama", "langchain_core", "sklearn", "rich.markdown"]
+    code = f"import sys, agent; print([m for m in {heavy!r} if m in sys.modules])"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+def test_llm_client_created_lazily(tmp_path):
+    with patch("agent.AnomalyDetector"):
+        agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), use_cache=False)
+    with patch("langchain_ollama.ChatOllama") as chat:
+        assert chat.call_count == 0
+        assert agent.llm is chat.return_value
+        assert agent.llm is chat.return_value
+        chat.assert_called_once_with(model="test")
+
+def test_detect_only_skips_reporting(tmp_path):
+    import io
+    from rich.console import Console
+    import numpy as np
+    from anomaly_result import AnomalyResult
+
+    with patch("agent.AnomalyDetector") as detector:
+        detector.return_value.detect_anomalies.return_value = AnomalyResult(
+            ['temp'], [0], np.array(['2024-01-01T10:00'], dtype='datetime64[ns]'), [[55.0]], [18.5], [1], {'temp': {'critical_high': 52}})
+        agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), use_cache=False, use_llm=False)
+    agent.console = Console(file=io.StringIO(), width=200)
+    agent.run()
+
+    assert agent.llm is None
+    assert "Detect-only mode" in agent.console.file.getvalue()
+
+def test_detect_only_skips_llm_cache(tmp_path):
+    with patch("agent.AnomalyDetector"):
+        agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), cache_dir=str(tmp_path / "llm"), use_llm=False)
+    assert agent.cache is None
+    assert not (tmp_path / "llm").exists()
+
+def test_debounce_reports_transitions_only(tmp_path):
+    import io
+    from rich.console import Console
+    import numpy as np
+    import pandas as pd
+    from alert_state import AlertStateMachine
+    from anomaly_result import AnomalyResult
+
+    events = [
+        {'event': 'open', 'machine_id': 'M001', 'metric': 'temp', 'direction': 'High', 'severity': 'WARNING',
+         'timestamp': pd.Timestamp('2024-01-01 10:10'), 'value': 51.0, 'limit': 50.0},
+        {'event': 'clear', 'machine_id': 'M001', 'metric': 'temp', 'direction': 'High', 'severity': 'WARNING',
+         'timestamp': pd.Timestamp('2024-01-01 11:00'), 'value': 47.0, 'limit': 50.0},
+    ]
+    with patch("agent.AnomalyDetector") as detector:
+        detector.return_value.detect_anomalies.return_value = AnomalyResult(
+            ['temp'], [0, 2], np.array(['2024-01-01T10:00', '2024-01-01T10:10'], dtype='datetime64[ns]'),
+            [[51.0], [51.0]], [3.0, 3.0], [2, 2], {'temp': {'normal_max': 50}})
+        detector.return_value.alert_events.return_value = events
+        agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), cache_dir=str(tmp_path), alert_state=AlertStateMachine())
+    agent.console = Console(file=io.StringIO(), width=200)
+    agent.llm = FakeLLM()
+
+    agent.run()
+    agent.run()
+    output = agent.console.file.getvalue()
+    assert "2 anomalous rows -> 2 alert transitions" in output
+    assert "Alert Transitions" in output
+    # The prompt is the transition timeline; unchanged transitions hit the cache
+    assert len(agent.llm.prompts) == 1
+    assert "OPEN WARNING: Temp High (51.0 > 50)" in agent.llm.prompts[0]
+
+    detector.return_value.alert_events.return_value = []
+    agent.run()
+    assert len(agent.llm.prompts) == 1
+    assert "No alert state transitions" in agent.console.file.getvalue()
+
+def test_profile_records_prompt_and_llm_usage(tmp_path):
+    from profiler import PROFILER
+
+    class UsageLLM(FakeLLM):
+        def invoke(self, prompt):
+            response = super().invoke(prompt)
+            response.usage_metadata = {'input_tokens': 321, 'output_tokens': 12}
+            return response
+
+    with patch("agent.AnomalyDetector"):
+        agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), cache_dir=str(tmp_path))
+    agent.llm = UsageLLM()
+    PROFILER.enable()
+    try:
+        agent.generate_consolidated_report(SAMPLE_ANOMALIES)
+        agent.generate_consolidated_report(SAMPLE_ANOMALIES)
+        counters = dict(PROFILER.counters)
+        stages = dict(PROFILER.stages)
+    finally:
+        PROFILER.enable(False)
+        PROFILER.reset()
+
+    assert stages['generate_consolidated_report']['calls'] == 2
+    assert stages['llm_invoke']['calls'] == 1
+    assert counters['prompts'] == 2
+    assert counters['prompt_chars'] == 2 * len(agent.llm.prompts[0])
+    assert (counters['llm_calls'], counters['llm_cache_hits']) == (1, 1)
+    assert (counters['llm_prompt_tokens'], counters['llm_completion_tokens']) == (321, 12)
+
+def test_store_runs_incrementally(tmp_path):
+    import io
+    from rich.console import Console
+    from data_generator import write_sensor_data
+
+    path = str(tmp_path / "log.csv")
+    write_sensor_data(path, 1000, seed=2)
+
+    def run(**kwargs):
+        agent = AnomalyAlertAgent(model_name="test", kb_cache_dir=str(tmp_path), use_cache=False, use_llm=False,
+                                  store_path=str(tmp_path / "anomalies.db"), **kwargs)
+        agent.detector.data_path = path
+        agent.console = Console(file=io.StringIO(), width=200)
+        agent.run()
+        return agent.console.file.getvalue()
+
+    assert "System Normal" not in run()
+    # Second run: nothing new past the watermark
+    assert "System Normal" in run()
+    # ...but the last hours are answered from the store
+    assert "System Normal" not in run(hours=24)
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from alert_state import AlertStateMachine, format_event, format_events
+from anomaly_detector import AnomalyDetector, LOW_IS_GOOD
+from rules_config import RuleTable
+
+TABLE = RuleTable.from_config({}, LOW_IS_GOOD)
+
+def _frame(temps, start='2024-01-01', machine_id=None):
+    df = pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=len(temps), freq='1min'),
+        'temp': np.asarray(temps, dtype=float),
+        'pressure': 1.02,
+        'vibration': 0.03,
+    })
+    if machine_id is not None:
+        df['machine_id'] = machine_id
+    return df
+
+def _kinds(events):
+    return [(e['event'], e['severity']) for e in events]
+
+def test_oscillation_opens_once_and_clears_once():
+    # Flapping around normal_max (50): without debouncing every odd row alerts
+    temps = [51.0, 49.8] * 30 + [47.0] * 15
+    events = AlertStateMachine(min_dwell="5min").process(_frame(temps), TABLE, low_is_good=LOW_IS_GOOD)
+    assert _kinds(events) == [('open', 'WARNING'), ('clear', 'WARNING')]
+    assert events[0]['metric'] == 'temp' and events[0]['direction'] == 'High'
+    # Clears only after min_dwell back inside the hysteresis band (<= 49.5)
+    assert events[1]['timestamp'] == pd.Timestamp('2024-01-01') + pd.Timedelta(minutes=65)
+
+def test_short_spike_is_suppressed():
+    temps = [47.0] * 10 + [55.0] * 3 + [47.0] * 10
+    assert AlertStateMachine(min_dwell="5min").process(_frame(temps), TABLE) == []
+
+def test_escalate_to_critical():
+    temps = [51.0] * 10 + [53.0] * 10
+    events = AlertStateMachine(min_dwell="5min").process(_frame(temps), TABLE)
+    assert _kinds(events) == [('open', 'WARNING'), ('escalate', 'CRITICAL')]
+    assert events[1]['limit'] == 52
+
+def test_cooldown_holds_back_warning_reopen():
+    machine = AlertStateMachine(min_dwell="2min", cooldown="30min")
+    temps = [51.0] * 5 + [47.0] * 5 + [51.0] * 10 + [47.0] * 30 + [51.0] * 5
+    events = machine.process(_frame(temps), TABLE)
+    # The second warning starts 7 minutes after the clear: suppressed;
+    # the third starts after the cooldown and opens
+    assert _kinds(events) == [('open', 'WARNING'), ('clear', 'WARNING'), ('open', 'WARNING')]
+
+def test_state_carries_across_batches():
+    temps = [47.0] * 5 + [51.0] * 20 + [47.0] * 20
+    whole = AlertStateMachine(min_dwell="5min").process(_frame(temps), TABLE)
+
+    machine = AlertStateMachine(min_dwell="5min")
+    df = _frame(temps)
+    pieces = [machine.process(df.iloc[i:i + 3], TABLE) for i in range(0, len(df), 3)]
+    assert [e for piece in pieces for e in piece] == whole
+    assert machine.open_alerts() == {}
+
+def test_pairs_tracked_per_machine():
+    df = pd.concat([_frame([53.0] * 10, machine_id='M001'), _frame([47.0] * 10, machine_id='M002')])
+    machine = AlertStateMachine(min_dwell="5min")
+    events = machine.process(df, TABLE, TABLE.rows_for(df['machine_id'].to_numpy()))
+    assert [(e['machine_id'], e['event']) for e in events] == [('M001', 'open')]
+    assert machine.open_alerts() == {('M001', 'temp'): 'CRITICAL'}
+    assert "(M001) OPEN CRITICAL: Temp High" in format_events(events)
+
+def test_detector_update_alerts():
+    detector = AnomalyDetector(data_path=None, use_cache=False)
+    machine = AlertStateMachine(min_dwell="5min")
+    temps = [51.0, 49.8] * 30
+    anomalies, events = detector.update_alerts(_frame(temps), machine)
+    assert len(anomalies) == 30
+    assert _kinds(events) == [('open', 'WARNING')]
+
+def test_format_events_keeps_most_recent():
+    temps = ([53.0] * 10 + [47.0] * 10) * 20
+    events = AlertStateMachine(min_dwell="5min", cooldown="0min").process(_frame(temps), TABLE)
+    text = format_events(events, max_chars=300)
+    assert len(text) <= 300
+    assert "earlier events omitted" in text
+    assert str(events[-1]['timestamp']) in text
+    for budget in (0, 10, 30, 80, 150, 1000):
+        assert len(format_events(events, max_chars=budget)) <= budget
+    full = "".join(format_event(e) for e in events)
+    assert format_events(events, max_chars=len(full)) == full
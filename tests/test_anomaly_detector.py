@@ -1,6 +1,8 @@
 import pytest
+import numpy as np
 import pandas as pd
-from anomaly_detector import AnomalyDetector
+from anomaly_detector import AnomalyDetector, RunningStats, follow_csv
+from data_generator import generate_sensor_data
 
 @pytest.fixture
 def detector():
@@ -44,6 +46,32 @@ class TestAnomalyDetector:
         else:
             assert len(reasons) == 0
 
+    def test_assigned_rules_reach_every_path(self, detector):
+        with pytest.raises(TypeError):
+            detector.rules['temp']['critical_high'] = 60
+        with pytest.raises(TypeError):
+            detector.weights['temp'] = 5.0
+
+        rules = {metric: dict(limits) for metric, limits in detector.rules.items()}
+        rules['temp']['critical_high'] = 60
+        detector.rules = rules
+        detector.weights = {'temp': 5.0}
+        assert detector.rules['temp']['critical_high'] == 60
+        assert detector.weights == {'temp': 5.0, 'pressure': 2.0, 'vibration': 3.0}
+
+        # 55 is only a warning now, row by row and vectorized
+        _, reasons = detector._check_threshold(55.0, 'temp')
+        assert reasons == ["WARNING: Temp High (55.0 > 50)"]
+        detector.df = pd.DataFrame({
+            'timestamp': pd.to_datetime(['2024-01-01 10:00:00', '2024-01-01 10:05:00']),
+            'temp': [47.0, 55.0], 'pressure': [1.02, 1.02], 'vibration': [0.03, 0.03],
+        })
+        anomalies = detector.detect_anomalies()
+        assert [a['reasons'] for a in anomalies] == [reasons]
+
+        with pytest.raises(ValueError):
+            detector.rules = {'temp': {'normal_max': 60, 'critical_high': 55}}
+
     def test_detect_anomalies_workflow(self, detector):
         # Create a mock dataframe
         data = {
@@ -61,3 +89,177 @@ class TestAnomalyDetector:
         assert anomalies[0]['index'] == 1
         assert "CRITICAL: Temp High" in anomalies[0]['reasons'][0]
         assert 'rule_score' in detector.df.columns
+
+    def test_vectorized_rules_match_check_threshold(self, detector):
+        # Boundary and out-of-range values for every metric
+        data = {
+            'timestamp': pd.date_range('2024-01-01', periods=8, freq='5min'),
+            'temp': [47.0, 50.0, 50.5, 52.0, 52.5, 45.0, 43.0, 42.9],
+            'pressure': [1.02, 1.05, 1.06, 1.08, 1.09, 1.00, 0.97, 0.96],
+            'vibration': [0.03, 0.04, 0.05, 0.07, 0.08, 0.02, 0.01, 0.0],
+        }
+        detector.df = pd.DataFrame(data)
+
+        anomalies = {a['index']: a for a in detector.detect_anomalies()}
+
+        for index, row in detector.df.iterrows():
+            expected_reasons = []
+            penalty = 0
+            for feature in ['temp', 'pressure', 'vibration']:
+                _, reasons = detector._check_threshold(row[feature], feature)
+                expected_reasons.extend(reasons)
+                penalty += sum(10 if "CRITICAL" in r else 5 for r in reasons)
+
+            if not expected_reasons:
+                assert index not in anomalies
+                continue
+            assert anomalies[index]['reasons'] == expected_reasons
+            assert anomalies[index]['score'] == round(row['rule_score'] + penalty, 2)
+
+    @pytest.mark.parametrize("chunksize", [1, 3, 7, 1000])
+    def test_streaming_matches_in_memory(self, tmp_path, chunksize):
+        df = generate_sensor_data(num_rows=60, seed=3)
+        # Gaps at the start and around chunk boundaries, plus invalid readings
+        df.loc[0, 'temp'] = None
+        df.loc[[6, 7, 20], 'pressure'] = None
+        df.loc[[13, 14], 'vibration'] = None
+        df.loc[30, 'temp'] = -1.0
+        df.loc[41, 'vibration'] = -0.5
+        path = tmp_path / "sensor.csv"
+        df.to_csv(path, index=False)
+
+        in_memory = AnomalyDetector(data_path=str(path))
+        in_memory.load_data()
+        expected = in_memory.detect_anomalies()
+
+        streaming = AnomalyDetector(data_path=str(path))
+        actual = streaming.detect_anomalies_streaming(chunksize=chunksize)
+
+        assert np.array_equal(actual.index, expected.index)
+        assert np.array_equal(actual.timestamp, expected.timestamp)
+        assert np.array_equal(actual.values, expected.values)
+        assert np.array_equal(actual.codes, expected.codes)
+        # Merged chunk statistics equal the one-pass ones up to float rounding
+        # (~1e-15 relative), so the cent-rounded scores agree; they could only
+        # differ by 0.01 if an unrounded score sat within that error of a
+        # half-cent boundary, which the seeded data does not hit.
+        assert actual.score == pytest.approx(expected.score, rel=1e-9, abs=0)
+        assert streaming.stats.mean == pytest.approx(in_memory.feature_mean, rel=1e-12)
+        assert streaming.stats.scale == pytest.approx(in_memory.feature_scale, rel=1e-12)
+
+    def test_streaming_missing_file(self, tmp_path):
+        detector = AnomalyDetector(data_path=str(tmp_path / "missing.csv"))
+        assert len(detector.detect_anomalies_streaming(chunksize=10)) == 0
+
+    def test_update_single_batch_matches_batch_detection(self, detector):
+        df = generate_sensor_data(num_rows=50)
+        detector.df = df.assign(timestamp=pd.to_datetime(df['timestamp']))
+        expected = detector.detect_anomalies()
+
+        online = AnomalyDetector()
+        assert online.update(df).to_records() == expected.to_records()
+
+    def test_update_returns_only_new_rows(self):
+        df = generate_sensor_data(num_rows=40)
+        df.loc[25, 'temp'] = 60.0  # Critical in the second batch
+
+        online = AnomalyDetector()
+        first = online.update(df.iloc[:20])
+        second = online.update(df.iloc[20:])
+
+        assert all(a['index'] < 20 for a in first)
+        assert all(a['index'] >= 20 for a in second)
+        assert any(a['index'] == 25 for a in second)
+        assert online.stats.count == 40
+        assert online.stats.mean == pytest.approx(df[['temp', 'pressure', 'vibration']].mean().values)
+
+    def test_update_sliding_window(self):
+        df = generate_sensor_data(num_rows=30)  # 5 minute spacing
+        online = AnomalyDetector(window="30min")
+        for start in range(0, 30, 4):
+            online.update(df.iloc[start:start + 4])
+
+        # Last reading plus everything within the previous 30 minutes
+        recent = df.iloc[-7:][['temp', 'pressure', 'vibration']].values
+        assert online.stats.count == 7
+        assert online.stats.mean == pytest.approx(recent.mean(axis=0))
+        assert online.stats.variance == pytest.approx(recent.var(axis=0))
+
+class TestRunningStats:
+    def test_merge_and_remove(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(100, 3))
+        stats = RunningStats()
+        for start in range(0, 100, 13):
+            stats.update(X[start:start + 13])
+        assert stats.mean == pytest.approx(X.mean(axis=0))
+        assert stats.variance == pytest.approx(X.var(axis=0))
+
+        stats.remove(X[:40])
+        assert stats.count == 60
+        assert stats.mean == pytest.approx(X[40:].mean(axis=0))
+        assert stats.variance == pytest.approx(X[40:].var(axis=0))
+
+def test_follow_csv_yields_appended_rows(tmp_path):
+    path = tmp_path / "live.csv"
+    generate_sensor_data(num_rows=3).to_csv(path, index=False)
+    feed = follow_csv(str(path), poll_interval=0.01)
+
+    assert len(next(feed)) == 3
+
+    more = generate_sensor_data(num_rows=2, start_date='2024-07-01').to_csv(index=False, header=False)
+    with open(path, "a") as f:
+        # Second row is only half written at first
+        f.write(more[:-10])
+    batch = next(feed)
+    assert len(batch) == 1
+    with open(path, "a") as f:
+        f.write(more[-10:])
+    batch = next(feed)
+    assert len(batch) == 1
+    assert batch['timestamp'].iloc[0].startswith('2024-07-01')
+
+class TestPartitionedDetection:
+    @pytest.fixture
+    def two_machines(self):
+        a = generate_sensor_data(num_rows=40, seed=1).assign(machine_id='M1')
+        b = generate_sensor_data(num_rows=40, seed=2).assign(machine_id='M2')
+        b['temp'] += 3.0  # Different operating point -> different statistics
+        # Interleave the two assets like a plant-wide export
+        return pd.concat([a, b]).sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+    @pytest.mark.parametrize("max_workers", [1, 2])
+    def test_per_machine_statistics(self, tmp_path, two_machines, max_workers):
+        path = tmp_path / "plant.csv"
+        two_machines.to_csv(path, index=False)
+
+        detector = AnomalyDetector(data_path=str(path))
+        anomalies = detector.detect_anomalies_partitioned(max_workers=max_workers)
+
+        # Expected values from the CSV as written, not the unrounded frame
+        written = pd.read_csv(path)
+        for machine in ['M1', 'M2']:
+            single = AnomalyDetector()
+            part = written[written['machine_id'] == machine]
+            single.df = part.assign(timestamp=pd.to_datetime(part['timestamp']))
+            expected = single.detect_anomalies().to_records()
+            actual = [a for a in anomalies if a['machine_id'] == machine]
+            assert actual == expected
+
+        timestamps = [a['timestamp'] for a in anomalies]
+        assert timestamps == sorted(timestamps)
+
+    def test_directory_of_machine_files(self, tmp_path, two_machines):
+        machines = tmp_path / "machines"
+        machines.mkdir()
+        for machine, part in two_machines.groupby('machine_id'):
+            part.drop(columns='machine_id').to_csv(machines / f"{machine}.csv", index=False)
+
+        from_dir = AnomalyDetector(data_path=str(machines)).detect_anomalies_partitioned(max_workers=2)
+        assert {a['machine_id'] for a in from_dir} <= {'M1', 'M2'}
+
+        path = tmp_path / "plant.csv"
+        two_machines.to_csv(path, index=False)
+        from_file = AnomalyDetector(data_path=str(path)).detect_anomalies_partitioned(max_workers=1)
+        key = lambda a: (a['machine_id'], a['timestamp'], a['reasons'], a['score'])
+        assert sorted(map(key, from_dir)) == sorted(map(key, from_file))
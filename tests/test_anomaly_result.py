@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+from anomaly_detector import AnomalyDetector, FEATURES
+from anomaly_result import AnomalyResult, decode_reasons, multivariate_bit, reason_bit
+
+@pytest.fixture
+def result():
+    detector = AnomalyDetector()
+    detector.df = pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=4, freq='5min'),
+        'temp': [47.0, 55.0, 44.0, 47.0],
+        'pressure': [1.02, 0.95, 1.02, 1.02],
+        'vibration': [0.03, 0.08, 0.03, 0.06],
+    })
+    return detector.detect_anomalies()
+
+def test_reason_bits_are_unique_and_ordered():
+    bits = [reason_bit(m, d, s) for m in range(3) for d in ('High', 'Low') for s in ('CRITICAL', 'WARNING')]
+    assert len(set(bits)) == 12
+    code = bits[0] | bits[7] | bits[8]
+    assert decode_reasons(code, FEATURES) == [
+        ('temp', 'High', 'CRITICAL'), ('pressure', 'Low', 'WARNING'), ('vibration', 'High', 'CRITICAL')
+    ]
+
+def test_multivariate_reason():
+    bit = multivariate_bit(FEATURES)
+    assert bit == 1 << 12
+    assert decode_reasons(bit | reason_bit(0, 'High', 'WARNING'), FEATURES) == [
+        ('temp', 'High', 'WARNING'), ('multivariate', None, 'WARNING')
+    ]
+    result = AnomalyResult(FEATURES, [0, 1], np.array(['2024-01-01', '2024-01-01'], dtype='datetime64[ns]'),
+                           [[47.0, 1.02, 0.03], [51.0, 1.02, 0.03]], [9.0, 12.0],
+                           [bit, bit | reason_bit(0, 'High', 'WARNING')], AnomalyDetector().rules)
+    assert result.reasons(0) == ["WARNING: Multivariate"]
+    assert result.reasons(1) == ["WARNING: Temp High (51.0 > 50)", "WARNING: Multivariate"]
+    assert result.reason_counts() == {"WARNING: Multivariate": 2, "WARNING: Temp High": 1}
+    assert result.reason_names() == ["WARNING: Temp High", "WARNING: Multivariate"]
+    assert result.severity().tolist() == [1, 1]
+
+def test_columns_and_lazy_reasons(result):
+    assert len(result) == 3
+    assert result.index.tolist() == [1, 2, 3]
+    assert result.values.shape == (3, 3)
+    assert result.severity().tolist() == [2, 1, 1]
+    assert result.reasons(0) == [
+        "CRITICAL: Temp High (55.0 > 52)",
+        "CRITICAL: Pressure Low (0.95 < 0.97)",
+        "CRITICAL: Vibration High (0.08 > 0.07)",
+    ]
+    assert result.reason_names() == [
+        "CRITICAL: Temp High", "WARNING: Temp Low", "CRITICAL: Pressure Low",
+        "CRITICAL: Vibration High", "WARNING: Vibration High",
+    ]
+
+def test_dict_compatibility(result):
+    record = result[1]
+    assert record == {
+        'index': 2,
+        'timestamp': pd.Timestamp('2024-01-01 00:10:00'),
+        'data': {'temp': 44.0, 'pressure': 1.02, 'vibration': 0.03},
+        'reasons': ["WARNING: Temp Low (44.0 < 45)"],
+        'score': record['score'],
+    }
+    assert list(result) == result.to_records()
+    assert result[-1]['index'] == 3
+    with pytest.raises(IndexError):
+        result[3]
+
+def test_take_top_concat(result):
+    assert result.top(1).index.tolist() == [1]
+    assert len(result[result.severity() == 1]) == 2
+
+    tagged = AnomalyResult.concat([result.with_machine_id('M2'), result.with_machine_id('M1')])
+    ordered = tagged.sort_by_timestamp()
+    assert len(ordered) == 6
+    assert ordered.machine_id.tolist() == ['M2', 'M1'] * 3
+    assert ordered[0]['machine_id'] == 'M2'
+
+def test_empty():
+    empty = AnomalyResult.empty(FEATURES)
+    assert len(empty) == 0
+    assert not empty
+    assert list(empty) == []
+    assert empty.reason_names() == []
+
+def test_top_matches_full_sort():
+    rng = np.random.default_rng(0)
+    n = 1000
+    result = AnomalyResult(
+        FEATURES, np.arange(n), np.arange(n).astype('datetime64[m]'), np.zeros((n, 3)),
+        rng.integers(0, 50, n).astype(float), np.ones(n, dtype=np.int64), None,
+    )
+    expected = sorted(range(n), key=lambda i: (-result.score[i], i))[:25]
+    assert result.top(25).index.tolist() == expected
+    assert len(result.top(5000)) == n
+    assert len(result.top(0)) == 0
+
+def test_aggregates(result):
+    assert result.severity_counts() == {'CRITICAL': 1, 'WARNING': 2}
+    assert result.reason_counts()["CRITICAL: Temp High"] == 1
+    hours, counts = result.hourly_counts()
+    assert counts.tolist() == [3]
+    hist, edges = result.score_histogram(bins=4)
+    assert hist.sum() == 3 and len(edges) == 5
+    assert result.page(2, 2).index.tolist() == [3]
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from anomaly_detector import AnomalyDetector
+from anomaly_store import AnomalyStore
+from data_generator import write_sensor_data
+
+def _split_csv(tmp_path, rows=3000, first=2000):
+    """Full generated CSV plus a copy holding only its first `first` rows; returns (full, partial, lines)."""
+    full = str(tmp_path / "full.csv")
+    write_sensor_data(full, rows, seed=4, machines=3)
+    lines = open(full, 'rb').read().splitlines(keepends=True)
+    partial = str(tmp_path / "log.csv")
+    with open(partial, 'wb') as f:
+        f.writelines(lines[:first + 1])
+    return full, partial, lines
+
+def _summary(anomalies):
+    return [(a['index'], a['timestamp'], a.get('machine_id'), a['reasons'], a['score']) for a in anomalies]
+
+def test_incremental_runs_score_only_new_rows(tmp_path):
+    full, partial, lines = _split_csv(tmp_path)
+    store = AnomalyStore(str(tmp_path / "anomalies.db"))
+
+    first = AnomalyDetector(data_path=partial, use_cache=False).detect_incremental(store)
+    with open(partial, 'ab') as f:
+        f.writelines(lines[2001:])
+    detector = AnomalyDetector(data_path=partial, use_cache=False)
+    second = detector.detect_incremental(store)
+    assert len(detector.df) == 1000
+
+    # Same as one online detector fed the two parts
+    reference = AnomalyDetector(data_path=None, use_cache=False)
+    df = pd.read_csv(full)
+    assert _summary(first) == _summary(reference.update(df.iloc[:2000]))
+    assert _summary(second) == _summary(reference.update(df.iloc[2000:]))
+
+    # Nothing new: nothing scored
+    assert len(AnomalyDetector(data_path=partial, use_cache=False).detect_incremental(store)) == 0
+    assert store.count() == len(first) + len(second)
+    assert _summary(store.query()) == sorted(_summary(first) + _summary(second), key=lambda a: (a[1], a[0]))
+
+def test_partial_last_line_waits_for_next_run(tmp_path):
+    _, partial, lines = _split_csv(tmp_path)
+    store = AnomalyStore(str(tmp_path / "anomalies.db"))
+    with open(partial, 'ab') as f:
+        f.write(lines[2001][:10])
+    detector = AnomalyDetector(data_path=partial, use_cache=False)
+    detector.detect_incremental(store)
+    assert len(detector.df) == 2000
+
+    with open(partial, 'ab') as f:
+        f.write(lines[2001][10:])
+    detector = AnomalyDetector(data_path=partial, use_cache=False)
+    detector.detect_incremental(store)
+    assert len(detector.df) == 1
+
+def test_rewritten_file_is_rescanned(tmp_path):
+    _, partial, lines = _split_csv(tmp_path)
+    store = AnomalyStore(str(tmp_path / "anomalies.db"))
+    AnomalyDetector(data_path=partial, use_cache=False).detect_incremental(store)
+
+    with open(partial, 'wb') as f:
+        f.writelines(lines[:1] + lines[1001:2001])
+    detector = AnomalyDetector(data_path=partial, use_cache=False)
+    anomalies = detector.detect_incremental(store)
+    assert len(detector.df) == 1000
+    assert store.count() == len(anomalies)
+
+def test_recent_and_machine_queries(tmp_path):
+    _, partial, _ = _split_csv(tmp_path)
+    rules = tmp_path / "rules.toml"
+    rules.write_text("[machines.M001.rules.temp]\nnormal_max = 49\n")
+    store = AnomalyStore(str(tmp_path / "anomalies.db"))
+    detector = AnomalyDetector(data_path=partial, use_cache=False, rules_path=str(rules))
+    anomalies = detector.detect_incremental(store)
+
+    latest = detector.df['timestamp'].max()
+    assert store.latest_timestamp() == latest
+    recent = store.recent(6)
+    cutoff = latest - pd.Timedelta(hours=6)
+    expected = [a for a in _summary(anomalies) if a[1] >= cutoff]
+    assert _summary(recent) == sorted(expected, key=lambda a: (a[1], a[0]))
+
+    # Reason text is rendered with the rule set each row was checked against
+    m001 = store.query(machine_id='M001')
+    assert len(m001) and set(m001.machine_id) == {'M001'}
+    assert any("> 49)" in r for a in m001 for r in a['reasons'])
+    assert _summary(m001) == [a for a in _summary(store.query()) if a[2] == 'M001']
+    assert len(store.query(since=latest + pd.Timedelta(minutes=1))) == 0
+    assert np.all(np.diff(store.query().timestamp.astype('i8')) >= 0)
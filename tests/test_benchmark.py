@@ -0,0 +1,28 @@
+from benchmark import STAGES, compare, measure_startup, run_size
+
+def _report(times):
+    return {'results': {'1000': {stage: {'wall_time_s': t} for stage, t in times.items()}}}
+
+def test_run_size_measures_every_stage(tmp_path):
+    results = run_size(200, str(tmp_path))
+    assert set(results) == set(STAGES)
+    for metrics in results.values():
+        assert metrics['wall_time_s'] >= 0
+        assert metrics['peak_rss_mb'] > 0
+        assert 0 <= metrics['rss_growth_mb'] <= metrics['peak_rss_mb']
+
+def test_compare_flags_regressions():
+    baseline = _report({'ingest': 1.0, 'detection': 2.0})
+    current = _report({'ingest': 1.2, 'detection': 3.0, 'scoring': 5.0})
+
+    regressions = compare(current, baseline, threshold=0.25)
+
+    assert [(r['stage'], r['ratio']) for r in regressions] == [('detection', 1.5)]
+
+def test_compare_no_regressions():
+    baseline = _report({'ingest': 1.0})
+    assert compare(_report({'ingest': 0.5}), baseline) == []
+
+def test_measure_startup():
+    startup = measure_startup(repeat=1)
+    assert startup['import_agent']['wall_time_s'] > 0
@@ -1,6 +1,6 @@
 import pytest
 import pandas as pd
-from data_generator import generate_sensor_data
+from data_generator import generate_sensor_data, write_sensor_data
 
 def test_generate_sensor_data_structure():
     rows = 20
@@ -26,3 +26,71 @@ def test_generate_sensor_data_ranges():
 def test_no_future_data():
     df = generate_sensor_data(num_rows=5)
     assert pd.to_datetime(df['timestamp']) is not None
+
+def test_seed_is_reproducible():
+    a = generate_sensor_data(num_rows=200, seed=42)
+    b = generate_sensor_data(num_rows=200, seed=42)
+    c = generate_sensor_data(num_rows=200, seed=43)
+    pd.testing.assert_frame_equal(a, b)
+    assert not a.equals(c)
+
+def test_anomaly_rate():
+    df = generate_sensor_data(num_rows=20_000, seed=0)
+    normal = (
+        df['temp'].between(45, 50) &
+        df['pressure'].between(1.00, 1.05) &
+        df['vibration'].between(0.02, 0.04)
+    )
+    assert 0.07 < 1 - normal.mean() < 0.13
+
+def test_multiple_machines():
+    df = generate_sensor_data(num_rows=30, machines=3, seed=1)
+    assert list(df.columns) == ['timestamp', 'machine_id', 'temp', 'pressure', 'vibration']
+    assert df['machine_id'].value_counts().to_dict() == {'M001': 10, 'M002': 10, 'M003': 10}
+    # One row per machine for each timestamp
+    assert df.groupby('timestamp').size().eq(3).all()
+
+def test_scenarios():
+    drift = generate_sensor_data(num_rows=5000, seed=3, scenario='drift')
+    metrics = ['temp', 'pressure', 'vibration']
+    rise = (drift[metrics].iloc[-500:].median() - drift[metrics].iloc[:500].median()) / [5, 0.05, 0.02]
+    # One metric degrades, the others stay put
+    assert rise.max() > 0.05
+    assert (rise.abs() < 0.05).sum() == 2
+
+    gaps = generate_sensor_data(num_rows=5000, seed=3, scenario=['gaps'])
+    assert 0 < gaps['temp'].isna().mean() < 0.05
+
+    burst = generate_sensor_data(num_rows=5000, seed=3, scenario='burst')
+    abnormal = ~burst['temp'].between(45, 50) | ~burst['pressure'].between(1.00, 1.05) | ~burst['vibration'].between(0.02, 0.04)
+    # Faults cluster: an abnormal row is usually followed by another one
+    assert (abnormal & abnormal.shift(1, fill_value=False)).sum() > abnormal.sum() * 0.5
+
+    with pytest.raises(ValueError):
+        generate_sensor_data(num_rows=10, scenario='unknown')
+
+def test_write_sensor_data_chunks(tmp_path):
+    path = tmp_path / "out.csv"
+    written = write_sensor_data(str(path), 1050, chunk_rows=100, seed=7, machines=2, scenario='drift,gaps', workers=1)
+    df = pd.read_csv(path)
+
+    assert written == len(df) == 1050
+    assert pd.to_datetime(df['timestamp']).is_monotonic_increasing
+
+    again = tmp_path / "again.csv"
+    write_sensor_data(str(again), 1050, chunk_rows=100, seed=7, machines=2, scenario='drift,gaps', workers=2)
+    assert path.read_text() == again.read_text()
+
+def test_drift_stays_gradual():
+    from anomaly_detector import AnomalyDetector
+
+    def anomaly_rate(scenario):
+        df = generate_sensor_data(num_rows=20000, seed=1, machines=10, scenario=scenario)
+        detector = AnomalyDetector(data_path=None, use_cache=False)
+        detector.df = df.assign(timestamp=pd.to_datetime(df['timestamp']))
+        return len(detector.detect_anomalies()) / len(df)
+
+    # Injected faults alone flag ~9% of rows; drift into the warning band adds
+    # a few percent, never a majority of the run
+    base = anomaly_rate(None)
+    assert base < anomaly_rate('drift') <= 0.20
@@ -0,0 +1,100 @@
+import pandas as pd
+from episodes import coalesce_episodes, format_timeline, reason_key
+
+def _anomaly(minute, reasons, score, machine=None):
+    a = {
+        'timestamp': pd.Timestamp('2024-01-01 10:00:00') + pd.Timedelta(minutes=minute),
+        'data': {'temp': 50 + score},
+        'reasons': reasons,
+        'score': score,
+    }
+    if machine:
+        a['machine_id'] = machine
+    return a
+
+TEMP_HIGH = ["CRITICAL: Temp High (55.0 > 52)"]
+VIB_HIGH = ["WARNING: Vibration High (0.05 > 0.04)"]
+
+def test_reason_key_drops_values():
+    assert reason_key(TEMP_HIGH[0]) == "CRITICAL: Temp High"
+
+def test_coalesce_merges_nearby_same_reasons():
+    anomalies = [
+        _anomaly(0, TEMP_HIGH, 16.0),
+        _anomaly(5, ["CRITICAL: Temp High (57.0 > 52)"], 19.0),
+        _anomaly(10, VIB_HIGH, 7.0),   # Different reasons -> own episode
+        _anomaly(15, TEMP_HIGH, 17.0),
+        _anomaly(120, TEMP_HIGH, 15.0),  # Too far away -> new episode
+    ]
+    episodes = coalesce_episodes(anomalies, max_gap="15min")
+
+    assert [e['count'] for e in episodes] == [3, 1, 1]
+    first = episodes[0]
+    assert first['start'] == anomalies[0]['timestamp']
+    assert first['end'] == anomalies[3]['timestamp']
+    assert first['peak_score'] == 19.0
+    assert first['peak_values'] == {'temp': 69.0}
+
+def test_coalesce_keeps_machines_apart():
+    anomalies = [_anomaly(0, TEMP_HIGH, 16.0, 'M1'), _anomaly(5, TEMP_HIGH, 16.0, 'M2')]
+    assert len(coalesce_episodes(anomalies)) == 2
+
+def test_timeline_within_budget_keeps_top_episodes():
+    # 200 isolated episodes with increasing scores
+    anomalies = [_anomaly(i * 60, TEMP_HIGH if i % 2 else VIB_HIGH, float(i)) for i in range(200)]
+    episodes = coalesce_episodes(anomalies)
+    full = format_timeline(episodes, max_chars=10**9)
+    assert len(full.splitlines()) == 200
+
+    text = format_timeline(episodes, max_chars=2000)
+    assert len(text) <= 2000
+    assert "Score: 199.0" in text
+    assert "Score: 0.0 " not in text
+    assert "(summarized)" in text
+
+def test_timeline_omitted_line_stays_within_budget():
+    # One reason group per episode, so most groups can only be counted
+    anomalies = [_anomaly(i * 60, [f"WARNING: Sensor{i} High ({i}.5 > {i})"], float(i)) for i in range(300)]
+    episodes = coalesce_episodes(anomalies)
+    for max_chars in [60, 150, 300, 301, 500, 1000]:
+        text = format_timeline(episodes, max_chars=max_chars)
+        assert len(text) <= max_chars
+    assert "further reason groups omitted" in format_timeline(episodes, max_chars=300)
+
+def test_result_coalesces_like_records():
+    import numpy as np
+    from anomaly_detector import AnomalyDetector
+    from data_generator import generate_sensor_data
+
+    df = generate_sensor_data(num_rows=3000, seed=2, machines=3, scenario='burst')
+    detector = AnomalyDetector(data_path=None, use_cache=False)
+    detector.df = df.assign(timestamp=pd.to_datetime(df['timestamp']))
+    result = detector.detect_anomalies()
+
+    from_result = coalesce_episodes(result)
+    from_records = coalesce_episodes(result.to_records())
+    fields = ['machine_id', 'reasons', 'count', 'peak_score']
+    assert [[e[f] for f in fields] for e in from_result] == [[e[f] for f in fields] for e in from_records]
+    assert [pd.Timestamp(e['start']) for e in from_result] == [e['start'] for e in from_records]
+    assert all(np.array_equal(result.index[e['positions']], [a['index'] for a in r['anomalies']])
+               for e, r in zip(from_result, from_records))
+    for max_chars in [10**9, 3000, 500]:
+        assert format_timeline(from_result, max_chars) == format_timeline(from_records, max_chars)
+
+def test_result_timeline_renders_only_what_fits(monkeypatch):
+    from anomaly_detector import AnomalyDetector
+    from anomaly_result import AnomalyResult
+    from data_generator import generate_sensor_data
+
+    df = generate_sensor_data(num_rows=20000, seed=2)
+    detector = AnomalyDetector(data_path=None, use_cache=False)
+    detector.df = df.assign(timestamp=pd.to_datetime(df['timestamp']))
+    result = detector.detect_anomalies()
+
+    rendered = []
+    reasons = AnomalyResult.reasons
+    monkeypatch.setattr(AnomalyResult, "reasons", lambda self, i: rendered.append(i) or reasons(self, i))
+    text = format_timeline(coalesce_episodes(result), max_chars=2000)
+    assert len(text) <= 2000
+    # A few dozen lines fit the budget, out of ~1800 anomalies
+    assert 0 < len(rendered) < 100 < len(result)
@@ -0,0 +1,60 @@
+import os
+from knowledge_base import KnowledgeBaseIndex, reason_metric_direction
+
+KB_PATH = "config/knowledge_base.md"
+
+def _index():
+    with open(KB_PATH) as f:
+        return KnowledgeBaseIndex.build(f.read())
+
+def test_reason_metric_direction():
+    assert reason_metric_direction("CRITICAL: Temp High (55.0 > 52)") == ('temp', 'High')
+    assert reason_metric_direction("WARNING: Pressure Low (0.98 < 1.0)") == ('pressure', 'Low')
+    assert reason_metric_direction("something else") is None
+
+def test_sections_are_keyed():
+    index = _index()
+    keys = {k for s in index.sections for k in s['keys']}
+    assert keys == {'temp:High', 'temp:Low', 'pressure:High', 'pressure:Low', 'vibration:High'}
+    combos = [c['keys'] for s in index.sections for c in s['combos']]
+    assert ['pressure:Low', 'vibration:High'] in combos
+
+def test_select_only_matching_sections():
+    text = _index().select(["CRITICAL: Pressure Low (0.95 < 0.97)", "CRITICAL: Vibration High (0.08 > 0.07)"])
+
+    assert "Severity & Action Policy" in text       # General sections always included
+    assert "Low Pressure Anomalies" in text
+    assert "High Vibration Anomalies" in text
+    assert "Cavitation" in text
+    assert "High Temperature Anomalies" not in text
+    assert "Friction induced overheating" not in text
+
+def test_multivariate_reason_selects_combined_patterns():
+    text = _index().select(["WARNING: Multivariate"])
+    assert "Cavitation" in text and "Friction induced overheating" in text
+    assert "High Temperature Anomalies" not in text
+
+def test_index_cache_invalidated_on_change(tmp_path):
+    kb = tmp_path / "kb.md"
+    cache = tmp_path / "index" / "kb_index.json"
+    kb.write_text("# KB\n## 1. High Temperature\n**Pattern:** Temp > Normal Max\n")
+
+    first = KnowledgeBaseIndex.load(str(kb), str(cache.parent))
+    assert os.path.exists(cache)
+    assert KnowledgeBaseIndex.load(str(kb), str(cache.parent)).sections == first.sections
+
+    kb.write_text("# KB\n## 1. Low Pressure\n**Pattern:** Pressure < Normal Min\n## 2. Extra\n")
+    updated = KnowledgeBaseIndex.load(str(kb), str(cache.parent))
+    assert [s['keys'] for s in updated.sections] == [['pressure:Low'], []]
+
+def test_index_cache_defaults_next_to_kb(tmp_path, monkeypatch):
+    kb = tmp_path / "config" / "kb.md"
+    kb.parent.mkdir()
+    kb.write_text("# KB\n## 1. High Temperature\n**Pattern:** Temp > Normal Max\n")
+    elsewhere = tmp_path / "cwd"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+
+    KnowledgeBaseIndex.load(str(kb))
+    assert (kb.parent / ".cache" / "kb_index.json").exists()
+    assert not (elsewhere / ".cache").exists()
@@ -0,0 +1,48 @@
+import os
+import time
+from llm_cache import ResponseCache
+
+def test_hit_and_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    key = ResponseCache.make_key("model", "template", "kb", "timeline")
+
+    assert cache.get(key) is None
+    cache.put(key, "report")
+    assert cache.get(key) == "report"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_key_depends_on_every_part():
+    base = ResponseCache.make_key("model", "template", "kb", "timeline")
+    assert base == ResponseCache.make_key("model", "template", "kb", "timeline")
+    assert base != ResponseCache.make_key("model2", "template", "kb", "timeline")
+    assert base != ResponseCache.make_key("model", "template", "kb!", "timeline")
+    assert ResponseCache.make_key("ab", "c") != ResponseCache.make_key("a", "bc")
+
+def test_lru_eviction_by_count(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    # Make "a" the most recently used entry
+    os.utime(tmp_path / "b.json", (time.time() - 60, time.time() - 60))
+    cache.get("a")
+    cache.put("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+def test_eviction_by_size_and_age(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=200, max_age=3600)
+    cache.put("old", "x")
+    old = time.time() - 7200
+    os.utime(tmp_path / "old.json", (old, old))
+    cache.put("big", "y" * 500)
+
+    assert cache.stats()["entries"] == 0
+
+def test_clear(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.clear() == 2
+    assert cache.get("a") is None
@@ -0,0 +1,124 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_detector import AnomalyDetector
+from data_generator import write_sensor_data
+from multivariate import MahalanobisModel, distance_cutoff
+
+def _correlated(n=20_000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=n)
+    y = 0.9 * x + np.sqrt(1 - 0.81) * rng.normal(size=n)
+    return np.column_stack([x, y])
+
+def test_partial_fit_matches_fit():
+    X = _correlated()
+    whole = MahalanobisModel(['a', 'b']).fit(X)
+    warm = MahalanobisModel(['a', 'b']).fit(X[:5000]).partial_fit(X[5000:12000]).partial_fit(X[12000:])
+    assert warm.count == whole.count
+    assert np.allclose(warm.mean, whole.mean)
+    assert np.allclose(warm.covariance, np.cov(X.T, bias=True))
+
+def test_distance_uses_correlation():
+    model = MahalanobisModel(['a', 'b']).fit(_correlated())
+    along, across = model.score_samples([[1.5, 1.5], [1.5, -1.5]])
+    # Same per-axis deviation, but only the second point breaks the correlation
+    assert across > 3 * along
+
+def test_batched_scoring_matches_direct_formula():
+    X = _correlated()
+    model = MahalanobisModel(['a', 'b'], ridge=0).fit(X)
+    centered = X - model.mean
+    expected = np.sqrt(np.einsum('ij,jk,ik->i', centered, np.linalg.inv(model.covariance), centered))
+    assert np.allclose(model.score_samples(X), expected)
+    assert np.array_equal(model.score_samples(X, batch_rows=999, workers=4), model.score_samples(X))
+
+def test_save_and_load(tmp_path):
+    model = MahalanobisModel(['a', 'b']).fit(_correlated())
+    path = str(tmp_path / "models" / "m.npz")
+    model.save(path)
+    loaded = MahalanobisModel.load(path)
+    assert loaded.features == ['a', 'b'] and loaded.count == model.count
+    assert np.array_equal(loaded.score_samples([[1.0, -1.0]]), model.score_samples([[1.0, -1.0]]))
+
+def test_detector_blends_model_distance(tmp_path):
+    data = str(tmp_path / "data.csv")
+    write_sensor_data(data, 3000, seed=5)
+    plain = AnomalyDetector(data_path=data, use_cache=False)
+    plain.load_data()
+    baseline = plain.detect_anomalies()
+
+    model = plain.fit_model()
+    # Trained on rule-compliant readings only
+    assert model.count == len(plain.df) - len(baseline)
+    path = str(tmp_path / "model.npz")
+    model.save(path)
+
+    detector = AnomalyDetector(data_path=data, use_cache=False, model_path=path, ml_weight=2.0)
+    detector.load_data()
+    blended = detector.detect_anomalies()
+    distance = model.score_samples(blended.values)
+    # Rule-flagged rows stay flagged; far-out rows are added with the multivariate reason
+    joint = distance > detector.ml_threshold
+    in_baseline = np.isin(blended.index, baseline.index)
+    assert np.array_equal(blended.index[in_baseline], baseline.index)
+    assert joint[~in_baseline].all()
+    assert all(blended.reasons(i) == ["WARNING: Multivariate"] for i in np.flatnonzero(~in_baseline))
+    expected = baseline.score + 2.0 * distance[in_baseline] + 5 * joint[in_baseline]
+    assert np.allclose(blended.score[in_baseline], expected, atol=0.01)
+
+    # Partition workers receive the model too
+    partitioned = AnomalyDetector(data_path=data, use_cache=False, model_path=path, ml_weight=2.0)
+    assert np.allclose(np.sort(partitioned.detect_anomalies_partitioned(max_workers=1).score), np.sort(blended.score))
+
+def test_distance_cutoff_matches_chi_square():
+    assert distance_cutoff(3) == pytest.approx(math.sqrt(16.266), abs=1e-3)
+    assert distance_cutoff(1, quantile=0.95) == pytest.approx(1.95996, abs=1e-4)
+    assert distance_cutoff(2, quantile=0.99) == pytest.approx(math.sqrt(9.21034), abs=1e-4)
+
+def _in_limit_readings(n=2000, seed=0):
+    """Temp and pressure rising together (e.g. with load), all inside the normal bands."""
+    rng = np.random.default_rng(seed)
+    temp = rng.normal(47.5, 0.6, n)
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=n, freq='5min'),
+        'temp': temp,
+        'pressure': 1.025 + 0.006 * (temp - 47.5) / 0.6 + rng.normal(0, 0.002, n),
+        'vibration': rng.normal(0.03, 0.002, n),
+    })
+
+def test_correlated_fault_inside_limits_is_flagged():
+    normal = _in_limit_readings()
+    detector = AnomalyDetector(data_path=None, use_cache=False)
+    detector.df = normal
+    assert len(detector.detect_anomalies()) == 0
+    detector.fit_model()
+
+    # Hot but low pressure: each value is within its limits, the pair is not
+    fault = pd.DataFrame({'timestamp': [normal['timestamp'].iloc[-1] + pd.Timedelta(minutes=5)],
+                          'temp': [49.0], 'pressure': [1.01], 'vibration': [0.03]})
+    detector.df = pd.concat([normal, fault], ignore_index=True)
+    anomalies = detector.detect_anomalies()
+    fault_index = len(normal)
+    assert fault_index in anomalies.index
+    record = anomalies[int(np.flatnonzero(anomalies.index == fault_index)[0])]
+    assert record['reasons'] == ["WARNING: Multivariate"]
+    scored = detector.df.loc[fault_index]
+    assert record['score'] == pytest.approx(scored['rule_score'] + scored['ml_score'] + 5, abs=0.01)
+    assert anomalies.reason_counts()["WARNING: Multivariate"] == len(anomalies)
+    # Normal readings rarely cross the 99.9% cutoff
+    assert len(anomalies) <= 5
+
+    # Without the model, or with the flag disabled, only the score would change
+    assert len(AnomalyDetector(data_path=None, use_cache=False)._collect_anomalies(detector.df)) == 0
+    detector.ml_threshold = math.inf
+    assert len(detector.detect_anomalies()) == 0
+
+def test_model_features_must_match(tmp_path):
+    path = str(tmp_path / "model.npz")
+    MahalanobisModel(['a', 'b']).fit(_correlated()).save(path)
+    with pytest.raises(ValueError):
+        AnomalyDetector(data_path=None, model_path=path)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+
+from profiler import PROFILER, Profiler, profiled, token_usage
+
+@pytest.fixture
+def profiler():
+    PROFILER.enable()
+    yield PROFILER
+    PROFILER.enable(False)
+    PROFILER.reset()
+
+def test_disabled_records_nothing():
+    p = Profiler()
+    with p.stage("load_data"):
+        pass
+    p.count("rows", 10)
+    p.gauge("queue", 3)
+    assert (p.stages, p.counters, p.gauges) == ({}, {}, {})
+
+def test_stages_and_counters():
+    p = Profiler(enabled=True)
+    for _ in range(3):
+        with p.stage("scoring"):
+            pass
+    p.count("rows", 10)
+    p.count("rows", 5)
+    p.gauge("queue", 3)
+
+    summary = p.to_dict()
+    assert summary['stages']['scoring']['calls'] == 3
+    assert summary['stages']['scoring']['peak_rss_mb'] > 0
+    assert summary['counters'] == {'rows': 15}
+    assert summary['gauges'] == {'queue': 3}
+    assert "scoring" in p.format_report()
+
+def test_prometheus_and_json_export(tmp_path):
+    p = Profiler(enabled=True)
+    with p.stage("load_data"):
+        pass
+    p.count("llm_prompt_tokens", 120)
+
+    text = p.to_prometheus()
+    assert '# TYPE anomaly_agent_stage_seconds_total counter' in text
+    assert 'anomaly_agent_stage_calls_total{stage="load_data"} 1' in text
+    assert 'anomaly_agent_llm_prompt_tokens_total 120' in text
+
+    p.write(str(tmp_path / "profile.prom"))
+    assert (tmp_path / "profile.prom").read_text() == text
+    p.write(str(tmp_path / "profile.json"))
+    assert json.loads((tmp_path / "profile.json").read_text())['counters'] == {'llm_prompt_tokens': 120}
+
+def test_without_resource_module(monkeypatch):
+    import profiler as profiler_module
+    monkeypatch.setattr(profiler_module, "resource", None)
+    assert profiler_module.peak_rss_mb() is None
+
+    p = Profiler(enabled=True)
+    with p.stage("scoring"):
+        pass
+    summary = p.to_dict()
+    assert summary['peak_rss_mb'] is None
+    assert summary['stages']['scoring']['calls'] == 1
+    assert summary['stages']['scoring']['peak_rss_mb'] is None
+    assert "n/a" in p.format_report()
+    assert "peak_rss" not in p.to_prometheus()
+
+def test_decorator_sync_and_async(profiler):
+    @profiled("double")
+    def double(x):
+        return 2 * x
+
+    @profiled("adouble")
+    async def adouble(x):
+        return 2 * x
+
+    assert double(2) == 4
+    assert asyncio.run(adouble(3)) == 6
+    assert profiler.stages['double']['calls'] == 1
+    assert profiler.stages['adouble']['calls'] == 1
+
+def test_pipeline_stages_recorded(profiler, tmp_path):
+    from anomaly_detector import AnomalyDetector
+    from data_generator import write_sensor_data
+
+    path = str(tmp_path / "data.csv")
+    write_sensor_data(path, 500, seed=0)
+    detector = AnomalyDetector(data_path=path, use_cache=False)
+    detector.load_data()
+    anomalies = detector.detect_anomalies()
+
+    assert {'load_data', 'calculate_statistical_scores', 'detect_anomalies'} <= set(profiler.stages)
+    assert profiler.counters['rows_loaded'] == profiler.counters['rows_scored'] == len(detector.df)
+    assert profiler.counters['anomalies'] == len(anomalies)
+
+def test_token_usage():
+    class Message:
+        usage_metadata = {'input_tokens': 100, 'output_tokens': 20}
+
+    class OllamaMessage:
+        usage_metadata = None
+        response_metadata = {'prompt_eval_count': 90, 'eval_count': 15}
+
+    assert token_usage(Message()) == (100, 20)
+    assert token_usage(OllamaMessage()) == (90, 15)
+    assert token_usage(None) == (None, None)
@@ -0,0 +1,161 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_detector import AnomalyDetector, LOW_IS_GOOD
+from anomaly_result import AnomalyResult
+from rules_config import DEFAULT_RULES, RuleTable, RulesWatcher
+
+CONFIG = {
+    'weights': {'vibration': 4.0},
+    'types': {'hot': {'rules': {'temp': {'normal_max': 54, 'critical_high': 56}}}},
+    'machines': {
+        'M001': {'type': 'hot'},
+        'M002': {'type': 'hot'},
+        'M003': {'rules': {'pressure': {'critical_high': 1.10}}},
+    },
+}
+
+def _frame(machines, temps):
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2024-01-01', periods=len(temps), freq='5min'),
+        'machine_id': machines,
+        'temp': temps,
+        'pressure': [1.02] * len(temps),
+        'vibration': [0.03] * len(temps),
+    })
+
+class TestRuleTable:
+    def test_defaults(self):
+        table = RuleTable.from_config({})
+        assert table.rule_sets == [DEFAULT_RULES]
+        assert table.rows_for(np.array(['M001'])) is None
+
+    def test_with_global_keeps_machine_rows(self):
+        table = RuleTable.from_config(CONFIG, LOW_IS_GOOD)
+        rules = {metric: dict(limits) for metric, limits in DEFAULT_RULES.items()}
+        rules['temp']['critical_high'] = 60
+        updated = table.with_global(rules=rules)
+
+        assert updated.rule_sets[0]['temp']['critical_high'] == 60
+        assert updated.rule_sets[1:] == table.rule_sets[1:]
+        assert updated.weight_sets == table.weight_sets
+        assert updated.machines == table.machines
+        # Low limits of low-is-good metrics stay unchecked
+        assert np.isnan(updated.limits['normal_min'][0, updated.features.index('vibration')])
+
+    def test_overrides_compile_to_shared_rows(self):
+        table = RuleTable.from_config(CONFIG, LOW_IS_GOOD)
+        # Global row + one row for the 'hot' type + one for M003
+        assert len(table.rule_sets) == 3
+        assert table.machines['M001'] == table.machines['M002']
+        assert table.rules_for('M001')['temp']['critical_high'] == 56
+        assert table.rules_for('M003')['pressure']['critical_high'] == 1.10
+        assert table.rules_for('M999') == table.rule_sets[0]
+        assert table.weights_for()[2] == 4.0
+
+        rows = table.rows_for(np.array(['M003', 'M999', 'M001'], dtype=object))
+        assert rows.tolist() == [table.machines['M003'], 0, table.machines['M001']]
+        assert table.limit('critical_high', 0, rows).tolist() == [52, 52, 56]
+        # Low limits of low-is-good metrics are never checked
+        assert np.isnan(table.limits['normal_min'][:, 2]).all()
+
+    def test_integer_machine_ids(self):
+        table = RuleTable.from_config({'machines': {'7': {'rules': {'temp': {'critical_high': 60}}}}})
+        assert table.rows_for(np.array([7, 8])).tolist() == [1, 0]
+
+    @pytest.mark.parametrize("config, message", [
+        ({'rules': {'humidity': {'normal_max': 1}}}, "unknown metric"),
+        ({'rules': {'temp': {'max': 1}}}, "unknown limit"),
+        ({'rules': {'temp': {'normal_max': 60}}}, "out of order"),
+        ({'machines': {'M1': {'type': 'missing'}}}, "unknown type"),
+        ({'weights': {'temp': 'high'}}, "must be a number"),
+        ({'thresholds': {}}, "Unknown config section"),
+    ])
+    def test_invalid_config(self, config, message):
+        with pytest.raises(ValueError, match=message):
+            RuleTable.from_config(config)
+
+    def test_load_toml_and_json(self, tmp_path):
+        toml_path = tmp_path / "rules.toml"
+        toml_path.write_text('[machines.M001.rules.temp]\ncritical_high = 55\n')
+        json_path = tmp_path / "rules.json"
+        json_path.write_text(json.dumps({'machines': {'M001': {'rules': {'temp': {'critical_high': 55}}}}}))
+        for path in (toml_path, json_path):
+            assert RuleTable.load(str(path)).rules_for('M001')['temp']['critical_high'] == 55
+
+class TestPerMachineDetection:
+    def test_limits_depend_on_machine(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps(CONFIG))
+        detector = AnomalyDetector(data_path=None, rules_path=str(path))
+        detector.df = _frame(['M001', 'M004', 'M001', 'M004'], [53.0, 53.0, 57.0, 47.0])
+
+        anomalies = detector.detect_anomalies()
+
+        assert anomalies.index.tolist() == [1, 2]
+        assert anomalies.reasons(0) == ["CRITICAL: Temp High (53.0 > 52)"]
+        assert anomalies.reasons(1) == ["CRITICAL: Temp High (57.0 > 56)"]
+
+    def test_global_rules_unchanged_without_machine_column(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps(CONFIG))
+        detector = AnomalyDetector(data_path=None, rules_path=str(path))
+        detector.df = _frame(['M001'] * 2, [53.0, 47.0]).drop(columns='machine_id')
+        assert detector.detect_anomalies().reasons(0) == ["CRITICAL: Temp High (53.0 > 52)"]
+
+    def test_partitioned_uses_machine_rules(self, tmp_path):
+        rules = tmp_path / "rules.json"
+        rules.write_text(json.dumps(CONFIG))
+        data = tmp_path / "plant.csv"
+        _frame(['M001', 'M004'] * 2, [53.0, 53.0, 47.0, 47.0]).to_csv(data, index=False)
+
+        detector = AnomalyDetector(data_path=str(data), rules_path=str(rules))
+        anomalies = detector.detect_anomalies_partitioned(max_workers=1)
+
+        assert anomalies.machine_id.tolist() == ['M004']
+        assert anomalies.reasons(0) == ["CRITICAL: Temp High (53.0 > 52)"]
+
+class TestHotReload:
+    def _write(self, path, critical_high):
+        path.write_text(json.dumps({'rules': {'temp': {'critical_high': critical_high}}}))
+        # Make sure the change is visible even on coarse mtime filesystems
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_update_picks_up_edited_rules(self, tmp_path):
+        path = tmp_path / "rules.json"
+        self._write(path, 52)
+        detector = AnomalyDetector(data_path=None, rules_path=str(path))
+        detector.rules_watcher.check_interval = 0
+
+        first = detector.update(_frame(['M001'], [53.0]))
+        self._write(path, 55)
+        second = detector.update(_frame(['M001'], [53.0]))
+
+        assert first.reasons(0) == ["CRITICAL: Temp High (53.0 > 52)"]
+        assert second.reasons(0) == ["WARNING: Temp High (53.0 > 50)"]
+        # Results checked against different tables still render their own limits
+        combined = AnomalyResult.concat([first, second])
+        assert combined.reasons(0) == first.reasons(0)
+        assert combined.reasons(1) == second.reasons(0)
+
+    def test_invalid_edit_keeps_previous_rules(self, tmp_path, capsys):
+        path = tmp_path / "rules.toml"
+        path.write_text('[rules.temp]\ncritical_high = 55\n')
+        watcher = RulesWatcher(str(path), check_interval=0)
+        table = watcher.table
+
+        path.write_text('[rules.temp\ncritical_high = ')
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000_000))
+
+        assert not watcher.poll()
+        assert watcher.table is table
+        assert "Ignoring invalid rules file" in capsys.readouterr().out
+
+    def test_missing_file_uses_defaults(self, tmp_path):
+        watcher = RulesWatcher(str(tmp_path / "missing.toml"))
+        assert watcher.table.rule_sets == [DEFAULT_RULES]
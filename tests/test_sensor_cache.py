@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pandas as pd
+from anomaly_detector import AnomalyDetector
+from data_generator import generate_sensor_data
+import sensor_cache
+
+def _write_csv(tmp_path, rows=50):
+    path = tmp_path / "sensor.csv"
+    df = generate_sensor_data(num_rows=rows)
+    df.loc[3, 'temp'] = -1.0  # Invalid row, dropped before caching
+    df.to_csv(path, index=False)
+    return str(path)
+
+def test_cache_roundtrip_matches_csv(tmp_path):
+    path = _write_csv(tmp_path)
+
+    fresh = AnomalyDetector(data_path=path)
+    fresh.load_data()
+    assert os.path.isdir(sensor_cache.cache_dir_for(path))
+
+    cached = AnomalyDetector(data_path=path)
+    cached.load_data()
+
+    pd.testing.assert_frame_equal(cached.df, fresh.df, check_index_type=False)
+    assert cached.detect_anomalies().to_records() == fresh.detect_anomalies().to_records()
+
+def test_cache_invalidated_when_source_changes(tmp_path):
+    path = _write_csv(tmp_path)
+    AnomalyDetector(data_path=path).load_data()
+    assert sensor_cache.read_cache(path) is not None
+
+    with open(path, "a") as f:
+        f.write("2024-07-01 00:00:00,47.0,1.02,0.03\n")
+    assert sensor_cache.read_cache(path) is None
+
+    detector = AnomalyDetector(data_path=path)
+    detector.load_data()
+    assert len(detector.df) == 50
+
+def test_cache_hit_reports_removed_rows(tmp_path, capsys):
+    path = _write_csv(tmp_path)
+    AnomalyDetector(data_path=path).load_data()
+    assert "Removed 1 invalid records" in capsys.readouterr().out
+
+    AnomalyDetector(data_path=path).load_data()
+    out = capsys.readouterr().out
+    assert "(cached)" in out and "Removed 1 invalid records" in out
+
+def test_unwritable_directory_falls_back_silently(tmp_path, monkeypatch, capsys):
+    path = _write_csv(tmp_path)
+
+    def read_only(*args, **kwargs):
+        raise PermissionError(13, "Permission denied")
+    monkeypatch.setattr(sensor_cache, "write_cache", read_only)
+    detector = AnomalyDetector(data_path=path)
+    detector.load_data()
+    assert len(detector.df) == 49
+    assert "Warning" not in capsys.readouterr().out
+
+    monkeypatch.setattr(os, "access", lambda *args: False)
+    AnomalyDetector(data_path=path).load_data()
+    assert "Warning" not in capsys.readouterr().out
+
+def test_cache_disabled(tmp_path):
+    path = _write_csv(tmp_path)
+    AnomalyDetector(data_path=path, use_cache=False).load_data()
+    assert not os.path.exists(sensor_cache.cache_dir_for(path))
+
+def test_column_encoding(tmp_path):
+    path = tmp_path / "source.csv"
+    path.write_text("x\n")
+    df = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-01-01 00:00:00', '2024-01-01 00:05:00']),
+        'exact': [0.5, 2.25],            # Representable in float32
+        'inexact': [1.09, 47.31],        # Needs float64
+        'machine_id': ['M1', None],
+    })
+    sensor_cache.write_cache(str(path), df)
+
+    loaded = sensor_cache.read_cache(str(path))
+    pd.testing.assert_frame_equal(loaded, df, check_index_type=False, check_dtype=False)
+    assert loaded['exact'].dtype == np.float32
+    assert loaded['inexact'].dtype == np.float64